@@ -0,0 +1,114 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Benchmark for :py:meth:`jiveapi.content.JiveContent.inline_css_etree`,
+comparing a new ``Premailer`` per document, a reusable
+:py:class:`jiveapi.css.CssInliner` and the ``native`` engine
+(:py:class:`jiveapi.css.NativeInliner`) on each of the HTML test fixtures, and
+checking whether the native engine sets the same ``style`` attributes as
+premailer. Each engine is also timed with unused rules removed first by
+:py:func:`jiveapi.css.prune_unused_css` (pruning time included).
+
+Run from the repository root with jiveapi installed (or with ``PYTHONPATH=.``):
+``python benchmarks/bench_css_inline.py [NUMBER] [REPEAT]``
+"""
+
+import os
+import sys
+import glob
+import timeit
+import logging
+
+import cssutils
+from premailer import Premailer
+
+from jiveapi.content import JiveContent
+from jiveapi.css import CssInliner, NativeInliner, prune_unused_css
+
+FIXTURE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'jiveapi', 'tests', 'fixtures', 'html'
+)
+
+
+def styles(root):
+    return [(e.tag, e.get('style')) for e in root.getroot().iter()]
+
+
+def pruned(func):
+    def inner(root):
+        prune_unused_css(root)
+        return func(root)
+    return inner
+
+
+def main(number=50, repeat=5):
+    # premailer / cssutils log every unknown property of every document
+    cssutils.log.setLevel(logging.CRITICAL)
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html'))):
+        with open(path, 'r') as fh:
+            html = fh.read()
+        native = NativeInliner()
+        engines = [
+            ('premailer', lambda root: Premailer(root).transform()),
+            ('CssInliner', CssInliner().transform),
+            ('native', native.transform)
+        ]
+        engines.extend([
+            ('%s+prune' % desc, pruned(func)) for desc, func in engines
+        ])
+        stats = prune_unused_css(JiveContent.html_to_etree(html))
+        print('%s (%d bytes; %d of %d rules unused)' % (
+            os.path.basename(path), len(html), stats.rules_dropped,
+            stats.rules
+        ))
+        for desc, func in engines:
+            best = min(timeit.repeat(
+                lambda: func(JiveContent.html_to_etree(html)),
+                number=number, repeat=repeat
+            )) / number
+            print('    %-18s %8.3f ms/doc' % (desc, best * 1000))
+        expected = styles(
+            Premailer(JiveContent.html_to_etree(html)).transform()
+        )
+        res = styles(native.transform(JiveContent.html_to_etree(html)))
+        print('    native styles same as premailer: %s (fallbacks: %d)' % (
+            res == expected, native.fallbacks
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,131 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Benchmark for rewriting image ``src`` and link ``href`` attributes in
+:py:meth:`jiveapi.content.JiveContent._upload_images`, comparing the previous
+approach (an ``//a`` XPath scan of the whole document per image) to the
+single pass over an href index in ``JiveContent._rewrite_image_urls()``, on a
+synthetic large document.
+
+Run from the repository root with jiveapi installed (or with ``PYTHONPATH=.``):
+``python benchmarks/bench_image_links.py [NUM_LINKS] [NUM_IMAGES] [REPEAT]``
+"""
+
+import sys
+import timeit
+from unittest.mock import Mock, patch
+
+from lxml import etree
+from lxml.html import builder as E
+
+from jiveapi.api import JiveApi
+from jiveapi.content import JiveContent
+
+
+def make_doc(num_links, num_images):
+    """
+    Build an API-reference-like document with ``num_links`` links, of which
+    one per image links to that image, and ``num_images`` local images.
+    """
+    body = E.BODY()
+    per_img = max(1, num_links // max(1, num_images))
+    for i in range(num_links):
+        body.append(E.P(
+            'Item %d ' % i, E.A('see item %d' % i, href='#item-%d' % i)
+        ))
+        if i % per_img == 0 and i // per_img < num_images:
+            src = 'img/figure%d.png' % (i // per_img)
+            body.append(E.A(E.IMG(src=src), href=src))
+    return E.HTML(E.HEAD(E.TITLE('Reference')), body)
+
+
+def legacy_rewrite(root, imgs, locations):
+    """
+    The src/href rewriting done by _upload_images before the href index.
+    """
+    for img, src in imgs:
+        img_uri = locations[src]
+        img.set('src', img_uri)
+        for a in root.xpath('//a'):
+            if a.get('href') == src:
+                a.set('href', img_uri)
+
+
+def main(num_links=5000, num_images=200, repeat=3):
+    html = etree.tostring(make_doc(num_links, num_images))
+    print('%d links, %d images, %.2f MiB of HTML' % (
+        num_links, num_images, len(html) / 1048576.0
+    ))
+    results = {}
+    for desc, func in [
+        ('legacy (//a per image)', legacy_rewrite),
+        ('href index', JiveContent._rewrite_image_urls)
+    ]:
+        times = []
+        for _ in range(repeat):
+            root = etree.fromstring(html)
+            imgs = [(img, img.get('src')) for img in root.xpath('//img')]
+            locations = dict(
+                (src, 'https://jive.example.com/api/core/v3/images/%d' % i)
+                for i, (_, src) in enumerate(imgs)
+            )
+            start = timeit.default_timer()
+            func(root, imgs, locations)
+            times.append(timeit.default_timer() - start)
+            results[desc] = etree.tostring(root)
+        print('%-24s %10.2f ms' % (desc, min(times) * 1000))
+    assert len(set(results.values())) == 1
+    # end-to-end _upload_images, with disk reads and uploads stubbed out
+    api = Mock(spec_set=JiveApi)
+    api.upload_image.side_effect = lambda data, fname, ctype: (
+        'https://jive.example.com/api/core/v3/images/' + fname, {'id': fname}
+    )
+    cls = JiveContent(api, image_dir='/')
+    with patch.object(
+        JiveContent, '_load_image_from_disk',
+        side_effect=lambda src: ('image/png', src, src)
+    ):
+        root = etree.fromstring(html)
+        start = timeit.default_timer()
+        cls._upload_images(root, {})
+        print('%-24s %10.2f ms' % (
+            '_upload_images (stubbed)',
+            (timeit.default_timer() - start) * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:4]])
@@ -0,0 +1,169 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Benchmark for :py:meth:`jiveapi.content.JiveContent.jiveize_etree` and
+:py:func:`jiveapi.content.newline_to_br`, comparing the previous
+implementations (multiple passes over the tree, and serializing / reparsing
+each ``<pre>``) to the current ones on a large (1 MB+) synthetic document, and
+checking that their output is identical.
+
+Run from the repository root with jiveapi installed (or with ``PYTHONPATH=.``):
+``python benchmarks/bench_jiveize.py [NUM_SECTIONS] [REPEAT]``
+"""
+
+import sys
+import timeit
+
+from lxml import etree
+
+from jiveapi.content import JiveContent, TAGSTYLES, newline_to_br
+
+SECTION = '''
+<h2 id="section-%(i)d">Section %(i)d</h2>
+<p id="para-%(i)d">Some text with <a href="#section-%(i)d">a link</a>,
+<a href="http://example.com/page-%(i)d">an external link</a> and
+<code>inline-code</code>.</p>
+<div class="sourceCode" id="cb-%(i)d" style="background: #eee"><pre
+class="sourceCode python"><code class="sourceCode python">\
+<a class="sourceLine" id="cb-%(i)d-1" title="1">def func_%(i)d(x):</a>
+<a class="sourceLine" id="cb-%(i)d-2" title="2">    return x * %(i)d</a>
+</code></pre></div>
+<ul><li>one</li><li>two <em>three</em></li></ul>
+<table><thead><tr><th>a</th><th>b</th></tr></thead>
+<tbody><tr><td>1</td><td>2</td></tr></tbody></table>
+<blockquote><p>Quote %(i)d</p></blockquote>
+<div jivemacro="toc"><p>macro %(i)d</p></div>
+'''
+
+
+def legacy_newline_to_br(elem):
+    """
+    The serialize / replace / reparse implementation of newline_to_br before
+    it modified elements in place.
+    """
+    src = etree.tostring(elem).strip()
+    if isinstance(src, type(b'')):
+        src = src.decode()
+    res = src.replace("\n", "<br/>\n")
+    return etree.fromstring(res + "\n")
+
+
+def legacy_jiveize_etree(root, no_sourcecode_style=True):
+    """
+    The multi-pass implementation of jiveize_etree before the single
+    traversal, using :py:func:`~.legacy_newline_to_br`.
+    """
+    if no_sourcecode_style:
+        for code_div in root.xpath('//div[@class="sourceCode"]'):
+            del code_div.attrib['style']
+    for pre in root.xpath('//pre'):
+        if 'jivemacro' in pre.attrib:
+            continue
+        pre.getparent().replace(pre, legacy_newline_to_br(pre))
+    for element in root.iter():
+        if element.attrib.get('id', '') != '':
+            _id = element.attrib['id']
+            if element.tag != 'a':
+                element.append(etree.Element('a', name=_id))
+            else:
+                element.attrib['name'] = _id
+        if (
+            element.tag in TAGSTYLES.keys() and
+            'jivemacro' not in element.attrib and
+            'jivemacro' not in element.getparent().attrib
+        ):
+            element.attrib['style'] = TAGSTYLES[element.tag]
+    for elem in root.xpath('//a'):
+        if 'name' in elem.attrib:
+            elem.attrib['name'] = elem.attrib['name'].replace('-', '_')
+        if elem.attrib.get('href', '').startswith('#'):
+            elem.attrib['href'] = elem.attrib['href'].replace('-', '_')
+    return root
+
+
+def time_func(html, func, repeat):
+    """
+    Return the best time of ``repeat`` runs of ``func`` on a freshly parsed
+    tree of ``html``, and the serialized result of the last run.
+    """
+    times = []
+    for _ in range(repeat):
+        root = JiveContent.html_to_etree(html)
+        start = timeit.default_timer()
+        res = func(root)
+        times.append(timeit.default_timer() - start)
+    return min(times), etree.tostring(res)
+
+
+def legacy_pres(root):
+    for pre in root.xpath('//pre'):
+        pre.getparent().replace(pre, legacy_newline_to_br(pre))
+    return root
+
+
+def inplace_pres(root):
+    for pre in root.xpath('//pre'):
+        newline_to_br(pre)
+    return root
+
+
+def main(num_sections=1500, repeat=5):
+    html = '<html><head><title>Bench</title></head><body>%s</body></html>' % (
+        ''.join(SECTION % {'i': i} for i in range(num_sections))
+    )
+    print('Input size: %.2f MiB' % (len(html) / 1048576.0))
+    for title, funcs in [
+        ('jiveize_etree', [
+            ('legacy (multi-pass)', legacy_jiveize_etree),
+            ('single traversal', JiveContent.jiveize_etree)
+        ]),
+        ('newline_to_br on every <pre>', [
+            ('legacy (reparse)', legacy_pres),
+            ('in place', inplace_pres)
+        ])
+    ]:
+        print(title)
+        outputs = []
+        for desc, func in funcs:
+            best, output = time_func(html, func, repeat)
+            outputs.append(output)
+            print('    %-20s %10.2f ms' % (desc, best * 1000))
+        assert outputs[0] == outputs[1], 'outputs differ'
+        print('    outputs identical (%d bytes)' % len(outputs[0]))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
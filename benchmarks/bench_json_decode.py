@@ -0,0 +1,129 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Micro-benchmark for :py:meth:`jiveapi.jiveresponse.JiveResponse.json`,
+comparing the previous decode path (decode the body to text, strip the JSON
+Security String with a regex, ``json.loads``) to the bytes-level fast path
+with each available JSON library.
+
+Run from the repository root with jiveapi installed (or with ``PYTHONPATH=.``):
+``python benchmarks/bench_json_decode.py [NUM_ITEMS] [REPEAT]``
+"""
+
+import sys
+import json
+import timeit
+from unittest.mock import patch
+
+from jiveapi.jiveresponse import JiveResponse, loads_jive_json
+
+PREFIX = "throw 'allowIllegalResourceCall is false.';\n"
+
+
+def make_content(num_items):
+    """
+    Build a Jive-style listing response body with ``num_items`` items.
+    """
+    body = '<p>Lorem ipsum dolor sit amet, caf\xe9 ☃.</p>\n' * 20
+    items = [
+        {
+            'id': str(i),
+            'contentID': str(100000 + i),
+            'type': 'document',
+            'subject': 'Document number %d' % i,
+            'content': {'type': 'text/html', 'text': body},
+            'tags': ['foo', 'bar', 'baz'],
+            'published': '2018-01-01T00:00:00.000+0000',
+            'updated': '2018-01-02T00:00:00.000+0000',
+        }
+        for i in range(num_items)
+    ]
+    data = {
+        'itemsPerPage': num_items,
+        'list': items,
+        'startIndex': 0,
+        'links': {'next': 'https://jive.example.com/api/core/v3/next'}
+    }
+    return (PREFIX + json.dumps(data, indent=2)).encode('utf-8')
+
+
+def make_response(content, encoding):
+    res = JiveResponse()
+    res.status_code = 200
+    res.encoding = encoding
+    res._content = content
+    return res
+
+
+def legacy_json(res):
+    """
+    The decode path used by JiveResponse.json before the fast path.
+    """
+    return loads_jive_json(res.text)
+
+
+def main(num_items=2000, repeat=5):
+    content = make_content(num_items)
+    print('Body size: %.2f MiB' % (len(content) / 1048576.0))
+    expected = legacy_json(make_response(content, 'utf-8'))
+    cases = [('legacy (text + regex + json)', 'utf-8', None, None)]
+    cases.append(('legacy, no encoding header', None, None, None))
+    cases.append(('fast path, stdlib json', 'utf-8', 'json', None))
+    for name in ['ujson', 'orjson']:
+        try:
+            mod = __import__(name)
+        except ImportError:
+            print('%s not installed; skipping' % name)
+            continue
+        cases.append(('fast path, %s' % name, 'utf-8', name, mod))
+    for desc, encoding, backend, mod in cases:
+        with patch('jiveapi.jiveresponse.orjson',
+                   mod if backend == 'orjson' else None):
+            with patch('jiveapi.jiveresponse.ujson',
+                       mod if backend == 'ujson' else None):
+                if backend is None:
+                    def func():
+                        return legacy_json(make_response(content, encoding))
+                else:
+                    def func():
+                        return make_response(content, encoding).json()
+                assert func() == expected
+                best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print('%-32s %8.2f ms' % (desc, best * 1000))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
@@ -0,0 +1,93 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Benchmark for :py:meth:`jiveapi.content.JiveContent.render_many`, comparing
+:py:meth:`jiveapi.content.JiveContent.dict_for_html_document` called for each
+document in turn to ``render_many()`` with 1, 2, 4 and all CPUs' worth of
+worker processes, on copies of the ``testpostA.html`` test fixture (without
+image uploads).
+
+Run from the repository root with jiveapi installed (or with ``PYTHONPATH=.``):
+``python benchmarks/bench_render_many.py [NUM_DOCS] [REPEAT]``
+"""
+
+import os
+import sys
+import timeit
+import logging
+from unittest.mock import Mock
+
+import cssutils
+
+from jiveapi.api import JiveApi
+from jiveapi.content import JiveContent
+
+FIXTURE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'jiveapi', 'tests', 'fixtures', 'html', 'testpostA.html'
+)
+
+
+def main(num_docs=200, repeat=3):
+    # premailer / cssutils log every unknown property of every document
+    cssutils.log.setLevel(logging.CRITICAL)
+    with open(FIXTURE, 'r') as fh:
+        html = fh.read()
+    documents = [
+        {'subject': 'doc %d' % i, 'html': html, 'handle_images': False}
+        for i in range(num_docs)
+    ]
+    content = JiveContent(Mock(spec_set=JiveApi))
+    expected = [content.dict_for_html_document(**d) for d in documents]
+    print('%d documents, %d CPUs' % (num_docs, os.cpu_count()))
+    best = min(timeit.repeat(
+        lambda: [content.dict_for_html_document(**d) for d in documents],
+        number=1, repeat=repeat
+    ))
+    print('    %-24s %8.1f ms' % ('dict_for_html_document', best * 1000))
+    for workers in sorted(set([1, 2, 4, os.cpu_count()])):
+        assert list(content.render_many(documents, workers)) == expected
+        best = min(timeit.repeat(
+            lambda: list(content.render_many(documents, workers)),
+            number=1, repeat=repeat
+        ))
+        print('    %-24s %8.1f ms' % (
+            'render_many (%d workers)' % workers, best * 1000
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
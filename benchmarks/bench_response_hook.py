@@ -0,0 +1,129 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+
+Micro-benchmark for :py:func:`jiveapi.jiveresponse.requests_hook`, comparing
+the previous implementation (build a new ``JiveResponse`` and copy the
+original response's ``__dict__`` into it) to the current in-place class
+change, both for the hook alone and for full :py:class:`requests.Session`
+requests against an in-memory transport adapter.
+
+Run from the repository root with jiveapi installed (or with ``PYTHONPATH=.``):
+``python benchmarks/bench_response_hook.py [NUM_REQUESTS] [REPEAT]``
+"""
+
+import sys
+import timeit
+
+from requests import Response, Session
+from requests.adapters import BaseAdapter
+
+from jiveapi.jiveresponse import JiveResponse, requests_hook
+
+
+def legacy_hook(response, **_):
+    """
+    The implementation of requests_hook before the in-place conversion.
+    """
+    res = JiveResponse()
+    res.__dict__.update(response.__dict__)
+    return res
+
+
+class StaticAdapter(BaseAdapter):
+    """
+    Transport adapter that returns a canned response without any I/O.
+    """
+
+    def send(self, request, **kwargs):
+        res = Response()
+        res.status_code = 200
+        res.reason = 'OK'
+        res.encoding = 'utf-8'
+        res.headers['Content-Type'] = 'application/json'
+        res._content = b'throw 1;\n{"foo": "bar"}'
+        res.request = request
+        res.url = request.url
+        return res
+
+    def close(self):
+        pass
+
+
+def make_response():
+    res = Response()
+    res.status_code = 200
+    res._content = b'{}'
+    return res
+
+
+def make_session(hook):
+    sess = Session()
+    sess.mount('http://', StaticAdapter())
+    sess.hooks['response'].append(hook)
+    return sess
+
+
+def main(num_requests=100000, repeat=5):
+    responses = [make_response() for _ in range(num_requests)]
+    for desc, hook in [('legacy', legacy_hook), ('in-place', requests_hook)]:
+        # in-place conversion is a no-op on already-converted responses, so
+        # each repetition gets fresh Response objects
+        def setup():
+            for res in responses:
+                res.__class__ = Response
+
+        def func():
+            for res in responses:
+                hook(res)
+        best = min(timeit.repeat(func, setup=setup, number=1, repeat=repeat))
+        print('hook only, %-10s %8.3f us/response' % (
+            desc, best * 1e6 / num_requests
+        ))
+    num_requests = max(1, num_requests // 10)
+    for desc, hook in [('legacy', legacy_hook), ('in-place', requests_hook)]:
+        sess = make_session(hook)
+
+        def func():
+            for _ in range(num_requests):
+                sess.get('http://jive.example.com/foo')
+        best = min(timeit.repeat(func, number=1, repeat=repeat))
+        print('session GET, %-8s %8.3f us/request' % (
+            desc, best * 1e6 / num_requests
+        ))
+
+
+if __name__ == '__main__':
+    main(*[int(x) for x in sys.argv[1:3]])
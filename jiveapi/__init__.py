@@ -38,5 +38,6 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 try:
     from jiveapi.api import JiveApi  # noqa
     from jiveapi.content import JiveContent  # noqa
+    from jiveapi.async_api import AsyncJiveApi  # noqa
 except ImportError:
     pass
@@ -36,11 +36,23 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import logging
+import os
+import threading
+import time
 import requests
-from urllib.parse import urljoin, quote_plus
+from itertools import count
+from urllib.parse import (
+    urljoin, quote_plus, urlsplit, urlunsplit, parse_qsl, urlencode
+)
 import json
 
 from jiveapi.jiveresponse import requests_hook
+from jiveapi.utils import concurrent_map
+from jiveapi.ratelimit import READ, WRITE, IMAGE
+from jiveapi.streams import (
+    ImageStream, MultipartImageBody, DEFAULT_CHUNK_SIZE, SNIFF_BYTES,
+    sniff_image_type
+)
 from jiveapi.exceptions import RequestFailedException, ContentConflictException
 
 logger = logging.getLogger(__name__)
@@ -49,6 +61,19 @@ logger = logging.getLogger(__name__)
 #: note that sub-second time is ignored and set to zero.
 TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.000%z'
 
+#: Default per-endpoint cache TTLs (in seconds) for :py:class:`~.JiveApi`
+#: instances with a ``cache``. Within its TTL, a cached response is returned
+#: without contacting the server at all; after that (or for endpoints not
+#: listed here), cached responses are only used after revalidation with a
+#: conditional GET. Keys are the endpoint names used by :py:class:`~.JiveApi`
+#: methods: ``user``, ``api_version``, ``content``, ``content_in_place`` and
+#: ``content_id_by_html_url``.
+DEFAULT_CACHE_TTLS = {
+    'user': 3600,
+    'api_version': 86400,
+    'content_id_by_html_url': 86400
+}
+
 
 class JiveApi(object):
     """
@@ -56,7 +81,8 @@ class JiveApi(object):
     Jive API endpoints.
     """
 
-    def __init__(self, base_url, username, password):
+    def __init__(self, base_url, username, password, retry_policy=None,
+                 rate_limiter=None, cache=None, cache_ttls=None):
         """
         :param base_url: Base URL to the Jive API. This should be the scheme,
           hostname, and optional port ending with a path of ``/api/`` (i.e.
@@ -66,6 +92,26 @@ class JiveApi(object):
         :type username: str
         :param password: Jive API password
         :type password: str
+        :param retry_policy: If specified, retry requests that fail with
+          transient errors according to this policy. By default, requests are
+          not retried.
+        :type retry_policy: jiveapi.retry.RetryPolicy
+        :param rate_limiter: If specified, wait for permission from this rate
+          limiter before making each request. One limiter may be shared by
+          multiple JiveApi instances.
+        :type rate_limiter: jiveapi.ratelimit.RateLimiter
+        :param cache: If specified, cache GET responses in this cache, keyed
+          by URL. Responses from endpoints with a TTL in ``cache_ttls`` are
+          returned from the cache without any request until the TTL expires.
+          Otherwise, responses that include an ``ETag`` or ``Last-Modified``
+          header are revalidated with a conditional GET; if the server responds
+          with HTTP 304 Not Modified, the cached JSON is returned. As responses
+          depend on the permissions of the user making the request, do not
+          share a cache between instances using different credentials.
+        :type cache: jiveapi.cache.CacheBackend
+        :param cache_ttls: per-endpoint cache TTLs in seconds, used if
+          ``cache`` is specified. Defaults to :py:data:`~.DEFAULT_CACHE_TTLS`.
+        :type cache_ttls: dict
         """
         self._base_url = base_url
         if not self._base_url.endswith('/'):
@@ -77,6 +123,99 @@ class JiveApi(object):
         self._requests.hooks['response'].append(requests_hook)
         # setup auth
         self._requests.auth = (self._username, self._password)
+        self._retry_policy = retry_policy
+        self._rate_limiter = rate_limiter
+        self._cache = cache
+        if cache_ttls is None:
+            cache_ttls = DEFAULT_CACHE_TTLS
+        self._cache_ttls = dict(cache_ttls)
+        self._stats_lock = threading.Lock()
+        self._retry_stats = {'retries': 0, 'backoff_seconds': 0.0}
+
+    @property
+    def base_url(self):
+        """
+        Return the base URL of the Jive instance's API, as passed to the
+        constructor (with a trailing slash).
+
+        :rtype: str
+        """
+        return self._base_url
+
+    @property
+    def retry_stats(self):
+        """
+        Return counters describing the retries made by this instance, as a dict
+        with keys ``retries`` (the total number of requests retried) and
+        ``backoff_seconds`` (the total time spent waiting between attempts).
+
+        :rtype: dict
+        """
+        with self._stats_lock:
+            return dict(self._retry_stats)
+
+    def _request(self, method, url, endpoint_class=None, **kwargs):
+        """
+        Make a HTTP request using the underlying :py:class:`requests.Session`,
+        retrying transient failures according to the ``retry_policy`` passed
+        to the constructor (if any). If a ``rate_limiter`` was passed to the
+        constructor, it is consulted before every attempt. The response status
+        is not otherwise checked; that is up to the caller.
+
+        :param method: HTTP method, i.e. ``GET``
+        :type method: str
+        :param url: absolute URL to request
+        :type url: str
+        :param endpoint_class: rate limiter endpoint class of the request. If
+          not specified, ``GET`` requests are
+          :py:data:`~jiveapi.ratelimit.READ` and all others are
+          :py:data:`~jiveapi.ratelimit.WRITE`.
+        :type endpoint_class: str
+        :param kwargs: keyword arguments for the :py:class:`requests.Session`
+          request method
+        :return: the final response
+        :rtype: :py:class:`requests.Response`
+        """
+        func = getattr(self._requests, method.lower())
+        policy = self._retry_policy
+        if endpoint_class is None:
+            endpoint_class = READ if method.upper() == 'GET' else WRITE
+        attempt = 0
+        while True:
+            if self._rate_limiter is not None:
+                self._rate_limiter.acquire(endpoint_class)
+            try:
+                res = func(url, **kwargs)
+            except requests.exceptions.RequestException as ex:
+                if policy is None or not policy.should_retry(
+                    method, attempt, exception=ex
+                ):
+                    raise
+                delay = policy.backoff(attempt)
+                logger.warning(
+                    '%s %s failed (%s); retrying in %.2f seconds', method, url,
+                    ex, delay
+                )
+            else:
+                if policy is None or not policy.should_retry(
+                    method, attempt, response=res
+                ):
+                    return res
+                delay = policy.backoff(attempt, response=res)
+                logger.warning(
+                    '%s %s returned %d %s; retrying in %.2f seconds', method,
+                    url, res.status_code, res.reason, delay
+                )
+                # release the connection of a discarded streamed response
+                res.close()
+            with self._stats_lock:
+                self._retry_stats['retries'] += 1
+                self._retry_stats['backoff_seconds'] += delay
+            time.sleep(delay)
+            attempt += 1
+            # rewind a streamed request body that was (partially) sent
+            if hasattr(kwargs.get('data'), 'seek'):
+                kwargs['data'].seek(0)
 
     def abs_url(self, path):
         """
@@ -90,36 +229,340 @@ class JiveApi(object):
         """
         return urljoin(self._base_url, path)
 
-    def _get(self, path, autopaginate=True):
+    def _url(self, path):
+        """
+        Return the absolute URL for ``path``, which may be either relative to
+        the base URL or already absolute (i.e. a pagination link).
+
+        :param path: path or full URL
+        :type path: str
+        :return: absolute URL
+        :rtype: str
+        """
+        if path.startswith('http://') or path.startswith('https://'):
+            # likely a pagination link
+            return path
+        return self.abs_url(path)
+
+    @staticmethod
+    def _add_params(path, **params):
+        """
+        Return ``path`` (a path or URL) with the given query string parameters
+        added, replacing any existing parameters of the same names.
+
+        :param path: path or URL
+        :type path: str
+        :param params: query string parameters to set
+        :return: path or URL with parameters added
+        :rtype: str
+        """
+        parts = urlsplit(path)
+        query = [
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if k not in params
+        ]
+        query.extend(sorted(params.items()))
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def _list_params(self, path, count=None, fields=None):
+        """
+        Return ``path`` with the Jive ``count`` (page size) and ``fields``
+        (field projection) query string parameters added, if specified.
+
+        :param path: path or URL
+        :type path: str
+        :param count: maximum number of items per page of a list response
+        :type count: int
+        :param fields: field names to include in the response, either as a
+          list or a comma-separated string
+        :type fields: ``list`` or ``str``
+        :return: path or URL with parameters added
+        :rtype: str
+        """
+        params = {}
+        if count is not None:
+            params['count'] = count
+        if fields is not None:
+            if not isinstance(fields, str):
+                fields = ','.join(fields)
+            params['fields'] = fields
+        if not params:
+            return path
+        return self._add_params(path, **params)
+
+    def _get(self, path, autopaginate=True, cache_endpoint=None, count=None,
+             fields=None):
         """
         Execute a GET request against the Jive API, handling pagination.
 
+        Pagination is handled iteratively via :py:meth:`~._iter_list`, so the
+        stack depth and copying cost stay constant regardless of the number of
+        pages. To process items as they arrive instead of building the full
+        list in memory, use :py:meth:`~.iter_get`.
+
         :param path: path or full URL to GET
         :type path: str
         :param autopaginate: If True, automatically paginate multi-page
           responses and return a list of the combined results. Otherwise,
           return the unaltered JSON response.
         :type autopaginate: bool
+        :param cache_endpoint: name of the endpoint being requested, used to
+          look up its cache TTL; see :py:data:`~.DEFAULT_CACHE_TTLS`
+        :type cache_endpoint: str
+        :param count: if specified, the ``count`` (page size) query parameter
+          to send. Jive carries it over to the ``next`` links of later pages.
+        :type count: int
+        :param fields: if specified, the ``fields`` query parameter to send,
+          limiting the response to these fields; either a list of field names
+          or a comma-separated string.
+        :type fields: ``list`` or ``str``
         :return: deserialized response JSON. Usually dict or list.
         """
-        if path.startswith('http://') or path.startswith('https://'):
-            # likely a pagination link
-            url = path
-        else:
-            url = self.abs_url(path)
+        path = self._list_params(path, count=count, fields=fields)
+        j = self._get_json(path, cache_endpoint=cache_endpoint)
+        if not isinstance(j, type({})) or 'list' not in j or not autopaginate:
+            return j
+        return list(self._iter_list(j, cache_endpoint=cache_endpoint))
+
+    def iter_get(self, path, cache_endpoint=None, count=None, fields=None):
+        """
+        Execute a GET request against the Jive API and return a generator that
+        yields the items of a (possibly multi-page) list response one at a
+        time, following ``links.next`` as each page is exhausted. Only one page
+        is held in memory at a time.
+
+        If the response is not a list-type response (i.e. does not have a
+        ``list`` key), the deserialized response itself is yielded as the only
+        item.
+
+        :param path: path or full URL to GET
+        :type path: str
+        :param cache_endpoint: name of the endpoint being requested, used to
+          look up its cache TTL; see :py:data:`~.DEFAULT_CACHE_TTLS`
+        :type cache_endpoint: str
+        :param count: page size; see :py:meth:`~._get`
+        :type count: int
+        :param fields: fields to include in each item; see :py:meth:`~._get`
+        :type fields: ``list`` or ``str``
+        :return: generator of deserialized list items
+        :rtype: ``generator``
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        path = self._list_params(path, count=count, fields=fields)
+        j = self._get_json(path, cache_endpoint=cache_endpoint)
+        if not isinstance(j, type({})) or 'list' not in j:
+            yield j
+            return
+        for item in self._iter_list(j, cache_endpoint=cache_endpoint):
+            yield item
+
+    def _iter_list(self, j, cache_endpoint=None):
+        """
+        Given the deserialized JSON of the first page of a list-type response,
+        yield every item of that page and then of each subsequent page found
+        by following ``links.next``.
+
+        :param j: deserialized first page of a list-type response
+        :type j: dict
+        :param cache_endpoint: name of the endpoint being requested, used to
+          look up its cache TTL; see :py:data:`~.DEFAULT_CACHE_TTLS`
+        :type cache_endpoint: str
+        :return: generator of list items
+        :rtype: ``generator``
+        """
+        while True:
+            for item in j['list']:
+                yield item
+            if 'links' not in j or 'next' not in j['links']:
+                return
+            # it has another page
+            j = self._get_json(
+                j['links']['next'], cache_endpoint=cache_endpoint
+            )
+
+    def _iter_list_parallel(self, path, max_workers, cache_endpoint=None):
+        """
+        Alternative to :py:meth:`~.iter_get` that retrieves pages of a list
+        response concurrently. The first page is retrieved to learn the page
+        size; subsequent pages are then requested on a pool of up to
+        ``max_workers`` threads using ``startIndex`` and ``count`` query
+        parameters, instead of following ``links.next`` one page at a time.
+        Items are yielded in order. Retrieval stops at the first empty page;
+        up to ``2 * max_workers`` pages beyond it may already have been
+        requested.
+
+        :param path: path or full URL to GET
+        :type path: str
+        :param max_workers: maximum number of concurrent requests
+        :type max_workers: int
+        :param cache_endpoint: name of the endpoint being requested, used to
+          look up its cache TTL; see :py:data:`~.DEFAULT_CACHE_TTLS`
+        :type cache_endpoint: str
+        :return: generator of deserialized list items
+        :rtype: ``generator``
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        j = self._get_json(path, cache_endpoint=cache_endpoint)
+        if not isinstance(j, type({})) or 'list' not in j:
+            yield j
+            return
+        for item in j['list']:
+            yield item
+        page_size = j.get('itemsPerPage') or len(j['list'])
+        if page_size < 1 or 'next' not in j.get('links', {}):
+            return
+        logger.debug(
+            'Retrieving remaining pages of %s with page size %d and %d '
+            'workers', path, page_size, max_workers
+        )
+
+        def get_page(start_index):
+            return self._get_json(
+                self._add_params(
+                    path, startIndex=start_index, count=page_size
+                ),
+                cache_endpoint=cache_endpoint
+            )
+
+        start = j.get('startIndex', 0) + len(j['list'])
+        for _, page, exc in concurrent_map(
+            get_page, count(start, page_size), max_workers
+        ):
+            if exc is not None:
+                raise exc
+            if not page.get('list'):
+                return
+            for item in page['list']:
+                yield item
+
+    def _get_json(self, path, cache_endpoint=None):
+        """
+        Execute a single GET request against the Jive API and return the
+        deserialized response JSON, without any pagination handling.
+
+        :param path: path or full URL to GET
+        :type path: str
+        :param cache_endpoint: name of the endpoint being requested, used to
+          look up its cache TTL; see :py:data:`~.DEFAULT_CACHE_TTLS`
+        :type cache_endpoint: str
+        :return: deserialized response JSON. Usually dict or list.
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        url = self._url(path)
+        kwargs = {}
+        cached = None
+        ttl = self._cache_ttls.get(cache_endpoint)
+        if self._cache is not None:
+            cached = self._cache.get(url)
+            if cached is not None:
+                if ttl and time.time() - cached['fetched'] < ttl:
+                    logger.debug('Using unexpired cached response for %s', url)
+                    return cached['json']
+                kwargs['headers'] = self._conditional_headers(cached)
         logger.debug('GET %s', url)
-        res = self._requests.get(url)
+        res = self._request('GET', url, **kwargs)
         logger.debug('GET %s returned %d %s', url, res.status_code, res.reason)
+        if res.status_code == 304 and cached is not None:
+            logger.debug('Using cached response for %s', url)
+            if ttl:
+                # restart the TTL
+                self._cache_response(url, res, cached['json'], ttl, cached)
+            return cached['json']
         if res.status_code != 200:
             raise RequestFailedException(res)
         j = res.json()
-        if not isinstance(j, type({})) or 'list' not in j or not autopaginate:
-            return j
-        # else has a 'list' key
-        if 'links' not in j or 'next' not in j['links']:
-            return j['list']
-        # it has another page
-        return j['list'] + self._get(j['links']['next'])
+        if self._cache is not None:
+            self._cache_response(url, res, j, ttl)
+        return j
+
+    @staticmethod
+    def _conditional_headers(cached):
+        """
+        Return the conditional request headers to send when revalidating the
+        given cache entry.
+
+        :param cached: cache entry, as stored by :py:meth:`~._cache_response`
+        :type cached: dict
+        :return: request headers
+        :rtype: dict
+        """
+        headers = {}
+        if cached.get('etag') is not None:
+            headers['If-None-Match'] = cached['etag']
+        if cached.get('last_modified') is not None:
+            headers['If-Modified-Since'] = cached['last_modified']
+        return headers
+
+    def _cache_response(self, url, res, j, ttl=None, previous=None):
+        """
+        Store a successful GET response in the cache, if its endpoint has a
+        TTL or the response includes validators (``ETag`` or ``Last-Modified``
+        headers) that allow it to be revalidated with a conditional request.
+        Entries with validators are kept after the TTL expires, for
+        revalidation; entries without validators expire with the TTL.
+
+        :param url: the URL that was requested
+        :type url: str
+        :param res: the response
+        :type res: :py:class:`requests.Response`
+        :param j: the deserialized response JSON
+        :param ttl: the cache TTL for this endpoint, if any
+        :type ttl: float
+        :param previous: when refreshing a cache entry after a HTTP 304
+          response, the existing cache entry
+        :type previous: dict
+        """
+        headers = res.headers or {}
+        previous = previous or {}
+        etag = headers.get('ETag', previous.get('etag'))
+        last_modified = headers.get(
+            'Last-Modified', previous.get('last_modified')
+        )
+        if etag is None and last_modified is None:
+            if not ttl:
+                return
+            expires = ttl
+        else:
+            expires = None
+        self._cache.set(url, {
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched': time.time(),
+            'json': j
+        }, ttl=expires)
+
+    def invalidate_content_cache(self, content_id):
+        """
+        Remove all cached responses for the content object with the given
+        contentID. This is called automatically by :py:meth:`~.create_content`
+        and :py:meth:`~.update_content`, and is a no-op if this instance has no
+        ``cache``.
+
+        :param content_id: the Jive contentID of the content
+        :type content_id: str
+        """
+        if self._cache is None:
+            return
+        url = self.abs_url('core/v3/contents/%s' % content_id)
+        logger.debug('Invalidating cached responses for %s', url)
+        self._cache.delete(url)
+        self._cache.invalidate_prefix(url + '?')
+        self._cache.invalidate_prefix(url + '/')
+
+    def _invalidate_parent_cache(self, contents):
+        """
+        Remove cached content listings for the parent Place of the given
+        content representation, if it has one and this instance has a
+        ``cache``.
+
+        :param contents: Jive content representation
+        :type contents: dict
+        """
+        if self._cache is None or not isinstance(contents.get('parent'), str):
+            return
+        url = self._url(contents['parent'].rstrip('/') + '/contents')
+        self._cache.delete(url)
+        self._cache.invalidate_prefix(url + '?')
 
     def _post_json(self, path, data):
         """
@@ -132,13 +575,9 @@ class JiveApi(object):
         :return: deserialized response JSON. Usually dict or list.
         :raises: :py:exc:`~.RequestFailedException`
         """
-        if path.startswith('http://') or path.startswith('https://'):
-            # likely a pagination link
-            url = path
-        else:
-            url = self.abs_url(path)
+        url = self._url(path)
         logger.debug('POST to %s (length %d)', url, len(json.dumps(data)))
-        res = self._requests.post(url, json=data)
+        res = self._request('POST', url, json=data)
         logger.debug(
             'POST %s returned %d %s', url, res.status_code, res.reason
         )
@@ -156,13 +595,9 @@ class JiveApi(object):
         :type data: ``dict`` or ``list``
         :return: deserialized response JSON. Usually dict or list.
         """
-        if path.startswith('http://') or path.startswith('https://'):
-            # likely a pagination link
-            url = path
-        else:
-            url = self.abs_url(path)
+        url = self._url(path)
         logger.debug('PUT to %s (length %d)', url, len(json.dumps(data)))
-        res = self._requests.put(url, json=data)
+        res = self._request('PUT', url, json=data)
         logger.debug(
             'PUT %s returned %d %s', url, res.status_code, res.reason
         )
@@ -179,7 +614,9 @@ class JiveApi(object):
         :return: user information
         :rtype: dict
         """
-        return self._get('core/v3/people/%s' % id_number)
+        return self._get(
+            'core/v3/people/%s' % id_number, cache_endpoint='user'
+        )
 
     def api_version(self):
         """
@@ -188,9 +625,9 @@ class JiveApi(object):
         :return: raw API response dict for ``/version`` endpoint
         :rtype: dict
         """
-        return self._get('version')
+        return self._get('version', cache_endpoint='api_version')
 
-    def get_content(self, content_id):
+    def get_content(self, content_id, fields=None):
         """
         Given the content ID of a content object in Jive, return the API (dict)
         representation of that content object. This is the low-level direct API
@@ -203,12 +640,65 @@ class JiveApi(object):
         `Silent Directive for Contents Service <https://community.jivesoftware.c
         om/docs/DOC-233174#>`_.
 
+        If this instance was constructed with a ``cache``, repeated calls for
+        the same content are conditional GETs, and unchanged content is
+        returned from the cache without re-downloading its body.
+
         :param content_id: the Jive contentID of the content
         :type content_id: str
+        :param fields: if specified, only return these fields of the content
+          object (e.g. ``['subject', 'updated']``), instead of the full
+          representation including the body. Either a list of field names or
+          a comma-separated string.
+        :type fields: ``list`` or ``str``
         :return: content object representation
         :rtype: dict
         """
-        return self._get('core/v3/contents/%s?directive=silent' % content_id)
+        return self._get(
+            'core/v3/contents/%s?directive=silent' % content_id,
+            cache_endpoint='content', fields=fields
+        )
+
+    def get_contents(self, content_ids, max_workers=8, ordered=True):
+        """
+        Retrieve many content objects concurrently. This calls
+        :py:meth:`~.get_content` (and therefore uses the same "Silent
+        Directive") for each contentID in ``content_ids`` on a bounded pool of
+        ``max_workers`` threads, and returns a generator that yields results as
+        they become available.
+
+        Each yielded value is a 3-tuple of ``(content_id, content, exception)``.
+        On success, ``content`` is the content object representation dict and
+        ``exception`` is None; on failure, ``content`` is None and
+        ``exception`` is the exception that was raised (usually a
+        :py:exc:`~.RequestFailedException`). A failure for one contentID does
+        not abort the rest of the batch.
+
+        **Note:** ``requests`` keeps at most 10 pooled connections per host by
+        default, so values of ``max_workers`` above 10 may open and discard
+        additional connections.
+
+        :param content_ids: the Jive contentIDs of the content to retrieve.
+          This may be any iterable, including a generator; it is consumed
+          lazily.
+        :type content_ids: ``iterable`` of ``str``
+        :param max_workers: maximum number of concurrent requests
+        :type max_workers: int
+        :param ordered: if True, yield results in the same order as
+          ``content_ids``; otherwise yield them in the order that the requests
+          complete
+        :type ordered: bool
+        :return: generator of ``(content_id, content, exception)`` tuples
+        :rtype: ``generator``
+        """
+        for content_id, res, exc in concurrent_map(
+            self.get_content, content_ids, max_workers, ordered=ordered
+        ):
+            if exc is not None:
+                logger.debug(
+                    'Error getting content with ID %s: %s', content_id, exc
+                )
+            yield content_id, res, exc
 
     def create_content(self, contents, publish_date=None):
         """
@@ -247,6 +737,9 @@ class JiveApi(object):
             'Created content with ID %s: %s', res.get('contentID', 'unknown'),
             res
         )
+        if 'contentID' in res:
+            self.invalidate_content_cache(res['contentID'])
+        self._invalidate_parent_cache(contents)
         return res
 
     def update_content(self, content_id, contents, update_date=None):
@@ -289,6 +782,9 @@ class JiveApi(object):
             if ex.status_code == 409:
                 raise ContentConflictException(ex.response)
             raise
+        finally:
+            self.invalidate_content_cache(content_id)
+            self._invalidate_parent_cache(contents)
         logger.debug(
             'Updated content with ID %s: %s', res.get('contentID', 'unknown'),
             res
@@ -303,6 +799,9 @@ class JiveApi(object):
         opers.jivesoftware.com/api/v3/cloud/rest/ImageService.html#getImage%28S
         tring%2C%20String%2C%20String%2C%20String%2C%20String%29>`_.
 
+        The whole image is held in memory; to download large images, use
+        :py:meth:`~.get_image_to` or :py:meth:`~.iter_image` instead.
+
         :param image_id: Jive Image ID to get. This can be found in a Content
           (i.e. Document or Post) object's ``contentImages`` list.
         :type image_id: str
@@ -313,16 +812,93 @@ class JiveApi(object):
         # handle testing the binary response content from this method.
         url = self.abs_url('core/v3/images/%s' % image_id)
         logger.debug('GET (binary) %s', url)
-        res = self._requests.get(url)
+        res = self._request('GET', url)
+        if res.status_code > 299:
+            raise RequestFailedException(res)
+        content = res.content
         logger.debug(
             'GET %s returned %d %s (%d bytes)', url, res.status_code,
-            res.reason, len(res.content)
+            res.reason, len(content)
+        )
+        return content
+
+    def iter_image(self, image_id, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        GET the image specified by ``image_id`` as a stream of binary chunks,
+        without reading the whole image into memory. See
+        :py:meth:`~.get_image`.
+
+        The returned :py:class:`~jiveapi.streams.ImageStream` is an iterator of
+        ``bytes`` chunks; once it has been exhausted, its ``size`` and
+        ``sha256`` attributes give the size and hex SHA256 digest of the image.
+        If the image is not read completely, the stream must be closed (i.e.
+        by using it as a context manager) to release its connection.
+
+        :param image_id: Jive Image ID to get. This can be found in a Content
+          (i.e. Document or Post) object's ``contentImages`` list.
+        :type image_id: str
+        :param chunk_size: maximum size in bytes of each chunk
+        :type chunk_size: int
+        :return: iterator of image content chunks
+        :rtype: :py:class:`~jiveapi.streams.ImageStream`
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        url = self.abs_url('core/v3/images/%s' % image_id)
+        logger.debug('GET (binary, streamed) %s', url)
+        res = self._request('GET', url, stream=True)
+        logger.debug(
+            'GET %s returned %d %s (Content-Length: %s)', url,
+            res.status_code, res.reason, res.headers.get('Content-Length')
         )
         if res.status_code > 299:
-            raise RequestFailedException(res)
-        return res.content
+            try:
+                raise RequestFailedException(res)
+            finally:
+                res.close()
+        return ImageStream(res, chunk_size=chunk_size)
+
+    def get_image_to(self, image_id, fileobj_or_path,
+                     chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        GET the image specified by ``image_id`` and write it to a file, one
+        chunk at a time, without reading the whole image into memory. See
+        :py:meth:`~.get_image`.
+
+        :param image_id: Jive Image ID to get. This can be found in a Content
+          (i.e. Document or Post) object's ``contentImages`` list.
+        :type image_id: str
+        :param fileobj_or_path: binary file-like object to write the image to,
+          or the path of a file to write it to. If a path is given and the
+          download fails, the partially-written file is removed.
+        :type fileobj_or_path: ``str`` or file-like object
+        :param chunk_size: maximum size in bytes of each chunk
+        :type chunk_size: int
+        :return: 2-tuple of the size of the image in bytes and its hex SHA256
+          digest
+        :rtype: tuple
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        stream = self.iter_image(image_id, chunk_size=chunk_size)
+        with stream:
+            if hasattr(fileobj_or_path, 'write'):
+                for chunk in stream:
+                    fileobj_or_path.write(chunk)
+                return stream.size, stream.sha256
+            with open(fileobj_or_path, 'wb') as fh:
+                try:
+                    for chunk in stream:
+                        fh.write(chunk)
+                except Exception:
+                    fh.close()
+                    os.unlink(fileobj_or_path)
+                    raise
+        logger.debug(
+            'Wrote image %s to %s (%d bytes)', image_id, fileobj_or_path,
+            stream.size
+        )
+        return stream.size, stream.sha256
 
-    def upload_image(self, img_data, img_filename, content_type):
+    def upload_image(self, img_data, img_filename=None, content_type=None):
         """
         Upload a new Image resource to be stored on the server as a temporary
         image, i.e. for embedding in an upcoming Document, Post, etc. Returns
@@ -332,20 +908,30 @@ class JiveApi(object):
         Image <https://developers.jivesoftware.com/api/v3/cloud/rest/ImageServic
         e.html#uploadImage%28MultipartBody%29>`_.
 
-        **Note:** Python's ``requests`` lacks streaming file support. As such,
-        images sent using this method will be entirely read into memory and then
-        sent. This may not work very well for extremely large images.
+        If ``img_data`` is a path or file object, the multipart request body
+        is streamed from the file (see
+        :py:class:`~jiveapi.streams.MultipartImageBody`), so that uploads use
+        constant memory regardless of the image size, and the image is read
+        only once. ``bytes`` are sent as-is.
 
         **Warning:** As far as I can tell, the user-visible URI to an image
         can *only* be retrieved when the image is uploaded. There does not seem
         to be a way to get it from the API for an existing image.
 
-        :param img_data: The binary image data.
-        :type img_data: bytes
+        :param img_data: The binary image data, the path to an image file,
+          a binary file object to read the image from (starting at its current
+          position), or a :py:class:`~jiveapi.streams.MultipartImageBody`. To
+          obtain the SHA256 hash of an image file as it is uploaded, pass a
+          :py:class:`~jiveapi.streams.MultipartImageBody` and read its
+          ``sha256`` attribute afterwards.
+        :type img_data: ``bytes``, ``str``, file-like object, or
+          :py:class:`~jiveapi.streams.MultipartImageBody`
         :param img_filename: The filename for the image. This is purely for
-          display purposes.
+          display purposes. If not specified, the base name of the file is
+          used (or ``image`` for ``bytes``).
         :type img_filename: str
-        :param content_type: The MIME Content Type for the image data.
+        :param content_type: The MIME Content Type for the image data. If not
+          specified, it is detected from the image data.
         :type content_type: str
         :return: 2-tuple of (string user-facing URI to the image i.e. for use
           in HTML, dict Image object representation)
@@ -354,11 +940,42 @@ class JiveApi(object):
         # Testing Note: betamax==0.8.1 and/or betamax-serializers==0.2.0 cannot
         # handle testing the binary response content from this method.
         url = self.abs_url('core/v3/images')
-        files = {
-            'file': (img_filename, img_data, content_type)
-        }
-        logger.debug('POST to %s (length %d)', url, len(img_data))
-        res = self._requests.post(url, files=files, allow_redirects=False)
+        if isinstance(img_data, bytes):
+            if img_filename is None:
+                img_filename = 'image'
+            if content_type is None:
+                content_type = sniff_image_type(img_data[:SNIFF_BYTES])
+            files = {
+                'file': (img_filename, img_data, content_type)
+            }
+            logger.debug('POST to %s (length %d)', url, len(img_data))
+            res = self._request(
+                'POST', url, endpoint_class=IMAGE, files=files,
+                allow_redirects=False
+            )
+        else:
+            body = img_data
+            if not isinstance(body, MultipartImageBody):
+                body = MultipartImageBody(
+                    img_data, filename=img_filename, content_type=content_type
+                )
+            try:
+                logger.debug(
+                    'POST to %s (streaming %d bytes of %s from %s)', url,
+                    body.file_size, body.file_content_type, body.filename
+                )
+                res = self._request(
+                    'POST', url, endpoint_class=IMAGE, data=body,
+                    headers={'Content-Type': body.content_type},
+                    allow_redirects=False
+                )
+            finally:
+                if body is not img_data:
+                    body.close()
+            logger.debug(
+                'Sent %d byte image %s (sha256 %s)', body.size, body.filename,
+                body.sha256
+            )
         logger.debug(
             'POST %s returned %d %s', url, res.status_code, res.reason
         )
@@ -369,7 +986,8 @@ class JiveApi(object):
         )
         return res.headers['Location'], res.json()
 
-    def get_content_in_place(self, place_id):
+    def get_content_in_place(self, place_id, max_workers=None, count=None,
+                             fields=None):
         """
         Given the placeID of a Place in Jive, return a list of all Content in
         that Place. Note that this list can be extremely long. Each element of
@@ -394,12 +1012,66 @@ class JiveApi(object):
 
         :param place_id: the Jive placeID of the Place to list Content in
         :type place_id: str
+        :param max_workers: If specified, retrieve pages after the first
+          concurrently on up to this many threads, using offset-based
+          pagination (see :py:meth:`~._iter_list_parallel`). Otherwise, pages
+          are retrieved one at a time.
+        :type max_workers: int
+        :param count: if specified, the number of items to request per page
+          (Jive's default is 25 and its maximum is 100)
+        :type count: int
+        :param fields: if specified, only return these fields of each content
+          object (e.g. ``['contentID', 'subject', 'updated']``), instead of the
+          full representation including the body. Either a list of field names
+          or a comma-separated string.
+        :type fields: ``list`` or ``str``
         :return: list of content object representation dicts for content in
           the place
         :rtype: ``list`` of ``dict``
         """
+        if max_workers is not None:
+            return list(self.iter_content_in_place(
+                place_id, max_workers, count=count, fields=fields
+            ))
         return self._get(
-            'core/v3/places/%s/contents' % place_id
+            'core/v3/places/%s/contents' % place_id,
+            cache_endpoint='content_in_place', count=count, fields=fields
+        )
+
+    def iter_content_in_place(self, place_id, max_workers=None, count=None,
+                              fields=None):
+        """
+        Generator variant of :py:meth:`~.get_content_in_place`. Rather than
+        returning one list of all Content in the Place, this yields each
+        Content representation dict as its page is retrieved, so that very
+        large Places can be processed without holding every item in memory.
+        See :py:meth:`~.get_content_in_place` for notes on ``place_id``.
+
+        :param place_id: the Jive placeID of the Place to list Content in
+        :type place_id: str
+        :param max_workers: If specified, retrieve pages after the first
+          concurrently on up to this many threads, using offset-based
+          pagination (see :py:meth:`~._iter_list_parallel`). Otherwise, pages
+          are retrieved one at a time.
+        :type max_workers: int
+        :param count: number of items to request per page; see
+          :py:meth:`~.get_content_in_place`
+        :type count: int
+        :param fields: fields to include in each content object; see
+          :py:meth:`~.get_content_in_place`
+        :type fields: ``list`` or ``str``
+        :return: generator of content object representation dicts for content
+          in the place
+        :rtype: ``generator``
+        """
+        path = 'core/v3/places/%s/contents' % place_id
+        if max_workers is not None:
+            return self._iter_list_parallel(
+                self._list_params(path, count=count, fields=fields),
+                max_workers, cache_endpoint='content_in_place'
+            )
+        return self.iter_get(
+            path, cache_endpoint='content_in_place', count=count, fields=fields
         )
 
     def _get_content_id_by_html_url(self, path):
@@ -416,7 +1088,9 @@ class JiveApi(object):
         """
         if not path.endswith('/api/v3'):
             path += '/api/v3'
-        aux = self._get(path, autopaginate=True)
+        aux = self._get(
+            path, autopaginate=True, cache_endpoint='content_id_by_html_url'
+        )
         if isinstance(aux, dict):
             return aux.get('contentID')
         else:
@@ -0,0 +1,561 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+from collections import namedtuple
+from urllib.parse import urljoin, quote_plus
+
+from jiveapi.api import TIME_FORMAT
+from jiveapi.jiveresponse import (
+    loads_jive_json, loads_jive_bytes, UTF8_ENCODINGS
+)
+from jiveapi.exceptions import RequestFailedException, ContentConflictException
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+#: Minimal stand-in for :py:class:`requests.PreparedRequest`, used by
+#: :py:class:`~.AsyncJiveResponse` so that :py:exc:`~.RequestFailedException`
+#: can describe the failed request.
+AsyncRequestInfo = namedtuple('AsyncRequestInfo', ['method', 'url'])
+
+
+class AsyncJiveResponse(object):
+    """
+    Fully-read response to a request made by :py:class:`~.AsyncJiveApi`. This
+    exposes the subset of the :py:class:`requests.Response` interface that
+    jiveapi and :py:exc:`~.RequestFailedException` rely on, and strips the
+    `JSON Security String
+    <https://developers.jivesoftware.com/api/v3/cloud/rest/index.html
+    #security>`_ from JSON bodies the same way :py:class:`~.JiveResponse` does.
+    """
+
+    def __init__(self, method, url, status_code, reason, headers, content,
+                 encoding=None):
+        """
+        :param method: HTTP method of the request
+        :type method: str
+        :param url: URL of the request
+        :type url: str
+        :param status_code: HTTP status code of the response
+        :type status_code: int
+        :param reason: HTTP reason phrase of the response
+        :type reason: str
+        :param headers: response headers
+        :type headers: ``dict``-like
+        :param content: binary response body
+        :type content: bytes
+        :param encoding: response body character encoding, if known
+        :type encoding: str
+        """
+        self.request = AsyncRequestInfo(method=method, url=url)
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+
+    @property
+    def text(self):
+        """
+        Return the response body decoded using the response encoding, or UTF-8
+        if no encoding was specified.
+
+        :rtype: str
+        """
+        return self.content.decode(self.encoding or 'utf-8', errors='replace')
+
+    def json(self, **kwargs):
+        """
+        Returns the json-encoded content of a response, if any, with the
+        leading JSON Security String stripped off.
+
+        As with :py:meth:`~.JiveResponse.json`, UTF-8 bodies are decoded
+        directly from bytes by :py:func:`~.loads_jive_bytes` when no
+        ``kwargs`` are given.
+
+        :param kwargs: Optional arguments that ``json.loads`` takes.
+        :raises ValueError: If the response body does not contain valid json.
+        """
+        encoding = (self.encoding or 'utf-8').lower()
+        if not kwargs and self.content and encoding in UTF8_ENCODINGS:
+            try:
+                return loads_jive_bytes(self.content)
+            except ValueError:
+                pass
+        return loads_jive_json(self.text, **kwargs)
+
+    def __repr__(self):
+        return '<AsyncJiveResponse [%s]>' % self.status_code
+
+
+class AsyncListIterator(object):
+    """
+    Asynchronous iterator over the items of a (possibly multi-page) Jive API
+    list response, returned by :py:meth:`~.AsyncJiveApi.iter_get`. Pages are
+    requested one at a time as the previous page is exhausted, following
+    ``links.next``. Use with ``async for``.
+    """
+
+    def __init__(self, api, path):
+        """
+        :param api: the API client to make requests with
+        :type api: AsyncJiveApi
+        :param path: path or full URL to GET
+        :type path: str
+        """
+        self._api = api
+        self._next = path
+        self._items = []
+        self._started = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._items:
+            if self._next is None:
+                raise StopAsyncIteration
+            j = await self._api._get_json(self._next)
+            self._next = None
+            if not isinstance(j, type({})) or 'list' not in j:
+                if self._started:
+                    raise StopAsyncIteration
+                # not a list-type response; yield it as the only item
+                self._started = True
+                return j
+            self._started = True
+            self._items = list(reversed(j['list']))
+            if 'links' in j and 'next' in j['links']:
+                self._next = j['links']['next']
+        return self._items.pop()
+
+
+class AsyncJiveApi(object):
+    """
+    Low-level :py:mod:`asyncio` client for the Jive API, mirroring
+    :py:class:`~.JiveApi`. All request methods are coroutines, so many
+    requests can be in flight on a single event loop. This requires the
+    optional `aiohttp <https://docs.aiohttp.org/>`_ dependency; install it with
+    ``pip install jiveapi[async]``.
+
+    The underlying :py:class:`aiohttp.ClientSession` is created on first use
+    and must be closed with :py:meth:`~.close`, or by using the instance as an
+    asynchronous context manager (``async with AsyncJiveApi(...) as api:``).
+    """
+
+    def __init__(self, base_url, username, password, limit=100):
+        """
+        :param base_url: Base URL to the Jive API. This should be the scheme,
+          hostname, and optional port ending with a path of ``/api/`` (i.e.
+          ``https://sandbox.jiveon.com/api/``).
+        :type base_url: str
+        :param username: Jive API username
+        :type username: str
+        :param password: Jive API password
+        :type password: str
+        :param limit: maximum number of simultaneous connections to the Jive
+          server
+        :type limit: int
+        """
+        if aiohttp is None:
+            raise ImportError(
+                'AsyncJiveApi requires the "aiohttp" package; please install '
+                'it with: pip install jiveapi[async]'
+            )
+        self._base_url = base_url
+        if not self._base_url.endswith('/'):
+            self._base_url += '/'
+        self._username = username
+        self._password = password
+        self._limit = limit
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self):
+        """
+        Return the :py:class:`aiohttp.ClientSession` for this instance,
+        creating it if needed. Must be called from within a running event
+        loop.
+
+        :rtype: aiohttp.ClientSession
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(self._username, self._password),
+                connector=aiohttp.TCPConnector(limit=self._limit)
+            )
+        return self._session
+
+    async def close(self):
+        """
+        Close the underlying :py:class:`aiohttp.ClientSession`, if open.
+        """
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def abs_url(self, path):
+        """
+        Given a relative path under the base URL of the Jive instance, return
+        the absolute URL formed by joining the base_url to the specified path.
+
+        :param path: relative path on Jive instance
+        :type path: str
+        :return: absolute URL to ``path`` on the Jive instance
+        :rtype: str
+        """
+        return urljoin(self._base_url, path)
+
+    def _url(self, path):
+        if path.startswith('http://') or path.startswith('https://'):
+            # likely a pagination link
+            return path
+        return self.abs_url(path)
+
+    async def _request(self, method, url, **kwargs):
+        """
+        Make a HTTP request and read the full response.
+
+        :param method: HTTP method
+        :type method: str
+        :param url: absolute URL to request
+        :type url: str
+        :param kwargs: keyword arguments for
+          :py:meth:`aiohttp.ClientSession.request`
+        :return: the response
+        :rtype: AsyncJiveResponse
+        """
+        async with self._get_session().request(method, url, **kwargs) as res:
+            content = await res.read()
+            return AsyncJiveResponse(
+                method, url, res.status, res.reason, res.headers, content,
+                encoding=res.charset
+            )
+
+    async def _get(self, path, autopaginate=True):
+        """
+        Execute a GET request against the Jive API, handling pagination. See
+        :py:meth:`jiveapi.api.JiveApi._get`.
+
+        :param path: path or full URL to GET
+        :type path: str
+        :param autopaginate: If True, automatically paginate multi-page
+          responses and return a list of the combined results. Otherwise,
+          return the unaltered JSON response.
+        :type autopaginate: bool
+        :return: deserialized response JSON. Usually dict or list.
+        """
+        j = await self._get_json(path)
+        if not isinstance(j, type({})) or 'list' not in j or not autopaginate:
+            return j
+        result = []
+        while True:
+            result.extend(j['list'])
+            if 'links' not in j or 'next' not in j['links']:
+                return result
+            j = await self._get_json(j['links']['next'])
+
+    def iter_get(self, path):
+        """
+        Return an asynchronous iterator over the items of a (possibly
+        multi-page) list response; the asynchronous equivalent of
+        :py:meth:`jiveapi.api.JiveApi.iter_get`.
+
+        :param path: path or full URL to GET
+        :type path: str
+        :return: asynchronous iterator of deserialized list items
+        :rtype: AsyncListIterator
+        """
+        return AsyncListIterator(self, path)
+
+    async def _get_json(self, path):
+        """
+        Execute a single GET request against the Jive API and return the
+        deserialized response JSON, without any pagination handling.
+
+        :param path: path or full URL to GET
+        :type path: str
+        :return: deserialized response JSON. Usually dict or list.
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        url = self._url(path)
+        logger.debug('GET %s', url)
+        res = await self._request('GET', url)
+        logger.debug('GET %s returned %d %s', url, res.status_code, res.reason)
+        if res.status_code != 200:
+            raise RequestFailedException(res)
+        return res.json()
+
+    async def _post_json(self, path, data):
+        """
+        Execute a POST request against the Jive API, sending JSON.
+
+        :param path: path or full URL to POST to
+        :type path: str
+        :param data: Data to POST.
+        :type data: ``dict`` or ``list``
+        :return: deserialized response JSON. Usually dict or list.
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        url = self._url(path)
+        logger.debug('POST to %s', url)
+        res = await self._request('POST', url, json=data)
+        logger.debug(
+            'POST %s returned %d %s', url, res.status_code, res.reason
+        )
+        if res.status_code != 201:
+            raise RequestFailedException(res)
+        return res.json()
+
+    async def _put_json(self, path, data):
+        """
+        Execute a PUT request against the Jive API, sending JSON.
+
+        :param path: path or full URL to PUT to
+        :type path: str
+        :param data: Data to PUT.
+        :type data: ``dict`` or ``list``
+        :return: deserialized response JSON. Usually dict or list.
+        :raises: :py:exc:`~.RequestFailedException`
+        """
+        url = self._url(path)
+        logger.debug('PUT to %s', url)
+        res = await self._request('PUT', url, json=data)
+        logger.debug(
+            'PUT %s returned %d %s', url, res.status_code, res.reason
+        )
+        if res.status_code not in [200, 201]:
+            raise RequestFailedException(res)
+        return res.json()
+
+    async def user(self, id_number='@me'):
+        """
+        Return dict of information about the specified user. See
+        :py:meth:`jiveapi.api.JiveApi.user`.
+
+        :param id_number: User ID number. Defaults to ``@me``, the current user
+        :type id_number: str
+        :return: user information
+        :rtype: dict
+        """
+        return await self._get('core/v3/people/%s' % id_number)
+
+    async def api_version(self):
+        """
+        Get the Jive API version information. See
+        :py:meth:`jiveapi.api.JiveApi.api_version`.
+
+        :return: raw API response dict for ``/version`` endpoint
+        :rtype: dict
+        """
+        return await self._get('version')
+
+    async def get_content(self, content_id):
+        """
+        Given the content ID of a content object in Jive, return the API (dict)
+        representation of that content object, using the "Silent Directive".
+        See :py:meth:`jiveapi.api.JiveApi.get_content`.
+
+        :param content_id: the Jive contentID of the content
+        :type content_id: str
+        :return: content object representation
+        :rtype: dict
+        """
+        return await self._get(
+            'core/v3/contents/%s?directive=silent' % content_id
+        )
+
+    async def create_content(self, contents, publish_date=None):
+        """
+        POST to create a new Content object in Jive. See
+        :py:meth:`jiveapi.api.JiveApi.create_content`.
+
+        :param contents: A JSON-serializable Jive content representation,
+          suitable for POSTing to the ``/contents`` API endpoint.
+        :type contents: dict
+        :param publish_date: A backdated publish and update date to set on the
+          content.
+        :type publish_date: datetime.datetime
+        :return: API response of Content object
+        :rtype: dict
+        :raises: :py:exc:`~.RequestFailedException`,
+          :py:exc:`~.ContentConflictException`
+        """
+        logger.debug('Creating content...')
+        url = 'core/v3/contents'
+        if publish_date is not None:
+            dts = quote_plus(publish_date.strftime(TIME_FORMAT))
+            logger.debug('Backdating content publish to %s (%s)',
+                         publish_date, dts)
+            url += '?published=%s&updated=%s' % (dts, dts)
+        try:
+            res = await self._post_json(url, contents)
+        except RequestFailedException as ex:
+            if ex.status_code == 409:
+                raise ContentConflictException(ex.response)
+            raise
+        logger.debug(
+            'Created content with ID %s', res.get('contentID', 'unknown')
+        )
+        return res
+
+    async def update_content(self, content_id, contents, update_date=None):
+        """
+        PUT to update an existing Content object in Jive. See
+        :py:meth:`jiveapi.api.JiveApi.update_content`.
+
+        :param content_id: The Jive contentID of the content to update.
+        :type content_id: str
+        :param contents: A JSON-serializable Jive content representation,
+          suitable for POSTing to the ``/contents`` API endpoint.
+        :type contents: dict
+        :param update_date: A backdated update date to set on the content.
+        :type update_date: datetime.datetime
+        :return: API response of Content object
+        :rtype: dict
+        :raises: :py:exc:`~.RequestFailedException`,
+          :py:exc:`~.ContentConflictException`
+        """
+        logger.debug('Updating content with contentID %s', content_id)
+        url = 'core/v3/contents/%s' % content_id
+        if update_date is not None:
+            dts = quote_plus(update_date.strftime(TIME_FORMAT))
+            logger.debug('Backdating content update to %s (%s)',
+                         update_date, dts)
+            url += '?updated=%s' % dts
+        try:
+            res = await self._put_json(url, contents)
+        except RequestFailedException as ex:
+            if ex.status_code == 409:
+                raise ContentConflictException(ex.response)
+            raise
+        logger.debug(
+            'Updated content with ID %s', res.get('contentID', 'unknown')
+        )
+        return res
+
+    async def get_image(self, image_id):
+        """
+        GET the image specified by ``image_id`` as binary content. See
+        :py:meth:`jiveapi.api.JiveApi.get_image`.
+
+        :param image_id: Jive Image ID to get.
+        :type image_id: str
+        :return: binary content of Image
+        :rtype: bytes
+        """
+        url = self.abs_url('core/v3/images/%s' % image_id)
+        logger.debug('GET (binary) %s', url)
+        res = await self._request('GET', url)
+        logger.debug(
+            'GET %s returned %d %s (%d bytes)', url, res.status_code,
+            res.reason, len(res.content)
+        )
+        if res.status_code > 299:
+            raise RequestFailedException(res)
+        return res.content
+
+    async def upload_image(self, img_data, img_filename, content_type):
+        """
+        Upload a new Image resource to be stored on the server as a temporary
+        image. See :py:meth:`jiveapi.api.JiveApi.upload_image`.
+
+        :param img_data: The binary image data.
+        :type img_data: bytes
+        :param img_filename: The filename for the image. This is purely for
+          display purposes.
+        :type img_filename: str
+        :param content_type: The MIME Content Type for the image data.
+        :type content_type: str
+        :return: 2-tuple of (string user-facing URI to the image i.e. for use
+          in HTML, dict Image object representation)
+        :rtype: tuple
+        """
+        url = self.abs_url('core/v3/images')
+        form = aiohttp.FormData()
+        form.add_field(
+            'file', img_data, filename=img_filename, content_type=content_type
+        )
+        logger.debug('POST to %s (length %d)', url, len(img_data))
+        res = await self._request(
+            'POST', url, data=form, allow_redirects=False
+        )
+        logger.debug(
+            'POST %s returned %d %s', url, res.status_code, res.reason
+        )
+        if res.status_code != 201:
+            raise RequestFailedException(res)
+        logger.debug(
+            'Uploaded image with Location: %s', res.headers['Location']
+        )
+        return res.headers['Location'], res.json()
+
+    async def get_content_in_place(self, place_id):
+        """
+        Given the placeID of a Place in Jive, return a list of all Content in
+        that Place. See :py:meth:`jiveapi.api.JiveApi.get_content_in_place`.
+
+        :param place_id: the Jive placeID of the Place to list Content in
+        :type place_id: str
+        :return: list of content object representation dicts for content in
+          the place
+        :rtype: ``list`` of ``dict``
+        """
+        return await self._get('core/v3/places/%s/contents' % place_id)
+
+    def iter_content_in_place(self, place_id):
+        """
+        Asynchronous iterator variant of :py:meth:`~.get_content_in_place`;
+        see :py:meth:`jiveapi.api.JiveApi.iter_content_in_place`.
+
+        :param place_id: the Jive placeID of the Place to list Content in
+        :type place_id: str
+        :return: asynchronous iterator of content object representation dicts
+        :rtype: AsyncListIterator
+        """
+        return self.iter_get('core/v3/places/%s/contents' % place_id)
@@ -0,0 +1,260 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from copy import deepcopy
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackend(object):
+    """
+    Interface for the key/value stores used by :py:class:`~.JiveApi` to cache
+    API responses. Keys are strings; values are JSON-serializable objects.
+    Implementations must be safe to use from multiple threads.
+    """
+
+    def get(self, key):
+        """
+        Return the value stored for ``key``, or None if not present or
+        expired.
+
+        :param key: cache key
+        :type key: str
+        :return: cached value or None
+        """
+        raise NotImplementedError()
+
+    def set(self, key, value, ttl=None):
+        """
+        Store ``value`` for ``key``, replacing any existing value.
+
+        :param key: cache key
+        :type key: str
+        :param value: JSON-serializable value to store
+        :param ttl: if specified, the number of seconds after which the value
+          expires; otherwise it does not expire
+        :type ttl: float
+        """
+        raise NotImplementedError()
+
+    def delete(self, key):
+        """
+        Remove ``key`` from the cache, if present.
+
+        :param key: cache key
+        :type key: str
+        """
+        raise NotImplementedError()
+
+    def invalidate_prefix(self, prefix):
+        """
+        Remove all keys beginning with ``prefix`` from the cache.
+
+        :param prefix: key prefix to remove
+        :type prefix: str
+        """
+        raise NotImplementedError()
+
+    def clear(self):
+        """
+        Remove all keys from the cache.
+        """
+        raise NotImplementedError()
+
+
+class MemoryCache(CacheBackend):
+    """
+    Bounded in-memory :py:class:`~.CacheBackend` with least-recently-used
+    eviction. Values are copied when stored and when retrieved, so callers may
+    freely modify the objects they pass in or get back without affecting the
+    cache. Contents are not shared between processes.
+    """
+
+    def __init__(self, maxsize=1024):
+        """
+        :param maxsize: maximum number of keys to hold; when exceeded, the
+          least recently used key is evicted. None for unlimited.
+        :type maxsize: int
+        """
+        self._maxsize = maxsize
+        # key -> (expiry timestamp or None, value); ordered by last use
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            if item[0] is not None and item[0] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            value = item[1]
+        return deepcopy(value)
+
+    def set(self, key, value, ttl=None):
+        value = deepcopy(value)
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            if self._maxsize is not None:
+                while len(self._data) > self._maxsize:
+                    self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def invalidate_prefix(self, prefix):
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SQLiteCache(CacheBackend):
+    """
+    :py:class:`~.CacheBackend` persisted in a SQLite database file. The file
+    may be shared by multiple threads and processes (i.e. many short-lived
+    workers on one host), relying on SQLite's locking. Values are stored as
+    JSON. Expired entries are removed when read, or in bulk by
+    :py:meth:`~.purge_expired`.
+    """
+
+    def __init__(self, path, timeout=30.0):
+        """
+        :param path: path to the SQLite database file; it will be created if
+          it does not exist
+        :type path: str
+        :param timeout: seconds to wait for a lock held by another connection
+          before raising an error
+        :type timeout: float
+        """
+        self._path = os.path.abspath(path)
+        self._timeout = timeout
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, '
+                'value TEXT NOT NULL, expires REAL)'
+            )
+
+    def _conn(self):
+        """
+        Return the SQLite connection for the current thread, opening it if
+        needed. SQLite connections cannot be shared between threads.
+
+        :rtype: sqlite3.Connection
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self._path, timeout=self._timeout)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT value, expires FROM cache WHERE key=?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] is not None and row[1] <= time.time():
+            with conn:
+                conn.execute(
+                    'DELETE FROM cache WHERE key=? AND expires=?',
+                    (key, row[1])
+                )
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires = None if ttl is None else time.time() + ttl
+        with self._conn() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, expires) '
+                'VALUES (?, ?, ?)', (key, json.dumps(value), expires)
+            )
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM cache WHERE key=?', (key,))
+
+    def invalidate_prefix(self, prefix):
+        with self._conn() as conn:
+            conn.execute(
+                'DELETE FROM cache WHERE substr(key, 1, ?)=?',
+                (len(prefix), prefix)
+            )
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute('DELETE FROM cache')
+
+    def purge_expired(self):
+        """
+        Remove all expired entries from the database.
+
+        :return: number of entries removed
+        :rtype: int
+        """
+        with self._conn() as conn:
+            cur = conn.execute(
+                'DELETE FROM cache WHERE expires IS NOT NULL AND expires<=?',
+                (time.time(),)
+            )
+        return cur.rowcount
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
@@ -39,12 +39,19 @@ import os
 import logging
 import imghdr
 import hashlib
+import inspect
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
 from lxml import etree
-from premailer import Premailer
 from urllib.parse import urlparse
 
 from jiveapi.version import VERSION, PROJECT_URL
+from jiveapi.css import NATIVE_INLINER, prune_unused_css
+from jiveapi.streams import DEFAULT_CHUNK_SIZE, SNIFF_BYTES
+from jiveapi.utils import concurrent_map
+from jiveapi.images import UPLOAD_COALESCER
 
 logger = logging.getLogger(__name__)
 
@@ -91,19 +98,50 @@ TAGSTYLES = {
 def newline_to_br(elem):
     """
     Helper function for :py:meth:`~.JiveContent.jiveize_html`.
-    Given a html Element, convert it to a string, add explicit <br /> tags
-    before all newlines, and return a new Element with that content.
+    Given a html Element, add explicit <br /> elements before all newlines in
+    the text of it and all of its descendants, modifying it in place.
+
+    This gives the same result as serializing the element, replacing every
+    ``\\n`` with ``<br/>\\n`` and parsing it again, without doing so:
+    comments and processing instructions have ``<br/>`` added to their text,
+    and a whitespace-only tail of ``elem`` is removed.
 
     :param elem: element to modify
     :type elem: ``lxml.etree._Element``
-    :return: modified element
+    :return: modified element (``elem``)
     :rtype: ``lxml.etree._Element``
     """
-    src = etree.tostring(elem).strip()
-    if isinstance(src, type(b'')):  # nocoverage
-        src = src.decode()
-    res = src.replace("\n", "<br/>\n")
-    return etree.fromstring(res + "\n")
+    if elem.tail is not None and elem.tail.strip() == '':
+        elem.tail = None
+    # snapshot the nodes, so that the new <br/> elements are not visited
+    for node in list(elem.iter()):
+        if node is not elem and node.tail is not None and '\n' in node.tail:
+            # add <br/>s after node; addnext() puts the new element before
+            # node's tail, so the tails are set once they are in place
+            parts = node.tail.split('\n')
+            node.tail = None
+            brs = [elem.makeelement('br', {}) for _ in parts[1:]]
+            for br in reversed(brs):
+                node.addnext(br)
+            node.tail = parts[0]
+            for br, part in zip(brs, parts[1:]):
+                br.tail = '\n' + part
+        text = node.text
+        if text is None or '\n' not in text:
+            continue
+        if not isinstance(node.tag, str):
+            # comment or processing instruction
+            node.text = text.replace('\n', '<br/>\n')
+            continue
+        # add <br/>s before the first child of node
+        parts = text.split('\n')
+        node.text = parts[0]
+        brs = [elem.makeelement('br', {}) for _ in parts[1:]]
+        for br in reversed(brs):
+            node.insert(0, br)
+        for br, part in zip(brs, parts[1:]):
+            br.tail = '\n' + part
+    return elem
 
 
 class JiveContent(object):
@@ -119,7 +157,9 @@ class JiveContent(object):
     :ref:`JiveContent Images Dict Format <images-dict-format>`.
     """
 
-    def __init__(self, api, image_dir=None):
+    def __init__(self, api, image_dir=None, image_workers=4,
+                 fingerprint_cache=None, image_registry=None,
+                 upload_coalescer=UPLOAD_COALESCER):
         """
         :param api: authenticated API instance
         :type api: jiveapi.api.JiveApi
@@ -127,8 +167,33 @@ class JiveContent(object):
           This should be an absolute path. If not specified, the result of
           :py:func:`os.getcwd` will be used.
         :type image_dir: str
+        :param image_workers: maximum number of local images to read and hash,
+          and to upload, concurrently when handling images (see
+          :py:meth:`~._upload_images`)
+        :type image_workers: int
+        :param fingerprint_cache: optional cache in which to store the sha256
+          sum and Content-Type of local images, keyed by their absolute path,
+          size and modification time, so that unchanged images do not need to
+          be read and hashed again (see :py:meth:`~._load_image_from_disk`).
+          To persist it across runs, use a
+          :py:class:`~jiveapi.cache.SQLiteCache`.
+        :type fingerprint_cache: :py:class:`~jiveapi.cache.CacheBackend`
+        :param image_registry: optional registry of uploaded images, shared
+          between documents, to consult before uploading an image that is not
+          in a document's images dict
+        :type image_registry: :py:class:`~jiveapi.images.ImageRegistry`
+        :param upload_coalescer: coalescer used to ensure that an image is
+          not uploaded again with the same API instance while an upload of it
+          is in progress, i.e. when documents sharing it are published
+          concurrently. Defaults to the process-wide
+          :py:data:`~jiveapi.images.UPLOAD_COALESCER`; set to None to disable.
+        :type upload_coalescer: :py:class:`~jiveapi.images.UploadCoalescer`
         """
         self._api = api
+        self._image_workers = image_workers
+        self._fingerprint_cache = fingerprint_cache
+        self._image_registry = image_registry
+        self._upload_coalescer = upload_coalescer
         if image_dir is None:
             self._image_dir = os.getcwd()
         else:
@@ -140,7 +205,8 @@ class JiveContent(object):
     def create_html_document(
         self, subject, html, tags=[], place_id=None, visibility=None,
         set_datetime=None, inline_css=True, jiveize=True, handle_images=True,
-        editable=False, toc=False, header_alert=None, footer_alert=None
+        editable=False, toc=False, header_alert=None, footer_alert=None,
+        css_inliner=None, prune_css=False
     ):
         """
         Create a HTML `Document <https://developers.jivesoftware.com/api/v3/clou
@@ -175,8 +241,10 @@ class JiveContent(object):
         :type set_datetime: datetime.datetime
         :param inline_css: if True, pass input HTML through
           :py:meth:`~.inline_css_etree` to convert any embedded CSS to inline
-          CSS so that Jive will preserve/respect it.
-        :type inline_css: bool
+          CSS so that Jive will preserve/respect it. This may also be the name
+          of the CSS inlining engine to use, ``premailer`` (the default if
+          True) or ``native``; see :py:meth:`~.inline_css_etree`.
+        :type inline_css: ``bool`` or ``str``
         :param jiveize: if True, pass input HTML through
           :py:meth:`~.jiveize_etree` to make it look more like how Jive styles
           HTML internally.
@@ -205,6 +273,15 @@ class JiveContent(object):
           box type (one of "info", "success", "warning" or "danger") and the
           string content.
         :type footer_alert: ``str`` or ``tuple``
+        :param css_inliner: if specified, the reusable inliner passed to
+          :py:meth:`~.inline_css_etree` when ``inline_css`` is not False, to
+          reuse parsed stylesheets across documents.
+        :type css_inliner: :py:class:`~jiveapi.css.CssInliner` or
+          :py:class:`~jiveapi.css.NativeInliner`
+        :param prune_css: if True and ``inline_css`` is not False, remove CSS
+          rules that do not match any element of the document with
+          :py:func:`jiveapi.css.prune_unused_css` before inlining CSS.
+        :type prune_css: bool
         :return: dict describing the created content object in Jive. See
           :ref:`JiveContent Return Dict Format <return-dict-format>` for
           details.
@@ -217,7 +294,8 @@ class JiveContent(object):
             subject, html, tags=tags, place_id=place_id, visibility=visibility,
             inline_css=inline_css, jiveize=jiveize, handle_images=handle_images,
             editable=editable, toc=toc, header_alert=header_alert,
-            footer_alert=footer_alert
+            footer_alert=footer_alert, css_inliner=css_inliner,
+            prune_css=prune_css
         )
         logger.debug('API call dict ready to send')
         if set_datetime is not None:
@@ -238,7 +316,7 @@ class JiveContent(object):
         self, content_id, subject, html, tags=[], place_id=None,
         visibility=None, set_datetime=None, inline_css=True, jiveize=True,
         handle_images=True, editable=False, toc=False, header_alert=None,
-        footer_alert=None, images={}
+        footer_alert=None, images={}, css_inliner=None, prune_css=False
     ):
         """
         Update a HTML `Document <https://developers.jivesoftware.com/api/v3/clou
@@ -278,8 +356,10 @@ class JiveContent(object):
         :type set_datetime: datetime.datetime
         :param inline_css: if True, pass input HTML through
           :py:meth:`~.inline_css_etree` to convert any embedded CSS to inline
-          CSS so that Jive will preserve/respect it.
-        :type inline_css: bool
+          CSS so that Jive will preserve/respect it. This may also be the name
+          of the CSS inlining engine to use, ``premailer`` (the default if
+          True) or ``native``; see :py:meth:`~.inline_css_etree`.
+        :type inline_css: ``bool`` or ``str``
         :param jiveize: if True, pass input HTML through
           :py:meth:`~.jiveize_etree` to make it look more like how Jive styles
           HTML internally.
@@ -314,6 +394,15 @@ class JiveContent(object):
           :ref:`JiveContent Return Dict Format <return-dict-format>` that is
           returned by this method or :py:meth:`~.create_html_document`.
         :type images: dict
+        :param css_inliner: if specified, the reusable inliner passed to
+          :py:meth:`~.inline_css_etree` when ``inline_css`` is not False, to
+          reuse parsed stylesheets across documents.
+        :type css_inliner: :py:class:`~jiveapi.css.CssInliner` or
+          :py:class:`~jiveapi.css.NativeInliner`
+        :param prune_css: if True and ``inline_css`` is not False, remove CSS
+          rules that do not match any element of the document with
+          :py:func:`jiveapi.css.prune_unused_css` before inlining CSS.
+        :type prune_css: bool
         :return: dict describing the created content object in Jive. See
           :ref:`JiveContent Return Dict Format <return-dict-format>` for
           details.
@@ -326,7 +415,8 @@ class JiveContent(object):
             subject, html, tags=tags, place_id=place_id, visibility=visibility,
             inline_css=inline_css, jiveize=jiveize, handle_images=handle_images,
             images=images, editable=editable, toc=toc,
-            header_alert=header_alert, footer_alert=footer_alert
+            header_alert=header_alert, footer_alert=footer_alert,
+            css_inliner=css_inliner, prune_css=prune_css
         )
         logger.debug('API call dict ready to send')
         if set_datetime is not None:
@@ -348,7 +438,8 @@ class JiveContent(object):
     def dict_for_html_document(
         self, subject, html, tags=[], place_id=None, visibility=None,
         inline_css=True, jiveize=True, handle_images=True, editable=False,
-        toc=False, header_alert=None, footer_alert=None, images={}
+        toc=False, header_alert=None, footer_alert=None, images={},
+        css_inliner=None, prune_css=False
     ):
         """
         Generate the API (dict/JSON) representation of a HTML
@@ -385,8 +476,10 @@ class JiveContent(object):
         :type set_datetime: datetime.datetime
         :param inline_css: if True, pass input HTML through
           :py:meth:`~.inline_css_etree` to convert any embedded CSS to inline
-          CSS so that Jive will preserve/respect it.
-        :type inline_css: bool
+          CSS so that Jive will preserve/respect it. This may also be the name
+          of the CSS inlining engine to use, ``premailer`` (the default if
+          True) or ``native``; see :py:meth:`~.inline_css_etree`.
+        :type inline_css: ``bool`` or ``str``
         :param jiveize: if True, pass input HTML through
           :py:meth:`~.jiveize_etree` to make it look more like how Jive styles
           HTML internally.
@@ -421,44 +514,134 @@ class JiveContent(object):
           :py:meth:`~.create_html_document` or
           :py:meth:`~.update_html_document`).
         :type images: dict
+        :param css_inliner: if specified, the reusable inliner passed to
+          :py:meth:`~.inline_css_etree` when ``inline_css`` is not False, to
+          reuse parsed stylesheets across documents.
+        :type css_inliner: :py:class:`~jiveapi.css.CssInliner` or
+          :py:class:`~jiveapi.css.NativeInliner`
+        :param prune_css: if True and ``inline_css`` is not False, remove CSS
+          rules that do not match any element of the document with
+          :py:func:`jiveapi.css.prune_unused_css` before inlining CSS.
+        :type prune_css: bool
         :return: 2-tuple of (``dict`` representation of the desired Document
           ready to pass to the Jive API, ``dict`` images data to persist for
           updates)
         :rtype: tuple
         """
-        if (
-            jiveize or inline_css or handle_images or toc or
-            header_alert is not None or footer_alert is not None
+        if JiveContent._uses_etree(
+            inline_css, jiveize, handle_images, toc, header_alert, footer_alert
         ):
-            logger.debug('Converting input HTML to etree')
-            doc = JiveContent.html_to_etree(html)
-            if inline_css:
-                logger.debug('Passing input HTML through inline_css_etree()')
-                doc = JiveContent.inline_css_etree(doc)
-            if jiveize:
-                logger.debug('Passing input HTML through jiveize_etree()')
-                doc = JiveContent.jiveize_etree(doc)
-            if toc:
-                logger.debug('Adding Jive RTM "Table of Contents" macro')
-                doc = JiveContent.etree_add_toc(doc)
-            if header_alert is not None:
-                logger.debug(
-                    'Adding Jive RTM "Alert" macro to header: %s', header_alert
-                )
-                doc = JiveContent.etree_add_alert(
-                    doc, header_alert, header=True
-                )
-            if footer_alert is not None:
-                logger.debug(
-                    'Adding Jive RTM "Alert" macro to footer: %s', footer_alert
-                )
-                doc = JiveContent.etree_add_alert(
-                    doc, footer_alert, header=False
-                )
+            doc = JiveContent.render_html_etree(
+                html, inline_css=inline_css, jiveize=jiveize, toc=toc,
+                header_alert=header_alert, footer_alert=footer_alert,
+                css_inliner=css_inliner, prune_css=prune_css
+            )
             if handle_images:
                 logger.debug('Passing input HTML through _upload_images()')
                 doc, images = self._upload_images(doc, images)
             html = etree.tostring(doc)
+        return self._html_document_dict(
+            subject, html, tags=tags, place_id=place_id,
+            visibility=visibility, editable=editable, toc=toc,
+            header_alert=header_alert, footer_alert=footer_alert
+        ), images
+
+    @staticmethod
+    def _uses_etree(
+        inline_css, jiveize, handle_images, toc, header_alert, footer_alert
+    ):
+        """
+        Return whether :py:meth:`~.dict_for_html_document` needs to parse the
+        HTML with these arguments; otherwise it is used as-is.
+
+        :rtype: bool
+        """
+        return bool(
+            jiveize or inline_css or handle_images or toc or
+            header_alert is not None or footer_alert is not None
+        )
+
+    @staticmethod
+    def render_html_etree(
+        html, inline_css=True, jiveize=True, toc=False, header_alert=None,
+        footer_alert=None, css_inliner=None, prune_css=False
+    ):
+        """
+        Parse a string of HTML and apply the transformations of
+        :py:meth:`~.dict_for_html_document` that do not need the Jive API (i.e.
+        everything except uploading images) to it. See
+        :py:meth:`~.dict_for_html_document` for the parameters.
+
+        :param html: HTML string
+        :type html: str
+        :param inline_css: whether to inline CSS, or the engine to use
+        :type inline_css: ``bool`` or ``str``
+        :param jiveize: whether to pass HTML through :py:meth:`~.jiveize_etree`
+        :type jiveize: bool
+        :param toc: whether to insert the "Table of Contents" macro
+        :type toc: bool
+        :param header_alert: header "Alert" macro content, if any
+        :type header_alert: ``str`` or ``tuple``
+        :param footer_alert: footer "Alert" macro content, if any
+        :type footer_alert: ``str`` or ``tuple``
+        :param css_inliner: reusable CSS inliner, if any
+        :type css_inliner: :py:class:`~jiveapi.css.CssInliner` or
+          :py:class:`~jiveapi.css.NativeInliner`
+        :param prune_css: whether to remove unused CSS rules before inlining
+        :type prune_css: bool
+        :return: root node of the transformed etree
+        :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+        """
+        logger.debug('Converting input HTML to etree')
+        doc = JiveContent.html_to_etree(html)
+        if inline_css:
+            if prune_css:
+                stats = prune_unused_css(doc)
+                logger.debug(
+                    'Pruned %d of %d CSS rules (%d bytes) in %.1f ms',
+                    stats.rules_dropped, stats.rules, stats.bytes_dropped,
+                    stats.elapsed * 1000
+                )
+            logger.debug('Passing input HTML through inline_css_etree()')
+            start = time.perf_counter()
+            doc = JiveContent.inline_css_etree(
+                doc, css_inliner=css_inliner,
+                engine='premailer' if inline_css is True else inline_css
+            )
+            logger.debug(
+                'Inlined CSS in %.1f ms', (time.perf_counter() - start) * 1000
+            )
+        if jiveize:
+            logger.debug('Passing input HTML through jiveize_etree()')
+            doc = JiveContent.jiveize_etree(doc)
+        if toc:
+            logger.debug('Adding Jive RTM "Table of Contents" macro')
+            doc = JiveContent.etree_add_toc(doc)
+        if header_alert is not None:
+            logger.debug(
+                'Adding Jive RTM "Alert" macro to header: %s', header_alert
+            )
+            doc = JiveContent.etree_add_alert(doc, header_alert, header=True)
+        if footer_alert is not None:
+            logger.debug(
+                'Adding Jive RTM "Alert" macro to footer: %s', footer_alert
+            )
+            doc = JiveContent.etree_add_alert(doc, footer_alert, header=False)
+        return doc
+
+    def _html_document_dict(
+        self, subject, html, tags=[], place_id=None, visibility=None,
+        editable=False, toc=False, header_alert=None, footer_alert=None
+    ):
+        """
+        Build the API (dict/JSON) representation of a HTML Document from its
+        final HTML, for :py:meth:`~.dict_for_html_document`.
+
+        :param html: final HTML of the Document
+        :type html: ``str`` or ``bytes``
+        :return: ``dict`` representation of the Document
+        :rtype: dict
+        """
         if isinstance(html, type(b'')):
             logger.debug('decode() etree.tostring() output')
             html = html.decode()
@@ -487,7 +670,108 @@ class JiveContent(object):
             footer_alert is not None or toc
         ):
             content['content']['editable'] = True
-        return content, images
+        return content
+
+    def render_many(self, documents, max_workers=None):
+        """
+        Generate the API representations of many HTML Documents, like calling
+        :py:meth:`~.dict_for_html_document` for each of them, but with the
+        CPU-bound HTML transformations (parsing, CSS inlining,
+        :py:meth:`~.jiveize_etree` and macro insertion; see
+        :py:meth:`~.render_html_etree`) run on a pool of ``max_workers``
+        processes. Images are uploaded and the API representations built in
+        this process, one document at a time, in order.
+
+        No more than ``2 * max_workers`` documents are sent to the pool ahead of
+        the consumer, so ``documents`` may be a very long (or lazy) iterable.
+        An exception raised for a document is raised by this generator when it
+        reaches that document.
+
+        ``css_inliner`` is not supported, as it cannot be shared with other
+        processes; use ``inline_css='native'`` to use the default
+        :py:class:`~jiveapi.css.NativeInliner` of each worker process, which
+        caches parsed stylesheets across the documents it handles.
+
+        :param documents: dicts of keyword arguments for
+          :py:meth:`~.dict_for_html_document`, including ``subject`` and
+          ``html``. Arguments and the HTML must be picklable.
+        :type documents: ``iterable`` of ``dict``
+        :param max_workers: number of worker processes; defaults to the number
+          of CPUs
+        :type max_workers: int
+        :return: generator of 2-tuples of (``dict`` representation of the
+          Document, ``dict`` images data to persist for updates), in the same
+          order as ``documents``
+        :rtype: ``generator``
+        :raises: TypeError if a document has missing or unknown arguments,
+          ValueError if a document has a ``css_inliner``, or any exception
+          raised by :py:meth:`~.dict_for_html_document`
+        """
+        params = inspect.signature(self.dict_for_html_document).parameters
+        defaults = {
+            name: param.default for name, param in params.items()
+            if param.default is not param.empty
+        }
+
+        def items():
+            for document in documents:
+                unknown = set(document) - set(params)
+                if unknown:
+                    raise TypeError(
+                        'Unknown dict_for_html_document() arguments: %s' %
+                        ', '.join(sorted(unknown))
+                    )
+                if 'subject' not in document or 'html' not in document:
+                    raise TypeError('Documents must have subject and html')
+                if document.get('css_inliner') is not None:
+                    raise ValueError(
+                        'css_inliner is not supported by render_many()'
+                    )
+                res = dict(defaults)
+                res.update(document)
+                yield res
+
+        for document, rendered, exc in concurrent_map(
+            _render_html_document, items(), max_workers or os.cpu_count(),
+            executor_class=ProcessPoolExecutor
+        ):
+            if exc is not None:
+                raise exc
+            yield self._finish_html_document(document, rendered)
+
+    def _finish_html_document(self, document, rendered):
+        """
+        Upload images and build the API representation of a Document rendered
+        by :py:func:`~._render_html_document`, for :py:meth:`~.render_many`.
+
+        :param document: :py:meth:`~.dict_for_html_document` keyword arguments
+        :type document: dict
+        :param rendered: return value of :py:func:`~._render_html_document`
+        :type rendered: tuple
+        :return: same as :py:meth:`~.dict_for_html_document`
+        :rtype: tuple
+        """
+        html, is_tree = rendered
+        images = document['images']
+        if html is None:
+            logger.debug(
+                'Rendered HTML of document "%s" cannot be passed between '
+                'processes; rendering it again in this process',
+                document['subject']
+            )
+            return self.dict_for_html_document(**document)
+        if is_tree is not None:
+            doc = _parse_rendered_html(html, is_tree)
+            logger.debug('Passing input HTML through _upload_images()')
+            doc, images = self._upload_images(doc, images)
+            html = etree.tostring(doc)
+        return self._html_document_dict(
+            document['subject'], html, tags=document['tags'],
+            place_id=document['place_id'], visibility=document['visibility'],
+            editable=document['editable'], toc=document['toc'],
+            header_alert=document['header_alert'],
+            footer_alert=document['footer_alert']
+        ), images
 
     @staticmethod
     def html_to_etree(html):
@@ -522,18 +806,49 @@ class JiveContent(object):
         )
 
     @staticmethod
-    def inline_css_etree(root):
+    def inline_css_etree(
+        root, css_inliner=None, engine='premailer', stylesheet_cache=None
+    ):
         """
-        Given an etree root node, uses
+        Given an etree root node, convert all CSS from
+        embedded/internal/external to inline, as Jive only allows inline CSS.
+
+        With the default ``premailer`` engine this uses
         `premailer's <http://github.com/peterbe/premailer>`_ ``transform``
-        method to convert all CSS from embedded/internal/external to inline, as
-        Jive only allows inline CSS.
+        method. The ``native`` engine uses
+        :py:class:`~jiveapi.css.NativeInliner`, which is much faster but
+        supports only ``<style>`` elements, and passes documents with anything
+        else to premailer.
 
         :param root: root node of etree to inline CSS in
         :type root: ``lxml.etree._Element``
+        :param css_inliner: if specified, use this reusable inliner (which
+          parses each distinct stylesheet only once) instead of a new
+          ``Premailer`` instance (for the ``premailer`` engine) or
+          :py:data:`jiveapi.css.NATIVE_INLINER` (for the ``native`` engine)
+        :type css_inliner: :py:class:`~jiveapi.css.CssInliner` or
+          :py:class:`~jiveapi.css.NativeInliner`
+        :param engine: CSS inlining engine; ``premailer`` or ``native``
+        :type engine: str
+        :param stylesheet_cache: if specified, replace links to external
+          stylesheets with their content from this cache before inlining,
+          instead of having premailer fetch them for every document. An
+          inliner passed as ``css_inliner`` may also have its own cache.
+        :type stylesheet_cache: :py:class:`~jiveapi.css.StylesheetCache`
         :return: root node of etree with CSS inlined
         :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+        :raises: ValueError if ``engine`` is not known
         """
+        if engine not in ('premailer', 'native'):
+            raise ValueError('Unknown CSS inlining engine: %s' % engine)
+        if stylesheet_cache is not None:
+            stylesheet_cache.resolve_links(root)
+        if css_inliner is not None:
+            return css_inliner.transform(root)
+        if engine == 'native':
+            return NATIVE_INLINER.transform(root)
+        # imported here so that the native engine does not need premailer
+        from premailer import Premailer
         return Premailer(root).transform()
 
     @staticmethod
@@ -579,7 +894,8 @@ class JiveContent(object):
           attributes.
 
         Elements which have a "jivemacro" attribute present will not be
-        modified.
+        modified. All of these rules are applied in a single traversal of the
+        tree, with the ``<pre>`` elements updated once it completes.
 
         :param root: root node of etree to jive-ize
         :type root: ``lxml.etree._Element``
@@ -589,42 +905,66 @@ class JiveContent(object):
         :return: root node of etree containing jive-ized HTML
         :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
         """
-        # sourceCode div cleanup
-        if no_sourcecode_style:
-            for code_div in root.xpath('//div[@class="sourceCode"]'):
-                del code_div.attrib['style']
-        # prefix all newlines in <pre> tags with ``<br />``
-        for pre in root.xpath('//pre'):
-            if 'jivemacro' in pre.attrib:
-                continue
-            pre.getparent().replace(pre, newline_to_br(pre))
-        # ok, now apply some general Fuel/Jive style fixes...
-        for element in root.iter():
+        # Every rule is applied to each element in a single document-order
+        # pass. The outermost ``<pre>`` elements are collected and have
+        # ``<br />`` added at the end, so that the new elements are not
+        # visited; this gives the same result because the other rules never
+        # add newlines to the tree.
+        pres = []
+        # children of jivemacro elements; parents are always visited first
+        macro_children = set()
+        for element in root.iter(etree.Element):
+            tag = element.tag
+            get = element.get
+            is_macro = get('jivemacro') is not None
+            if is_macro:
+                macro_children.update(element)
+            if tag == 'div':
+                # remove style from sourceCode divs
+                if no_sourcecode_style and get('class') == 'sourceCode':
+                    del element.attrib['style']
+            elif tag == 'pre':
+                # prefix all newlines in <pre> tags with ``<br />``, unless
+                # an enclosing <pre> already does so
+                if not is_macro and not any(
+                    p.get('jivemacro') is None
+                    for p in element.iterancestors('pre')
+                ):
+                    pres.append(element)
             # fix Sphinx footnote ``id`` elements
-            if element.attrib.get('id', '') != '':
-                _id = element.attrib['id']
-                if element.tag != 'a':
-                    element.append(etree.Element('a', name=_id))
+            _id = get('id')
+            if _id:
+                if tag != 'a':
+                    # appended elements are not visited by this iteration,
+                    # so apply the named anchor fix below right away
+                    element.append(
+                        etree.Element('a', name=_id.replace('-', '_'))
+                    )
                 else:
-                    if 'name' in element.attrib:
+                    if get('name') is not None:
                         logger.warning(
                             'Overwriting existing name (%s) on <a> with '
-                            'id="%s"', element.attrib['name'], _id
+                            'id="%s"', get('name'), _id
                         )
-                    element.attrib['name'] = _id
+                    element.set('name', _id)
             # update for jive styles as needed
+            style = TAGSTYLES.get(tag)
             if (
-                element.tag in TAGSTYLES.keys() and
-                'jivemacro' not in element.attrib and
-                'jivemacro' not in element.getparent().attrib
+                style is not None and
+                not is_macro and
+                element not in macro_children
             ):
-                element.attrib['style'] = TAGSTYLES[element.tag]
-        # fix named anchors;
-        for elem in root.xpath('//a'):
-            if 'name' in elem.attrib:
-                elem.attrib['name'] = elem.attrib['name'].replace('-', '_')
-            if elem.attrib.get('href', '').startswith('#'):
-                elem.attrib['href'] = elem.attrib['href'].replace('-', '_')
+                element.set('style', style)
+            # fix named anchors
+            if tag == 'a':
+                name = get('name')
+                if name is not None:
+                    element.set('name', name.replace('-', '_'))
+                href = get('href')
+                if href is not None and href.startswith('#'):
+                    element.set('href', href.replace('-', '_'))
+        for pre in pres:
+            newline_to_br(pre)
         return root
 
     @staticmethod
@@ -720,31 +1060,129 @@ class JiveContent(object):
     def _load_image_from_disk(self, img_path):
         """
         Given the path to an image taken from the ``src`` attribute of an
-        ``img`` tag, load it from disk. If the path is relative, it will be
-        loaded relative to ``self._image_dir``. Return a 3-tuple of a string
-        describing the Content-Type of the image, the raw bytes of the image
-        data, and the sha256 sum of the image data. The content type is
-        determined using the Python standard library's :py:func:`imghdr.what`.
+        ``img`` tag, find it on disk and read it to determine its content type
+        and hash. If the path is relative, it will be loaded relative to
+        ``self._image_dir``. Return a 3-tuple of a string describing the
+        Content-Type of the image, the absolute path to the image file, and the
+        sha256 sum of the image data. The content type is determined using the
+        Python standard library's :py:func:`imghdr.what`. The file is read in
+        chunks, so that memory use does not depend on the size of the image.
+
+        If this instance has a ``fingerprint_cache``, the content type and
+        sha256 sum are looked up in it by the absolute path, size and
+        modification time (in nanoseconds) of the file, and the file is only
+        read if they are not found.
 
         :param img_path: path to the image on disk
         :type img_path: str
-        :return: (``str`` Content-Type, ``bytes`` binary image content read
-          from disk, ``str`` hex sha256 sum of ``bytes``)
+        :return: (``str`` Content-Type, ``str`` absolute path to the image
+          file, ``str`` hex sha256 sum of the image data)
         :rtype: tuple
         """
         logger.debug('Load image from disk: %s', img_path)
         if not os.path.isabs(img_path):
             img_path = os.path.abspath(os.path.join(self._image_dir, img_path))
             logger.debug('Image absolute path: %s', img_path)
+        cache_key = None
+        if self._fingerprint_cache is not None:
+            st = os.stat(img_path)
+            cache_key = 'image-fingerprint:%s|%d|%d' % (
+                img_path, st.st_size, st.st_mtime_ns
+            )
+            cached = self._fingerprint_cache.get(cache_key)
+            if cached is not None:
+                logger.debug(
+                    'Found fingerprint of %s in cache: content-type=%s '
+                    'sha256=%s', img_path, cached['content_type'],
+                    cached['sha256']
+                )
+                return cached['content_type'], img_path, cached['sha256']
         with open(img_path, 'rb') as fh:
-            imgdata = fh.read()
-        content_type = 'image/' + imghdr.what(None, imgdata)
+            head = fh.read(SNIFF_BYTES)
+            content_type = 'image/' + imghdr.what(None, head)
+            img_hash = hashlib.sha256(head)
+            size = len(head)
+            for chunk in iter(lambda: fh.read(DEFAULT_CHUNK_SIZE), b''):
+                img_hash.update(chunk)
+                size += len(chunk)
+        logger.debug(
+            'Read %d byte image; found content-type as: %s',
+            size, content_type
+        )
+        img_sha256 = img_hash.hexdigest()
+        if cache_key is not None:
+            self._fingerprint_cache.set(
+                cache_key, {'content_type': content_type, 'sha256': img_sha256}
+            )
+        return content_type, img_path, img_sha256
+
+    def _upload_image(self, src, img_data, img_content_type):
+        """
+        Upload one local image for :py:meth:`~._upload_images`.
+
+        :param src: the value of the image tag's ``src`` attribute
+        :type src: str
+        :param img_data: path to the image file (or its content), as returned
+          by :py:meth:`~._load_image_from_disk`
+        :type img_data: str
+        :param img_content_type: MIME Content-Type of the image
+        :type img_content_type: str
+        :return: 2-tuple of (string user-facing URI to the image, dict Image
+          object representation), as returned by
+          :py:meth:`jiveapi.api.JiveApi.upload_image`
+        :rtype: tuple
+        """
+        img_fname = os.path.basename(src)
         logger.debug(
-            'Loaded %d byte image; found content-type as: %s',
-            len(imgdata), content_type
+            'Uploading Image with filename "%s" and MIME Content-Type '
+            '%s from img src="%s"', img_fname, img_content_type, src
+        )
+        # do the upload and capture response and Location
+        img_uri, api_response = self._api.upload_image(
+            img_data, img_fname, img_content_type
         )
-        img_sha256 = hashlib.sha256(imgdata).hexdigest()
-        return content_type, imgdata, img_sha256
+        logger.debug(
+            'Image uploaded for "%s"; id=%s Location=%s', src,
+            api_response['id'], img_uri
+        )
+        return img_uri, api_response
+
+    @staticmethod
+    def _rewrite_image_urls(root, imgs, locations):
+        """
+        Rewrite the ``src`` attributes of local images, and the ``href``
+        attributes of links to them, to their uploaded locations. Links are
+        found using an index of all ``a`` elements by ``href`` that is built
+        once, so that the cost is proportional to the number of images plus
+        the number of links, rather than their product.
+
+        :param root: root node of the document
+        :type root: ``lxml.etree._Element``
+        :param imgs: list of ``(img element, original src)`` 2-tuples, in
+          document order
+        :type imgs: list
+        :param locations: dict mapping original ``src`` values to their
+          uploaded locations
+        :type locations: dict
+        """
+        links = {}
+        for a in root.xpath('//a'):
+            href = a.get('href')
+            if href in locations:
+                links.setdefault(href, []).append(a)
+        for img, src in imgs:
+            img_uri = locations[src]
+            logger.debug('Rewrite img src from "%s" to "%s"', src, img_uri)
+            # set the src attribute to the Location
+            img.set('src', img_uri)
+        for src, img_uri in locations.items():
+            # update any links to the image
+            logger.debug(
+                'Rewriting %d links with href="%s" to href="%s"',
+                len(links.get(src, [])), src, img_uri
+            )
+            for a in links.get(src, []):
+                a.set('href', img_uri)
 
     def _upload_images(self, root, images={}):
         """
@@ -755,6 +1193,19 @@ class JiveContent(object):
         ``src`` attribute with the upload temporary URL and add an entry to
         the image dictionary (second element of the return value).
 
+        Distinct images are read and hashed, and then uploaded, concurrently
+        on up to ``image_workers`` (see :py:meth:`~.__init__`) threads. Each
+        image content (by sha256) is uploaded at most once. If this instance
+        has an ``image_registry``, images that are not in ``images`` are looked
+        up in it before being uploaded, and uploaded images are added to it.
+        Uploads are coalesced by the ``upload_coalescer``, so an image that is
+        being uploaded by another thread with the same API instance is not
+        uploaded again.
+        Once all uploads have finished, ``src`` and ``href`` attributes are
+        rewritten in document order. If an upload fails, the images that were
+        uploaded successfully are added to ``images`` before the exception is
+        raised.
+
         The format of the second element of the return value is the images dict
         format described in this class under
         :ref:`JiveContent Images Dict Format <images-dict-format>`.
@@ -769,15 +1220,26 @@ class JiveContent(object):
           for them)
         :rtype: tuple
         """
+        imgs = []
         for img in root.xpath('//img'):
             src = img.get('src')
             if not JiveContent._is_local_image(src):
                 logger.debug('Non-local image: %s', src)
                 continue
-            # if it's local, get the data, content type, and filename
-            img_content_type, img_data, img_sha256 = self._load_image_from_disk(
-                src
-            )
+            imgs.append((img, src))
+        # read and hash each distinct local image
+        srcs = list(OrderedDict((src, None) for _, src in imgs).keys())
+        loaded = {}
+        for src, res, exc in concurrent_map(
+            self._load_image_from_disk, srcs, self._image_workers
+        ):
+            if exc is not None:
+                raise exc
+            loaded[src] = res
+        # upload each distinct image that is not already in the images dict
+        to_upload = OrderedDict()
+        for src in srcs:
+            img_content_type, img_data, img_sha256 = loaded[src]
             if img_sha256 in images:
                 logger.debug(
                     'Image %s already uploaded per images dict; location=%s '
@@ -785,47 +1247,124 @@ class JiveContent(object):
                     images[img_sha256]['location'],
                     images[img_sha256]['jive_object']['id'], img_sha256
                 )
-                img.set('src', images[img_sha256]['location'])
-                # update any links to the image
+                continue
+            if img_sha256 in to_upload:
                 logger.debug(
-                    'Rewriting links with href="%s" to href="%s"',
-                    src, images[img_sha256]['location']
+                    'Image %s has the same content as %s (sha256=%s)', src,
+                    to_upload[img_sha256], img_sha256
                 )
-                for a in root.xpath('//a'):
-                    if a.get('href') == src:
-                        a.set('href', images[img_sha256]['location'])
                 continue
             logger.debug(
                 'Image %s content-type=%s sha256=%s',
                 src, img_content_type, img_sha256
             )
-            img_fname = os.path.basename(src)
-            logger.debug(
-                'Uploading Image with filename "%s" and MIME Content-Type '
-                '%s from img src="%s"', img_fname, img_content_type, src
-            )
-            # do the upload and capture response and Location
-            img_uri, api_response = self._api.upload_image(
-                img_data, img_fname, img_content_type
-            )
-            logger.debug(
-                'Image uploaded for "%s"; id=%s Location=%s', src,
-                api_response['id'], img_uri
+            to_upload[img_sha256] = src
+
+        def upload(sha):
+            if self._upload_coalescer is None:
+                return upload_once(sha)
+            return self._upload_coalescer.run(
+                (self._api, sha),
+                lambda: upload_once(sha)
             )
+
+        def upload_once(sha):
+            src = to_upload[sha]
+            if self._image_registry is not None:
+                entry = self._image_registry.get(sha)
+                if entry is not None:
+                    logger.debug(
+                        'Image %s already uploaded per image registry; '
+                        'location=%s id=%s (identified via sha256=%s)', src,
+                        entry['location'], entry['jive_object']['id'], sha
+                    )
+                    return entry['location'], entry['jive_object']
+            res = self._upload_image(src, loaded[src][1], loaded[src][0])
+            if self._image_registry is not None:
+                self._image_registry.set(sha, {
+                    'location': res[0],
+                    'jive_object': res[1],
+                    'local_path': src
+                })
+            return res
+
+        upload_exc = None
+        for img_sha256, res, exc in concurrent_map(
+            upload, list(to_upload.keys()), self._image_workers
+        ):
+            if exc is not None:
+                # record successful uploads before raising, so that they are
+                # not repeated
+                upload_exc = upload_exc or exc
+                continue
             # update image state dict
             images[img_sha256] = {
-                'location': img_uri,
-                'jive_object': api_response,
-                'local_path': src
+                'location': res[0],
+                'jive_object': res[1],
+                'local_path': to_upload[img_sha256]
             }
-            logger.debug('Rewrite img src from "%s" to "%s"', src, img_uri)
-            # set the src attribute to the Location
-            img.set('src', img_uri)
-            # update any links to the image
-            logger.debug(
-                'Rewriting links with href="%s" to href="%s"', src, img_uri
-            )
-            for a in root.xpath('//a'):
-                if a.get('href') == src:
-                    a.set('href', img_uri)
+        if upload_exc is not None:
+            raise upload_exc
+        # rewrite img src attributes and links to images, in document order
+        self._rewrite_image_urls(root, imgs, dict(
+            (src, images[loaded[src][2]]['location']) for src in srcs
+        ))
         return root, images
+
+
+def _parse_rendered_html(html, is_tree):
+    """
+    Parse HTML serialized by :py:func:`~._render_html_document`.
+
+    :param html: HTML serialized with ``method='html'``
+    :type html: bytes
+    :param is_tree: whether to return the whole document tree
+    :type is_tree: bool
+    :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+    """
+    root = etree.fromstring(html, etree.HTMLParser(huge_tree=True))
+    return root.getroottree() if is_tree else root
+
+
+def _render_html_document(document):
+    """
+    Worker function of :py:meth:`JiveContent.render_many`; apply
+    :py:meth:`JiveContent.render_html_etree` to a document in a worker
+    process.
+
+    If images are to be uploaded, the rendered tree has to be passed back to
+    the parent process; it is serialized as HTML, as XML serialization does
+    not survive re-parsing of documents with an ``xmlns`` attribute. As some
+    trees (i.e. with elements inside void elements) do not survive HTML
+    serialization either, the result is parsed again and None is returned if
+    it is not the same.
+
+    :param document: :py:meth:`JiveContent.dict_for_html_document` keyword
+      arguments, including defaults
+    :type document: dict
+    :return: 2-tuple of (rendered HTML or None, None if the HTML is final or
+      whether it is to be parsed by :py:func:`~._parse_rendered_html` as a
+      whole document tree)
+    :rtype: tuple
+    """
+    if not JiveContent._uses_etree(
+        document['inline_css'], document['jiveize'],
+        document['handle_images'], document['toc'], document['header_alert'],
+        document['footer_alert']
+    ):
+        return document['html'], None
+    doc = JiveContent.render_html_etree(
+        document['html'], inline_css=document['inline_css'],
+        jiveize=document['jiveize'], toc=document['toc'],
+        header_alert=document['header_alert'],
+        footer_alert=document['footer_alert'],
+        prune_css=document['prune_css']
+    )
+    if not document['handle_images']:
+        return etree.tostring(doc), None
+    is_tree = isinstance(doc, etree._ElementTree)
+    html = etree.tostring(doc, method='html')
+    if etree.tostring(_parse_rendered_html(html, is_tree)) != \
+            etree.tostring(doc):
+        return None, None
+    return html, is_tree
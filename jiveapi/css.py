@@ -0,0 +1,995 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+from urllib.parse import urljoin, urlparse
+
+import cssselect
+import requests
+from lxml import etree
+from lxml.cssselect import CSSSelector, LxmlTranslator
+
+from jiveapi.cache import MemoryCache
+from jiveapi.exceptions import RequestFailedException
+
+logger = logging.getLogger(__name__)
+
+#: Attribute premailer uses for per-element options
+#: (``premailer.Premailer.attribute_name``); documents using it are passed to
+#: premailer by :py:class:`~.NativeInliner`.
+PREMAILER_ATTRIBUTE = 'data-premailer'
+
+#: Pseudo-classes that depend on user interaction or browser state; rules
+#: using them cannot be inlined, and are kept in a ``<style>`` element by
+#: :py:class:`~.NativeInliner` (as premailer does).
+DYNAMIC_PSEUDO_CLASSES = frozenset([
+    'active', 'any-link', 'focus', 'focus-visible', 'focus-within', 'hover',
+    'link', 'local-link', 'target', 'visited'
+])
+
+# string literal (group 1) or comment
+_STRING_OR_COMMENT_RE = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S
+)
+# characters that are significant when splitting a stylesheet into rules
+_RULE_TOKEN_RE = re.compile(r'[{};"\'\\]')
+_IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.I)
+_ATTRIB_OR_STRING_RE = re.compile(r'\[[^\]]*\]|"[^"]*"|\'[^\']*\'')
+_PSEUDO_CLASS_RE = re.compile(r'(?<!:):([a-zA-Z][\w-]*)')
+_PSEUDO_RE = re.compile(r'::?([\w-]+)')
+
+#: Pseudo-classes and pseudo-elements (in addition to any written with two
+#: colons) ignored when matching selectors in :py:func:`~.prune_unused_css`
+_PRUNE_IGNORED_PSEUDO = DYNAMIC_PSEUDO_CLASSES | frozenset([
+    'before', 'after', 'first-line', 'first-letter'
+])
+
+#: Maximum number of compiled selectors :py:func:`~.prune_unused_css` holds
+#: per thread before discarding them
+_MAX_PRUNE_SELECTORS = 4096
+
+_prune_local = threading.local()
+
+#: A style rule with a single selector, as parsed by :py:class:`~.NativeInliner`
+_Rule = namedtuple(
+    '_Rule', ['selector', 'specificity', 'normal', 'important']
+)
+
+#: A stylesheet parsed by :py:class:`~.NativeInliner`; ``unsupported`` is a
+#: description of why the stylesheet cannot be handled natively, or None.
+_Stylesheet = namedtuple('_Stylesheet', ['rules', 'leftover', 'unsupported'])
+
+#: Result of :py:func:`~.prune_unused_css`: number of style rules found,
+#: number of them removed, number of bytes (UTF-8) removed from ``<style>``
+#: elements, and elapsed time in seconds.
+PruneStats = namedtuple(
+    'PruneStats', ['rules', 'rules_dropped', 'bytes_dropped', 'elapsed']
+)
+
+
+class StylesheetCache(object):
+    """
+    Cache of external stylesheets linked from documents with
+    ``<link rel="stylesheet">``, used by :py:class:`~.CssInliner`,
+    :py:class:`~.NativeInliner` and
+    :py:meth:`jiveapi.content.JiveContent.inline_css_etree` to replace such
+    links with ``<style>`` elements before inlining CSS, so that each
+    stylesheet is fetched at most once instead of once per document.
+
+    Stylesheets are stored by URL in a :py:class:`~jiveapi.cache.CacheBackend`;
+    to keep them between runs (or to build documents without network access),
+    use a :py:class:`~jiveapi.cache.SQLiteCache`. The same backend may also be
+    used for other purposes, as keys are prefixed with
+    :py:attr:`~.KEY_PREFIX`. In ``offline`` mode nothing is fetched; links to
+    stylesheets that are not cached are removed with a warning.
+    """
+
+    #: Prefix of the cache keys of stylesheets
+    KEY_PREFIX = 'stylesheet:'
+
+    def __init__(
+        self, backend=None, ttl=None, offline=False, base_url=None,
+        session=None, timeout=30
+    ):
+        """
+        :param backend: cache backend to store stylesheets in; defaults to a
+          new :py:class:`~jiveapi.cache.MemoryCache`
+        :type backend: :py:class:`~jiveapi.cache.CacheBackend`
+        :param ttl: if specified, number of seconds after which cached
+          stylesheets expire and are fetched again
+        :type ttl: float
+        :param offline: if True, never fetch stylesheets; only use those
+          already cached
+        :type offline: bool
+        :param base_url: if specified, URL that relative ``href`` attributes
+          are resolved against. Links with relative URLs are otherwise left for
+          the CSS inliner to handle.
+        :type base_url: str
+        :param session: session to fetch stylesheets with; defaults to the
+          :py:mod:`requests` module
+        :type session: :py:class:`requests.Session`
+        :param timeout: timeout in seconds for fetching a stylesheet
+        :type timeout: float
+        """
+        if backend is None:
+            backend = MemoryCache()
+        self._backend = backend
+        self._ttl = ttl
+        self._offline = offline
+        self._base_url = base_url
+        self._session = session if session is not None else requests
+        self._timeout = timeout
+        self._fetch_lock = threading.Lock()
+        #: Number of stylesheets fetched
+        self.fetches = 0
+
+    def url_for(self, href):
+        """
+        Return the absolute HTTP(S) URL of a stylesheet link, or None if it
+        cannot be determined (i.e. a relative URL without a ``base_url``, or a
+        ``file:`` URL).
+
+        :param href: ``href`` attribute of the link
+        :type href: str
+        :return: absolute URL or None
+        :rtype: str
+        """
+        href = href.strip()
+        if self._base_url is not None:
+            href = urljoin(self._base_url, href)
+        elif href.startswith('//'):
+            href = 'https:' + href
+        if urlparse(href).scheme.lower() not in ('http', 'https'):
+            return None
+        return href
+
+    def get(self, url):
+        """
+        Return the content of the stylesheet at ``url``, fetching and caching
+        it if it is not cached (and not in offline mode).
+
+        :param url: absolute URL of the stylesheet
+        :type url: str
+        :return: stylesheet content, or None if not cached in offline mode
+        :rtype: str
+        :raises: :py:exc:`~.RequestFailedException` if the stylesheet cannot
+          be fetched
+        """
+        key = self.KEY_PREFIX + url
+        css = self._backend.get(key)
+        if css is not None or self._offline:
+            return css
+        # one fetch per stylesheet, even for concurrent documents
+        with self._fetch_lock:
+            css = self._backend.get(key)
+            if css is None:
+                css = self._fetch(url)
+                self._backend.set(key, css, ttl=self._ttl)
+        return css
+
+    def set(self, url, css):
+        """
+        Store the content of a stylesheet, i.e. to prepare a cache for use in
+        offline mode.
+
+        :param url: absolute URL of the stylesheet
+        :type url: str
+        :param css: stylesheet content
+        :type css: str
+        """
+        self._backend.set(self.KEY_PREFIX + url, css, ttl=self._ttl)
+
+    def _fetch(self, url):
+        logger.debug('Fetching stylesheet %s', url)
+        self.fetches += 1
+        res = self._session.get(url, timeout=self._timeout)
+        if res.status_code > 299:
+            raise RequestFailedException(res)
+        return res.text
+
+    def resolve_links(self, root):
+        """
+        Replace every ``<link rel="stylesheet">`` element in an etree that has
+        an HTTP(S) URL with a ``<style>`` element containing the stylesheet,
+        keeping its ``media`` attribute. Links with other URLs are left
+        unchanged. In offline mode, links to stylesheets that are not cached
+        are removed.
+
+        :param root: root node of etree
+        :type root: ``lxml.etree._Element``
+        :return: ``root``, modified in place
+        :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+        :raises: :py:exc:`~.RequestFailedException` if a stylesheet cannot be
+          fetched
+        """
+        if isinstance(root, etree._ElementTree):
+            page = root.getroot()
+        else:
+            page = root
+        for link in list(page.iter('link')):
+            if 'stylesheet' not in link.get('rel', '').lower().split():
+                continue
+            url = self.url_for(link.get('href', ''))
+            if url is None:
+                continue
+            css = self.get(url)
+            parent = link.getparent()
+            if css is None:
+                logger.warning(
+                    'Stylesheet %s is not cached; removing link to it '
+                    '(offline mode)', url
+                )
+                if link.tail:
+                    prev = link.getprevious()
+                    if prev is not None:
+                        prev.tail = (prev.tail or '') + link.tail
+                    else:
+                        parent.text = (parent.text or '') + link.tail
+                parent.remove(link)
+                continue
+            style = link.makeelement('style', {'type': 'text/css'})
+            if link.get('media') is not None:
+                style.set('media', link.get('media'))
+            style.text = css
+            style.tail = link.tail
+            parent.replace(link, style)
+        return root
+
+
+class _CachingInliner(object):
+    """
+    Base class for inliners that keep a bounded, thread-safe LRU cache of
+    parsed stylesheets, keyed by the sha256 sum of their content.
+    """
+
+    def __init__(self, maxsize=128):
+        """
+        :param maxsize: maximum number of parsed stylesheets to hold; when
+          exceeded, the least recently used one is discarded. None for
+          unlimited.
+        :type maxsize: int
+        """
+        self._maxsize = maxsize
+        # key -> parsed stylesheet; ordered by last use
+        self._parsed = OrderedDict()
+        self._lock = threading.Lock()
+        #: Number of stylesheets found in the cache
+        self.hits = 0
+        #: Number of stylesheets that had to be parsed
+        self.misses = 0
+
+    @staticmethod
+    def _digest(css_body):
+        return hashlib.sha256(css_body.encode('utf-8')).hexdigest()
+
+    def _cached(self, key, parse):
+        """
+        Return the cached parsed stylesheet for ``key``, calling ``parse()``
+        and caching its result if there is none.
+
+        :param key: cache key, starting with the stylesheet's sha256 sum
+        :type key: tuple
+        :param parse: callable returning the parsed stylesheet
+        :type parse: ``callable``
+        :return: parsed stylesheet
+        """
+        with self._lock:
+            if key in self._parsed:
+                self._parsed.move_to_end(key)
+                self.hits += 1
+                return self._parsed[key]
+            self.misses += 1
+        logger.debug('Parsing stylesheet %s', key[0])
+        value = parse()
+        with self._lock:
+            # another thread may have parsed it in the meantime
+            value = self._parsed.setdefault(key, value)
+            self._parsed.move_to_end(key)
+            if self._maxsize is not None:
+                while len(self._parsed) > self._maxsize:
+                    self._parsed.popitem(last=False)
+        return value
+
+    def clear(self):
+        """
+        Discard all parsed stylesheets.
+        """
+        with self._lock:
+            self._parsed.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._parsed)
+
+
+class _Leftover(list):
+    """
+    List of the rules of a stylesheet that premailer could not inline (i.e.
+    media queries and pseudo-classes), with the CSS text premailer renders for
+    them once it has been generated.
+    """
+
+    css_text = None
+
+
+@lru_cache(maxsize=None)
+def _caching_premailer():
+    """
+    Return the ``_CachingPremailer`` class used by :py:class:`~.CssInliner`.
+    premailer is only imported when this is first called, so that using the
+    native engine does not require importing it.
+
+    :rtype: ``type``
+    """
+    from premailer import Premailer
+
+    class _CachingPremailer(Premailer):
+        """
+        :py:class:`premailer.Premailer` that gets the parsed rules of each
+        stylesheet from a :py:class:`~.CssInliner` instead of parsing them
+        itself.
+        """
+
+        def __init__(self, html, inliner, **kwargs):
+            super(_CachingPremailer, self).__init__(html, **kwargs)
+            self._inliner = inliner
+
+        def _parse_style_rules(self, css_body, ruleset_index):
+            return self._inliner._style_rules(self, css_body, ruleset_index)
+
+        def _parse_style_rules_uncached(self, css_body, ruleset_index):
+            return super(_CachingPremailer, self)._parse_style_rules(
+                css_body, ruleset_index
+            )
+
+        def _css_rules_to_string(self, rules):
+            if isinstance(rules, _Leftover):
+                return self._inliner._leftover_css(self, rules)
+            return super(_CachingPremailer, self)._css_rules_to_string(rules)
+
+        def _css_rules_to_string_uncached(self, rules):
+            return super(_CachingPremailer, self)._css_rules_to_string(rules)
+
+    return _CachingPremailer
+
+
+class CssInliner(_CachingInliner):
+    """
+    Reusable `premailer <http://github.com/peterbe/premailer>`_ CSS inliner
+    for :py:meth:`jiveapi.content.JiveContent.inline_css_etree`, for use when
+    converting many documents that share the same stylesheets.
+
+    Each distinct stylesheet (keyed by the sha256 sum of its content and its
+    position in the document) is parsed, validated and turned into rules once,
+    and the result is reused for every later document that includes it. One
+    instance may be shared by many threads.
+    """
+
+    def __init__(self, maxsize=128, stylesheet_cache=None, **kwargs):
+        """
+        :param maxsize: maximum number of parsed stylesheets to hold; when
+          exceeded, the least recently used one is discarded. None for
+          unlimited.
+        :type maxsize: int
+        :param stylesheet_cache: if specified, replace links to external
+          stylesheets with their content from this cache before inlining
+        :type stylesheet_cache: :py:class:`~.StylesheetCache`
+        :param kwargs: keyword arguments passed to
+          :py:class:`premailer.Premailer` for every document
+        """
+        super(CssInliner, self).__init__(maxsize=maxsize)
+        self._stylesheet_cache = stylesheet_cache
+        self._kwargs = kwargs
+
+    def transform(self, root):
+        """
+        Convert all CSS in an etree from embedded/internal/external to inline,
+        using premailer's ``transform`` method.
+
+        :param root: root node of etree to inline CSS in
+        :type root: ``lxml.etree._Element``
+        :return: root node of etree with CSS inlined
+        :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+        """
+        if self._stylesheet_cache is not None:
+            self._stylesheet_cache.resolve_links(root)
+        return _caching_premailer()(root, self, **self._kwargs).transform()
+
+    def _style_rules(self, premailer, css_body, ruleset_index):
+        """
+        Return the result of ``premailer._parse_style_rules()`` for a
+        stylesheet, from the cache if possible.
+
+        :param premailer: the Premailer instance asking for the rules
+        :type premailer: ``_CachingPremailer``
+        :param css_body: stylesheet content
+        :type css_body: str
+        :param ruleset_index: position of the stylesheet in the document
+        :type ruleset_index: int
+        :return: 2-tuple of (list of rules to inline, list of leftover rules)
+        :rtype: tuple
+        """
+        if not css_body:
+            return [], []
+
+        def parse():
+            rules, leftover = premailer._parse_style_rules_uncached(
+                css_body, ruleset_index
+            )
+            return rules, _Leftover(leftover)
+
+        return self._cached((self._digest(css_body), ruleset_index), parse)
+
+    def _leftover_css(self, premailer, leftover):
+        """
+        Return the CSS text premailer renders for the leftover rules of a
+        cached stylesheet, generating it only once. Premailer modifies the
+        parsed rules when doing so, so this is done under a lock.
+
+        :param premailer: the Premailer instance asking for the CSS
+        :type premailer: ``_CachingPremailer``
+        :param leftover: leftover rules from :py:meth:`~._style_rules`
+        :type leftover: ``_Leftover``
+        :return: CSS text
+        :rtype: str
+        """
+        with self._lock:
+            if leftover.css_text is None:
+                leftover.css_text = premailer._css_rules_to_string_uncached(
+                    leftover
+                )
+            return leftover.css_text
+
+
+def _strip_comments(css):
+    """
+    Remove comments (outside of string literals) from CSS.
+
+    :param css: CSS text
+    :type css: str
+    :return: CSS text without comments
+    :rtype: str
+    """
+    if '/*' not in css:
+        return css
+    return _STRING_OR_COMMENT_RE.sub(lambda m: m.group(1) or ' ', css)
+
+
+def _split(text, sep):
+    """
+    Split ``text`` on ``sep``, except within string literals, parentheses or
+    brackets.
+
+    :param text: text to split
+    :type text: str
+    :param sep: single separator character
+    :type sep: str
+    :return: list of parts
+    :rtype: list
+    """
+    if '"' not in text and "'" not in text and '(' not in text and \
+            '[' not in text:
+        return text.split(sep)
+    parts = []
+    depth = 0
+    quote = None
+    start = 0
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quote is not None:
+            if c == '\\':
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c == '"' or c == "'":
+            quote = c
+        elif c == '(' or c == '[':
+            depth += 1
+        elif c == ')' or c == ']':
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+        i += 1
+    parts.append(text[start:])
+    return parts
+
+
+def parse_declarations(css):
+    """
+    Parse a CSS declaration block (i.e. the content of a ``style`` attribute)
+    into lists of normal and ``!important`` declarations. Property names are
+    lower-cased, and ``!important`` is removed from values. Declarations
+    without a name or value are ignored.
+
+    :param css: CSS declaration block
+    :type css: str
+    :return: 2-tuple of lists of (name, value) 2-tuples; normal declarations
+      and important declarations
+    :rtype: tuple
+    """
+    normal = []
+    important = []
+    for decl in _split(_strip_comments(css), ';'):
+        name, sep, value = decl.partition(':')
+        name = name.strip().lower()
+        value = value.strip()
+        if not sep or not name:
+            continue
+        target = normal
+        if '!' in value:
+            stripped = _IMPORTANT_RE.sub('', value)
+            if stripped != value:
+                value = stripped
+                target = important
+        if value:
+            target.append((name, value))
+    return normal, important
+
+
+def _iter_statements(css):
+    """
+    Split a stylesheet into top-level statements, yielding (prelude, block)
+    2-tuples; ``block`` is the content of the statement's ``{}`` block, or
+    None for statements ending in ``;`` (i.e. ``@import``).
+
+    :param css: stylesheet text without comments
+    :type css: str
+    :raises: ValueError if braces or string literals are unbalanced
+    """
+    depth = 0
+    quote = None
+    start = 0
+    block_start = None
+    skip_to = -1
+    for m in _RULE_TOKEN_RE.finditer(css):
+        pos = m.start()
+        if pos < skip_to:
+            continue
+        c = m.group(0)
+        if c == '\\':
+            skip_to = pos + 2
+        elif quote is not None:
+            if c == quote:
+                quote = None
+        elif c == '"' or c == "'":
+            quote = c
+        elif c == '{':
+            if depth == 0:
+                block_start = pos
+            depth += 1
+        elif c == '}':
+            depth -= 1
+            if depth < 0:
+                raise ValueError('unbalanced "}" at %d' % pos)
+            if depth == 0:
+                yield css[start:block_start].strip(), css[block_start + 1:pos]
+                start = pos + 1
+        elif depth == 0:
+            # ';'
+            yield css[start:pos].strip(), None
+            start = pos + 1
+    if depth != 0 or quote is not None:
+        raise ValueError('unterminated block or string')
+    if css[start:].strip():
+        raise ValueError('trailing content: %r' % css[start:].strip()[:40])
+
+
+def _parse_stylesheet(css):
+    """
+    Parse a stylesheet for :py:class:`~.NativeInliner`.
+
+    Each selector of each style rule becomes a :py:class:`~._Rule`. Rules with
+    pseudo-elements or :py:data:`~.DYNAMIC_PSEUDO_CLASSES`, and ``@media``
+    rules, are kept as leftover CSS text. Other at-rules and rules with ``*``
+    selectors are ignored, as premailer does by default.
+
+    :param css: stylesheet text
+    :type css: str
+    :return: parsed stylesheet
+    :rtype: ``_Stylesheet``
+    """
+    rules = []
+    leftover = []
+    css = _strip_comments(css).replace('<!--', ' ').replace('-->', ' ')
+    try:
+        statements = list(_iter_statements(css))
+    except ValueError as ex:
+        return _Stylesheet([], [], 'cannot parse stylesheet: %s' % ex)
+    for prelude, block in statements:
+        if block is None or not prelude:
+            continue
+        if prelude.startswith('@'):
+            if prelude[1:6].lower() == 'media':
+                leftover.append('%s {%s}' % (prelude, block.strip()))
+            continue
+        normal, important = parse_declarations(block)
+        if not normal and not important:
+            continue
+        for selector in _split(prelude, ','):
+            selector = selector.strip()
+            if not selector or '*' in selector:
+                continue
+            try:
+                parsed = cssselect.parse(selector)[0]
+            except cssselect.SelectorError as ex:
+                return _Stylesheet(
+                    [], [], 'unsupported selector %r: %s' % (selector, ex)
+                )
+            pseudo_classes = _PSEUDO_CLASS_RE.findall(
+                _ATTRIB_OR_STRING_RE.sub('', selector)
+            )
+            if parsed.pseudo_element is not None or any(
+                p.lower() in DYNAMIC_PSEUDO_CLASSES for p in pseudo_classes
+            ):
+                leftover.append('%s {%s}' % (selector, block.strip()))
+                continue
+            try:
+                # compile now to find selectors that cannot be translated
+                CSSSelector(selector)
+            except (cssselect.SelectorError, ValueError) as ex:
+                return _Stylesheet(
+                    [], [], 'unsupported selector %r: %s' % (selector, ex)
+                )
+            rules.append(
+                _Rule(selector, parsed.specificity(), normal, important)
+            )
+    return _Stylesheet(rules, leftover, None)
+
+
+def _drop_pseudo(m):
+    if m.group(0).startswith('::') or \
+            m.group(1).lower() in _PRUNE_IGNORED_PSEUDO:
+        return ''
+    return m.group(0)
+
+
+def _strip_pseudo(selector):
+    """
+    Remove pseudo-elements and :py:data:`~.DYNAMIC_PSEUDO_CLASSES` from a
+    selector, outside of attribute selectors and strings.
+
+    :param selector: CSS selector
+    :type selector: str
+    :rtype: str
+    """
+    parts = []
+    pos = 0
+    for m in _ATTRIB_OR_STRING_RE.finditer(selector):
+        parts.append(_PSEUDO_RE.sub(_drop_pseudo, selector[pos:m.start()]))
+        parts.append(m.group(0))
+        pos = m.end()
+    parts.append(_PSEUDO_RE.sub(_drop_pseudo, selector[pos:]))
+    return ''.join(parts)
+
+
+def _selector_matches(selector, page, results):
+    """
+    Return whether a selector may match an element of ``page``. Pseudo-elements
+    and :py:data:`~.DYNAMIC_PSEUDO_CLASSES` are removed from the selector
+    before matching, and selectors that cannot be matched are assumed to
+    match. Results are stored in the ``results`` dict.
+
+    :param selector: CSS selector
+    :type selector: str
+    :param page: root element of the document
+    :type page: ``lxml.etree._Element``
+    :param results: selector -> bool cache for the document
+    :type results: dict
+    :rtype: bool
+    """
+    res = results.get(selector)
+    if res is not None:
+        return res
+    base = _strip_pseudo(selector) if ':' in selector else selector
+    compiled = getattr(_prune_local, 'selectors', None)
+    if compiled is None or len(compiled) > _MAX_PRUNE_SELECTORS:
+        compiled = _prune_local.selectors = {}
+    xpath = compiled.get(base)
+    if xpath is None and base not in compiled:
+        try:
+            xpath = etree.XPath(
+                'boolean(%s)' % LxmlTranslator().css_to_xpath(base)
+            )
+        except (cssselect.SelectorError, etree.XPathError, ValueError):
+            xpath = None
+        compiled[base] = xpath
+    res = results[selector] = True if xpath is None else xpath(page)
+    return res
+
+
+def _prune_rules(css, matches):
+    """
+    Remove style rules whose selectors match nothing from a stylesheet,
+    including those in ``@media`` rules; other at-rules are kept.
+
+    :param css: stylesheet text without comments
+    :type css: str
+    :param matches: callable returning whether a selector matches anything
+    :type matches: ``callable``
+    :return: 3-tuple of (pruned stylesheet text, number of style rules,
+      number of style rules removed)
+    :rtype: tuple
+    :raises: ValueError if the stylesheet cannot be parsed
+    """
+    kept = []
+    rules = dropped = 0
+    for prelude, block in _iter_statements(css):
+        if block is None:
+            if prelude:
+                kept.append(prelude + ';')
+            continue
+        if prelude.startswith('@'):
+            if prelude[1:6].lower() != 'media':
+                kept.append('%s {%s}' % (prelude, block))
+                continue
+            inner, num, num_dropped = _prune_rules(block, matches)
+            rules += num
+            dropped += num_dropped
+            if inner:
+                kept.append('%s {\n%s\n}' % (prelude, inner))
+            continue
+        rules += 1
+        selectors = [x.strip() for x in _split(prelude, ',')]
+        used = [x for x in selectors if x and matches(x)]
+        if not used:
+            dropped += 1
+            continue
+        if len(used) < len(selectors):
+            prelude = ', '.join(used)
+        kept.append('%s {%s}' % (prelude, block))
+    return '\n'.join(kept), rules, dropped
+
+
+def prune_unused_css(root):
+    """
+    Remove style rules that do not match any element of a document from its
+    ``<style>`` elements, so that the CSS inliner does not have to match them.
+    Selectors of a rule that match nothing are removed from it, and ``@media``
+    rules left empty are removed. Pseudo-elements and
+    :py:data:`~.DYNAMIC_PSEUDO_CLASSES` are ignored when matching, and rules
+    with selectors that cannot be matched, other at-rules and ``<style>``
+    elements with a ``data-premailer`` attribute or that cannot be parsed are
+    kept unchanged. Comments are removed.
+
+    This mostly benefits documents inlined with a new
+    :py:class:`premailer.Premailer` each; as pruned stylesheets differ between
+    documents, it defeats the stylesheet caches of :py:class:`~.CssInliner`
+    and :py:class:`~.NativeInliner`.
+
+    :param root: root node of etree
+    :type root: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+    :return: pruning statistics
+    :rtype: :py:class:`~.PruneStats`
+    """
+    start = time.perf_counter()
+    if isinstance(root, etree._ElementTree):
+        page = root.getroot()
+    else:
+        page = root
+    results = {}
+
+    def matches(selector):
+        return _selector_matches(selector, page, results)
+
+    rules = dropped = num_bytes = 0
+    for element in list(page.iter('style')):
+        if element.get(PREMAILER_ATTRIBUTE) is not None:
+            continue
+        before = element.text or ''
+        css = _strip_comments(before).replace('<!--', ' ').replace('-->', ' ')
+        try:
+            after, num, num_dropped = _prune_rules(css, matches)
+        except ValueError as ex:
+            logger.debug('Not pruning unparseable stylesheet: %s', ex)
+            continue
+        rules += num
+        dropped += num_dropped
+        num_bytes += len(before.encode('utf-8')) - len(after.encode('utf-8'))
+        element.text = after
+    return PruneStats(rules, dropped, num_bytes, time.perf_counter() - start)
+
+
+class NativeInliner(_CachingInliner):
+    """
+    CSS inliner for :py:meth:`jiveapi.content.JiveContent.inline_css_etree`
+    that works on the lxml tree directly, without premailer or cssutils. It
+    handles the subset of CSS that Jive needs: ``<style>`` elements containing
+    style rules with any selector supported by ``lxml.cssselect``, applied in
+    cascade order by specificity, source order and ``!important``
+    (``!important`` rules override existing ``style`` attributes, and
+    ``!important`` declarations in ``style`` attributes override everything).
+    Declarations are not validated or normalized, and no HTML attributes
+    (i.e. ``bgcolor``) are added.
+
+    Rules that cannot be inlined (``@media`` rules, pseudo-elements and
+    :py:data:`~.DYNAMIC_PSEUDO_CLASSES`) are kept in their ``<style>``
+    element. Documents that use anything else it does not support -
+    ``<link rel="stylesheet">`` elements (unless resolved with a
+    :py:class:`~.StylesheetCache`), ``data-premailer`` attributes,
+    stylesheets it cannot parse or selectors ``lxml.cssselect`` cannot
+    translate - are passed to premailer instead.
+
+    Like :py:class:`~.CssInliner`, parsed stylesheets are cached by the
+    sha256 sum of their content and an instance may be shared by many threads.
+    """
+
+    def __init__(self, maxsize=128, fallback=None, stylesheet_cache=None):
+        """
+        :param maxsize: maximum number of parsed stylesheets to hold; when
+          exceeded, the least recently used one is discarded. None for
+          unlimited.
+        :type maxsize: int
+        :param fallback: inliner to use for documents that cannot be handled
+          natively; if None, a new :py:class:`premailer.Premailer` is used for
+          each of them.
+        :type fallback: :py:class:`~.CssInliner`
+        :param stylesheet_cache: if specified, replace links to external
+          stylesheets with their content from this cache before inlining, so
+          that such documents can be handled natively
+        :type stylesheet_cache: :py:class:`~.StylesheetCache`
+        """
+        super(NativeInliner, self).__init__(maxsize=maxsize)
+        self._fallback = fallback
+        self._stylesheet_cache = stylesheet_cache
+        # compiled selectors are not shared between threads
+        self._local = threading.local()
+        #: Number of documents passed to premailer
+        self.fallbacks = 0
+
+    def _selector(self, selector):
+        """
+        Return the compiled ``CSSSelector`` for a selector string, cached for
+        the current thread.
+
+        :param selector: CSS selector
+        :type selector: str
+        :rtype: ``lxml.cssselect.CSSSelector``
+        """
+        selectors = getattr(self._local, 'selectors', None)
+        if selectors is None:
+            selectors = self._local.selectors = {}
+        sel = selectors.get(selector)
+        if sel is None:
+            sel = selectors[selector] = CSSSelector(selector)
+        return sel
+
+    def _stylesheet(self, css_body):
+        """
+        Return the parsed stylesheet for some CSS text, from the cache if
+        possible.
+
+        :param css_body: stylesheet text
+        :type css_body: str
+        :rtype: ``_Stylesheet``
+        """
+        return self._cached(
+            (self._digest(css_body),), lambda: _parse_stylesheet(css_body)
+        )
+
+    def _fall_back(self, root, reason):
+        logger.debug('Inlining CSS with premailer: %s', reason)
+        with self._lock:
+            self.fallbacks += 1
+        if self._fallback is not None:
+            return self._fallback.transform(root)
+        from premailer import Premailer
+        return Premailer(root).transform()
+
+    def transform(self, root):
+        """
+        Convert all CSS in ``<style>`` elements of an etree to inline
+        ``style`` attributes.
+
+        :param root: root node of etree to inline CSS in
+        :type root: ``lxml.etree._Element``
+        :return: root node of etree with CSS inlined
+        :rtype: ``lxml.etree._Element`` or ``lxml.etree._ElementTree``
+        """
+        if self._stylesheet_cache is not None:
+            self._stylesheet_cache.resolve_links(root)
+        if isinstance(root, etree._ElementTree):
+            page = root.getroot()
+        else:
+            page = root
+        sheets = []
+        for element in page.iter('style', 'link'):
+            if element.tag == 'link':
+                rel = element.get('rel', '').lower().split()
+                if 'stylesheet' in rel:
+                    return self._fall_back(root, 'external stylesheet')
+                continue
+            if element.get(PREMAILER_ATTRIBUTE) is not None:
+                return self._fall_back(
+                    root, '%s attribute' % PREMAILER_ATTRIBUTE
+                )
+            media = element.get('media')
+            if media and media not in ('all', 'screen'):
+                continue
+            sheet = self._stylesheet(element.text or '')
+            if sheet.unsupported is not None:
+                return self._fall_back(root, sheet.unsupported)
+            sheets.append((element, sheet))
+        # element -> list of (specificity, sheet index, rule index, rule)
+        matches = {}
+        for sheet_idx, (_, sheet) in enumerate(sheets):
+            for rule_idx, rule in enumerate(sheet.rules):
+                for element in self._selector(rule.selector)(page):
+                    matches.setdefault(element, []).append(
+                        (rule.specificity, sheet_idx, rule_idx, rule)
+                    )
+        for element, found in matches.items():
+            found.sort(key=lambda x: x[:3])
+            inline = element.get('style')
+            if inline:
+                inline_normal, inline_important = parse_declarations(inline)
+            else:
+                inline_normal = inline_important = []
+            props = OrderedDict()
+            for item in found:
+                props.update(item[3].normal)
+            props.update(inline_normal)
+            for item in found:
+                props.update(item[3].important)
+            props.update(inline_important)
+            style = '; '.join(
+                '%s:%s' % (k, v) for k, v in props.items()
+                if v.lower() != 'unset'
+            )
+            if style:
+                element.set('style', style)
+        for element, sheet in sheets:
+            if sheet.leftover:
+                element.text = '\n'.join(sheet.leftover)
+            else:
+                element.getparent().remove(element)
+        if isinstance(root, etree._ElementTree):
+            return root
+        return root.getroottree()
+
+
+#: Default :py:class:`~.NativeInliner` used by
+#: :py:meth:`jiveapi.content.JiveContent.inline_css_etree` for the ``native``
+#: engine when no inliner is given.
+NATIVE_INLINER = NativeInliner()
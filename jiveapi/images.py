@@ -0,0 +1,219 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import threading
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+
+class ImageRegistry(object):
+    """
+    Content-addressed registry of images that have been uploaded to Jive,
+    keyed by the sha256 sum of the image data, for use by
+    :py:class:`~jiveapi.content.JiveContent` to avoid uploading the same image
+    for every document that uses it. Entries have the same format as the
+    values of the
+    :ref:`JiveContent Images Dict Format <images-dict-format>`.
+
+    Entries are stored in a :py:class:`~jiveapi.cache.CacheBackend`; to share
+    a registry between processes and runs, use a
+    :py:class:`~jiveapi.cache.SQLiteCache`. The same backend may also be used
+    for other purposes, as registry keys are prefixed with
+    :py:attr:`~.KEY_PREFIX`.
+
+    Images uploaded to Jive are temporary until they are used in content, and
+    may later be removed from the server. Stale entries can be handled by
+    specifying a ``ttl`` after which entries expire, a ``validator`` callable
+    that is consulted whenever an entry is found, and/or by calling
+    :py:meth:`~.evict` directly.
+    """
+
+    #: Prefix of the cache keys of registry entries
+    KEY_PREFIX = 'image:'
+
+    def __init__(self, backend, ttl=None, validator=None):
+        """
+        :param backend: cache backend to store entries in
+        :type backend: :py:class:`~jiveapi.cache.CacheBackend`
+        :param ttl: if specified, number of seconds after which entries expire
+        :type ttl: float
+        :param validator: if specified, a callable that is passed the sha256
+          sum and the entry dict of every entry found by :py:meth:`~.get`, and
+          returns True if the entry may be used or False if it should be
+          evicted. See :py:func:`~.location_validator`.
+        :type validator: ``callable``
+        """
+        self._backend = backend
+        self._ttl = ttl
+        self._validator = validator
+
+    def _key(self, sha256):
+        return self.KEY_PREFIX + sha256
+
+    def get(self, sha256):
+        """
+        Return the entry for the image with the specified sha256 sum, or None
+        if there is no valid entry for it.
+
+        :param sha256: hex sha256 sum of the image data
+        :type sha256: str
+        :return: entry dict with ``location``, ``jive_object`` and
+          ``local_path`` keys, or None
+        :rtype: dict
+        """
+        entry = self._backend.get(self._key(sha256))
+        if entry is None:
+            return None
+        if self._validator is not None and not self._validator(sha256, entry):
+            logger.debug(
+                'Evicting invalid image registry entry for sha256=%s '
+                '(location=%s)', sha256, entry['location']
+            )
+            self.evict(sha256)
+            return None
+        return entry
+
+    def set(self, sha256, entry):
+        """
+        Store the entry for the image with the specified sha256 sum.
+
+        :param sha256: hex sha256 sum of the image data
+        :type sha256: str
+        :param entry: dict with ``location``, ``jive_object`` and
+          ``local_path`` keys
+        :type entry: dict
+        """
+        self._backend.set(self._key(sha256), entry, ttl=self._ttl)
+
+    def evict(self, sha256):
+        """
+        Remove the entry for the image with the specified sha256 sum, if any.
+
+        :param sha256: hex sha256 sum of the image data
+        :type sha256: str
+        """
+        self._backend.delete(self._key(sha256))
+
+    def clear(self):
+        """
+        Remove all entries from the registry.
+        """
+        self._backend.invalidate_prefix(self.KEY_PREFIX)
+
+
+def location_validator(api):
+    """
+    Return an :py:class:`~.ImageRegistry` ``validator`` that considers an
+    entry valid if its ``location`` can still be retrieved from the Jive
+    server using ``api``. Only the response headers are read.
+
+    :param api: authenticated API instance
+    :type api: :py:class:`~jiveapi.api.JiveApi`
+    :return: validator callable
+    :rtype: ``callable``
+    """
+    def validator(sha256, entry):
+        res = api._request('GET', entry['location'], stream=True)
+        res.close()
+        logger.debug(
+            'GET %s returned %d %s', entry['location'], res.status_code,
+            res.reason
+        )
+        return res.status_code == 200
+
+    return validator
+
+
+class UploadCoalescer(object):
+    """
+    Single-flight coalescing of image uploads within a process, used by
+    :py:class:`~jiveapi.content.JiveContent` so that an image is not uploaded
+    more than once when many documents that use it are published
+    concurrently.
+
+    The first caller of :py:meth:`~.run` for a key performs the upload; any
+    other callers for the same key while it is in progress wait for it and
+    receive the same result (or exception). Nothing is retained once the
+    upload finishes; to reuse uploaded images across documents, use an
+    :py:class:`~.ImageRegistry`.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> Future for in-progress upload
+        self._in_flight = {}
+
+    def run(self, key, func):
+        """
+        Return the result of ``func()`` for ``key``, calling it unless another
+        thread is already calling it for ``key``, in which case wait for and
+        return (or raise) the result of that call.
+
+        :param key: hashable key identifying the upload, i.e. a 2-tuple of the
+          :py:class:`~jiveapi.api.JiveApi` instance and the sha256 sum of the
+          image
+        :param func: callable that performs the upload and returns its result
+        :type func: ``callable``
+        :return: the return value of ``func``
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+        if not owner:
+            logger.debug('Waiting for in-flight upload of %s', key)
+            return future.result()
+        try:
+            result = func()
+        except BaseException as ex:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(ex)
+            raise
+        with self._lock:
+            del self._in_flight[key]
+        future.set_result(result)
+        return result
+
+
+#: Process-wide :py:class:`~.UploadCoalescer` used by
+#: :py:class:`~jiveapi.content.JiveContent` by default.
+UPLOAD_COALESCER = UploadCoalescer()
@@ -41,10 +41,95 @@ from requests import Response
 from requests.utils import guess_json_utf
 from requests.compat import json as complexjson
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
 logger = logging.getLogger(__name__)
 
 JIVE_SECURITY_RE = re.compile(r'^throw.*;\s*')
 
+#: Bytes that may follow the JSON Security String before the JSON itself.
+JSON_WHITESPACE = b' \t\n\r\f\v'
+
+#: Names of the response encodings that the fast decoding path in
+#: :py:func:`~.loads_jive_bytes` handles.
+UTF8_ENCODINGS = frozenset(['utf-8', 'utf8', 'utf_8'])
+
+
+def _json_start(content):
+    """
+    Return the index of the first byte of JSON in ``content``, after the
+    `JSON Security String
+    <https://developers.jivesoftware.com/api/v3/cloud/rest/index.html
+    #security>`_ (``throw ...;``) and any whitespace following it.
+
+    :param content: raw response body
+    :type content: bytes
+    :return: index of the first byte after the security string
+    :rtype: int
+    """
+    if not content.startswith(b'throw'):
+        return 0
+    idx = content.find(b';')
+    if idx == -1:
+        return 0
+    idx += 1
+    length = len(content)
+    while idx < length and content[idx:idx + 1] in JSON_WHITESPACE:
+        idx += 1
+    return idx
+
+
+def loads_jive_bytes(content):
+    """
+    Deserialize a raw (UTF-8 encoded) Jive API response body, skipping the
+    leading JSON Security String if present. Unlike
+    :py:func:`~.loads_jive_json`, this does not decode the body to a string or
+    run a regular expression over it. If `orjson
+    <https://github.com/ijl/orjson>`_ is installed, it is used to decode the
+    body in place, without copying it; otherwise `ujson
+    <https://github.com/ultrajson/ultrajson>`_ is used if installed, falling
+    back to the standard library ``json``.
+
+    :param content: raw response body
+    :type content: bytes
+    :return: deserialized JSON
+    :raises ValueError: If the response body is not valid UTF-8 JSON.
+    """
+    start = _json_start(content)
+    if orjson is not None:
+        return orjson.loads(memoryview(content)[start:])
+    if start:
+        content = content[start:]
+    if ujson is not None:
+        return ujson.loads(content)
+    return complexjson.loads(content.decode('utf-8'))
+
+
+def loads_jive_json(content, **kwargs):
+    """
+    Deserialize a string of Jive API response JSON, stripping the leading
+    `JSON Security String
+    <https://developers.jivesoftware.com/api/v3/cloud/rest/index.html
+    #security>`_ if present. This is used by :py:meth:`~.JiveResponse.json`
+    and is exposed for HTTP clients other than ``requests``.
+
+    :param content: decoded response body
+    :type content: str
+    :param kwargs: Optional arguments that ``json.loads`` takes.
+    :return: deserialized JSON
+    :raises ValueError: If the response body does not contain valid json.
+    """
+    content = JIVE_SECURITY_RE.sub('', content)
+    return complexjson.loads(content, **kwargs)
+
 
 def requests_hook(response, **_):
     """
@@ -54,10 +139,16 @@ def requests_hook(response, **_):
 
     Add this to a :py:class:`requests.Session` like
     ``session.hooks['response'].append(requests_hook)``
+
+    The response is converted in place by changing its class, so no new
+    object is created and none of its attributes are copied. This works for
+    any :py:class:`requests.Response` (including those built by transport
+    adapters that replace the session's own, such as betamax), as
+    :py:class:`~.JiveResponse` adds no attributes of its own.
     """
-    res = JiveResponse()
-    res.__dict__.update(response.__dict__)
-    return res
+    if not isinstance(response, JiveResponse):
+        response.__class__ = JiveResponse
+    return response
 
 
 class JiveResponse(Response):
@@ -73,9 +164,26 @@ class JiveResponse(Response):
         Returns the json-encoded content of a response, if any, with the
         leading JSON Security String stripped off.
 
+        If no ``kwargs`` are given and the response is UTF-8 encoded (which is
+        the case for all Jive API responses), the body is decoded directly
+        from bytes by :py:func:`~.loads_jive_bytes`. Otherwise, or if that
+        fails, this falls back to decoding the response text in the same way
+        as :py:meth:`requests.Response.json`.
+
         :param kwargs: Optional arguments that ``json.loads`` takes.
         :raises ValueError: If the response body does not contain valid json.
         """
+        if not kwargs and self.content:
+            encoding = self.encoding
+            if encoding is None:
+                encoding = guess_json_utf(self.content)
+            if encoding is not None and encoding.lower() in UTF8_ENCODINGS:
+                try:
+                    return loads_jive_bytes(self.content)
+                except ValueError:
+                    logger.debug(
+                        'Fast JSON decoding failed; falling back to text'
+                    )
         content = self.text
         if not self.encoding and self.content and len(self.content) > 3:
             # No encoding set. JSON RFC 4627 section 3 states we should expect
@@ -92,8 +200,7 @@ class JiveResponse(Response):
                     # and the server didn't bother to tell us what codec *was*
                     # used.
                     pass
-        content = JIVE_SECURITY_RE.sub('', content)
-        return complexjson.loads(content, **kwargs)
+        return loads_jive_json(content, **kwargs)
 
     def __repr__(self):
         return '<JiveResponse [%s]>' % self.status_code
@@ -0,0 +1,188 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+#: Endpoint class for requests that read data (``GET``).
+READ = 'read'
+
+#: Endpoint class for requests that create or modify content.
+WRITE = 'write'
+
+#: Endpoint class for image uploads.
+IMAGE = 'image'
+
+
+class TokenBucket(object):
+    """
+    Thread-safe token bucket. Tokens are added continuously at ``rate`` per
+    second up to a maximum of ``burst``; each :py:meth:`~.acquire` removes
+    tokens, blocking until enough are available.
+
+    Callers reserve tokens in the order they call :py:meth:`~.acquire`, so
+    concurrent callers are served first-come first-served and the long-run
+    rate never exceeds ``rate``.
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: number of tokens added per second
+        :type rate: float
+        :param burst: maximum number of tokens the bucket can hold, i.e. the
+          number of requests that may be made at once after a period of
+          inactivity. Defaults to ``rate`` (rounded up to at least 1).
+        :type burst: float
+        """
+        if rate <= 0:
+            raise ValueError('rate must be greater than zero')
+        self.rate = float(rate)
+        if burst is None:
+            burst = max(1.0, self.rate)
+        self.burst = float(burst)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Remove ``tokens`` from the bucket without blocking, and return the
+        number of seconds the caller must wait before proceeding.
+
+        :param tokens: number of tokens to take
+        :type tokens: float
+        :return: seconds to wait before the tokens are available
+        :rtype: float
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Take ``tokens`` from the bucket, sleeping until they are available.
+
+        :param tokens: number of tokens to take
+        :type tokens: float
+        :return: number of seconds spent waiting
+        :rtype: float
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class RateLimiter(object):
+    """
+    Client-side rate limiter consulted by :py:class:`~.JiveApi` before every
+    request (including retries). A single instance may be shared by any number
+    of :py:class:`~.JiveApi` instances and threads, to keep their combined
+    request rate within a Jive tenant's quota.
+
+    Every request takes a token from the overall bucket. Optionally, separate
+    buckets can be configured for classes of endpoints (:py:data:`~.READ`,
+    :py:data:`~.WRITE` and :py:data:`~.IMAGE` uploads); a request of such a
+    class must also take a token from its class's bucket.
+    """
+
+    def __init__(self, rate, burst=None, classes=None):
+        """
+        :param rate: overall maximum requests per second
+        :type rate: float
+        :param burst: overall maximum number of requests that may be made at
+          once after a period of inactivity; see :py:class:`~.TokenBucket`
+        :type burst: float
+        :param classes: optional per-endpoint-class limits; a dict whose keys
+          are endpoint classes (:py:data:`~.READ`, :py:data:`~.WRITE` or
+          :py:data:`~.IMAGE`) and whose values are either a float rate or a
+          2-tuple of (rate, burst)
+        :type classes: dict
+        """
+        self._bucket = TokenBucket(rate, burst)
+        self._classes = {}
+        for name, spec in (classes or {}).items():
+            if isinstance(spec, type(())):
+                self._classes[name] = TokenBucket(*spec)
+            else:
+                self._classes[name] = TokenBucket(spec)
+        self._stats_lock = threading.Lock()
+        self._waited = 0.0
+
+    @property
+    def waited_seconds(self):
+        """
+        Return the total number of seconds that callers have spent waiting on
+        this limiter.
+
+        :rtype: float
+        """
+        with self._stats_lock:
+            return self._waited
+
+    def acquire(self, endpoint_class=READ):
+        """
+        Block until a request of the given endpoint class may be made.
+
+        :param endpoint_class: the class of endpoint being requested;
+          :py:data:`~.READ`, :py:data:`~.WRITE` or :py:data:`~.IMAGE`
+        :type endpoint_class: str
+        :return: number of seconds spent waiting
+        :rtype: float
+        """
+        delay = self._bucket.reserve()
+        if endpoint_class in self._classes:
+            delay = max(delay, self._classes[endpoint_class].reserve())
+        if delay > 0:
+            logger.debug(
+                'Rate limiting %s request for %.3f seconds',
+                endpoint_class, delay
+            )
+            with self._stats_lock:
+                self._waited += delay
+            time.sleep(delay)
+        return delay
@@ -0,0 +1,185 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+#: HTTP methods that are safe to repeat, because sending them more than once
+#: has the same effect as sending them once.
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+
+class RetryPolicy(object):
+    """
+    Policy describing when and how :py:class:`~.JiveApi` retries requests that
+    fail with a transient error, such as HTTP 429 (Too Many Requests), 502
+    (Bad Gateway), 503 (Service Unavailable) or 504 (Gateway Timeout), or a
+    connection error.
+
+    Delays between attempts grow exponentially (``backoff_factor * 2 **
+    attempt``) up to ``max_backoff``, optionally with random jitter to keep
+    many clients from retrying in lockstep. If the response includes a
+    ``Retry-After`` header, that delay is used instead (up to
+    ``max_retry_after``).
+
+    Only requests that are safe to repeat are retried. Idempotent methods
+    (see :py:data:`~.IDEMPOTENT_METHODS`, which includes the ``PUT`` used to
+    update content) are retried on any retryable status or connection error.
+    Other methods, such as the ``POST`` used to create content or upload
+    images, are only retried when the server rejected the request without
+    processing it: HTTP 429, or a timeout while connecting.
+    """
+
+    def __init__(self, max_retries=5, backoff_factor=0.5, max_backoff=60.0,
+                 jitter=True, retry_statuses=(429, 502, 503, 504),
+                 respect_retry_after=True, max_retry_after=300.0):
+        """
+        :param max_retries: maximum number of retries of a single request
+          (not counting the initial attempt)
+        :type max_retries: int
+        :param backoff_factor: delay in seconds before the first retry; each
+          subsequent retry doubles the delay
+        :type backoff_factor: float
+        :param max_backoff: maximum computed delay between attempts, in seconds
+        :type max_backoff: float
+        :param jitter: if True, randomize each computed delay to between half
+          and all of its value
+        :type jitter: bool
+        :param retry_statuses: HTTP status codes that should be retried
+        :type retry_statuses: ``tuple`` of ``int``
+        :param respect_retry_after: if True, use the delay from the response's
+          ``Retry-After`` header when present
+        :type respect_retry_after: bool
+        :param max_retry_after: maximum delay in seconds to honor from a
+          ``Retry-After`` header
+        :type max_retry_after: float
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def should_retry(self, method, attempt, response=None, exception=None):
+        """
+        Determine whether a request should be retried.
+
+        :param method: HTTP method of the request
+        :type method: str
+        :param attempt: number of retries already made for this request
+        :type attempt: int
+        :param response: the response received, if any
+        :type response: :py:class:`requests.Response`
+        :param exception: the exception raised instead of receiving a
+          response, if any
+        :type exception: Exception
+        :return: whether or not the request should be retried
+        :rtype: bool
+        """
+        if attempt >= self.max_retries:
+            return False
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        if exception is not None:
+            if isinstance(exception, requests.exceptions.ConnectTimeout):
+                return True
+            return idempotent and isinstance(
+                exception, (
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout
+                )
+            )
+        if response is None or response.status_code not in \
+                self.retry_statuses:
+            return False
+        return idempotent or response.status_code == 429
+
+    def backoff(self, attempt, response=None):
+        """
+        Return the number of seconds to wait before making retry number
+        ``attempt + 1`` of a request.
+
+        :param attempt: number of retries already made for this request
+        :type attempt: int
+        :param response: the response that triggered the retry, if any
+        :type response: :py:class:`requests.Response`
+        :return: delay in seconds
+        :rtype: float
+        """
+        if self.respect_retry_after and response is not None:
+            retry_after = self._retry_after(response)
+            if retry_after is not None:
+                return min(retry_after, self.max_retry_after)
+        delay = min(self.max_backoff, self.backoff_factor * (2 ** attempt))
+        if self.jitter:
+            delay = random.uniform(delay / 2.0, delay)
+        return delay
+
+    @staticmethod
+    def _retry_after(response):
+        """
+        Parse the ``Retry-After`` header of a response, which may be either a
+        number of seconds or a HTTP date.
+
+        :param response: the response to get the header from
+        :type response: :py:class:`requests.Response`
+        :return: delay in seconds, or None if the header is absent or invalid
+        :rtype: ``float`` or ``None``
+        """
+        value = (response.headers or {}).get('Retry-After')
+        if value is None:
+            return None
+        value = value.strip()
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            when = None
+        if when is None:
+            logger.debug('Unable to parse Retry-After header: %s', value)
+            return None
+        return max(0.0, when.timestamp() - time.time())
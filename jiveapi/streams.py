@@ -0,0 +1,348 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import io
+import binascii
+import hashlib
+import imghdr
+import logging
+
+logger = logging.getLogger(__name__)
+
+#: Default size in bytes of the chunks that streamed bodies are read in
+DEFAULT_CHUNK_SIZE = 65536
+
+#: Number of bytes at the start of a file used to detect its image type; this
+#: is the amount that :py:func:`imghdr.what` reads.
+SNIFF_BYTES = 32
+
+
+def sniff_image_type(head):
+    """
+    Given the first :py:data:`~.SNIFF_BYTES` bytes of an image, return its
+    MIME Content-Type as determined by :py:func:`imghdr.what`, or None if the
+    type could not be determined.
+
+    :param head: initial bytes of the image
+    :type head: bytes
+    :return: MIME Content-Type, i.e. ``image/png``
+    :rtype: str
+    """
+    kind = imghdr.what(None, head)
+    if kind is None:
+        return None
+    return 'image/' + kind
+
+
+class ImageStream(object):
+    """
+    Iterator over the body of a streamed :py:class:`requests.Response` (as
+    returned by :py:meth:`jiveapi.api.JiveApi.iter_image`), yielding it in
+    chunks of bytes and computing its size and SHA256 hash as it goes. Only
+    one chunk is held in memory at a time.
+
+    The underlying response (and its connection) is released once the body
+    has been fully read; to stop reading early, call :py:meth:`~.close` or use
+    the instance as a context manager.
+    """
+
+    def __init__(self, response, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param response: streamed response to read the body of
+        :type response: :py:class:`requests.Response`
+        :param chunk_size: maximum size in bytes of each chunk
+        :type chunk_size: int
+        """
+        self.response = response
+        self.chunk_size = chunk_size
+        #: number of bytes read so far
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._chunks = None
+
+    @property
+    def sha256(self):
+        """
+        Return the hex SHA256 digest of the bytes read so far; once the stream
+        is exhausted, this is the hash of the whole body.
+
+        :rtype: str
+        """
+        return self._hash.hexdigest()
+
+    @property
+    def content_type(self):
+        """
+        Return the Content-Type of the response, if it had one.
+
+        :rtype: str
+        """
+        return self.response.headers.get('Content-Type')
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._chunks is None:
+            self._chunks = self.response.iter_content(
+                chunk_size=self.chunk_size
+            )
+        try:
+            chunk = next(self._chunks)
+        except StopIteration:
+            logger.debug(
+                'Read %d bytes from %s (sha256 %s)', self.size,
+                self.response.url, self.sha256
+            )
+            self.close()
+            raise
+        self.size += len(chunk)
+        self._hash.update(chunk)
+        return chunk
+
+    def close(self):
+        """
+        Close the underlying response, releasing its connection.
+        """
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MultipartImageBody(object):
+    """
+    Streaming ``multipart/form-data`` request body for uploading a single
+    file (as used by :py:meth:`jiveapi.api.JiveApi.upload_image`). The file is
+    read in chunks as the body is sent, rather than being read into memory
+    first, and its SHA256 hash is computed on the way through. Its
+    Content-Type is detected from the first :py:data:`~.SNIFF_BYTES` bytes if
+    not specified.
+
+    This is a read-only file-like object with a known length, so
+    :py:mod:`requests` sends it with a ``Content-Length`` header. It can be
+    rewound with ``seek(0)`` (i.e. to retry the request) if the underlying
+    file is seekable.
+    """
+
+    def __init__(self, fileobj_or_path, filename=None, content_type=None,
+                 field_name='file', chunk_size=DEFAULT_CHUNK_SIZE,
+                 boundary=None):
+        """
+        :param fileobj_or_path: binary file-like object to read the file
+          content from, starting at its current position, or the path of a
+          file to open. Files opened by this class are closed by
+          :py:meth:`~.close`.
+        :type fileobj_or_path: ``str`` or file-like object
+        :param filename: filename to send for the file; defaults to the base
+          name of the file
+        :type filename: str
+        :param content_type: MIME Content-Type of the file; if not specified,
+          it is detected with :py:func:`~.sniff_image_type`, falling back to
+          ``application/octet-stream``
+        :type content_type: str
+        :param field_name: name of the form field
+        :type field_name: str
+        :param chunk_size: size in bytes of the chunks to read the file in
+        :type chunk_size: int
+        :param boundary: multipart boundary; randomly generated if not
+          specified
+        :type boundary: str
+        :raises ValueError: if the size of the file cannot be determined
+        """
+        if hasattr(fileobj_or_path, 'read'):
+            self._fh = fileobj_or_path
+            self._close_fh = False
+        else:
+            self._fh = open(fileobj_or_path, 'rb')
+            self._close_fh = True
+        self.chunk_size = chunk_size
+        try:
+            self._start = self._fh.tell()
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            self._start = None
+        #: size of the file in bytes
+        self.file_size = self._get_file_size()
+        self._head = self._fh.read(SNIFF_BYTES)
+        if filename is None:
+            filename = getattr(self._fh, 'name', None)
+            if not isinstance(filename, str):
+                filename = 'image'
+            filename = os.path.basename(filename)
+        if content_type is None:
+            content_type = sniff_image_type(self._head)
+            if content_type is None:
+                content_type = 'application/octet-stream'
+        self.filename = filename
+        #: MIME Content-Type of the file
+        self.file_content_type = content_type
+        if boundary is None:
+            boundary = binascii.hexlify(os.urandom(16)).decode('ascii')
+        #: Content-Type header value for the body
+        self.content_type = 'multipart/form-data; boundary=%s' % boundary
+        self._preamble = (
+            '--%s\r\nContent-Disposition: form-data; name="%s"; '
+            'filename="%s"\r\nContent-Type: %s\r\n\r\n' % (
+                boundary, field_name,
+                filename.replace('\\', '\\\\').replace('"', '%22'),
+                content_type
+            )
+        ).encode('utf-8')
+        self._epilogue = ('\r\n--%s--\r\n' % boundary).encode('utf-8')
+        self._reset()
+
+    def _get_file_size(self):
+        """
+        Return the number of bytes in the file after its current position.
+
+        :rtype: int
+        :raises ValueError: if the size cannot be determined
+        """
+        if self._start is None:
+            raise ValueError(
+                'Cannot determine size of non-seekable file %s' % self._fh
+            )
+        try:
+            return os.fstat(self._fh.fileno()).st_size - self._start
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            pass
+        end = self._fh.seek(0, os.SEEK_END)
+        self._fh.seek(self._start)
+        return end - self._start
+
+    def _reset(self):
+        #: number of bytes of the file read so far
+        self.size = 0
+        self._hash = hashlib.sha256()
+        self._chunks = self._iter_chunks()
+        self._chunk = b''
+        self._pos = 0
+
+    def _iter_chunks(self):
+        yield self._preamble
+        chunk = self._head
+        while chunk:
+            self.size += len(chunk)
+            self._hash.update(chunk)
+            yield chunk
+            chunk = self._fh.read(self.chunk_size)
+        if self.size != self.file_size:
+            raise IOError(
+                'Read %d bytes from %s; expected %d' % (
+                    self.size, self.filename, self.file_size
+                )
+            )
+        logger.debug(
+            'Read %d bytes from %s (sha256 %s)', self.size, self.filename,
+            self.sha256
+        )
+        yield self._epilogue
+
+    @property
+    def sha256(self):
+        """
+        Return the hex SHA256 digest of the file content read so far; once
+        the body has been completely read, this is the hash of the whole file.
+
+        :rtype: str
+        """
+        return self._hash.hexdigest()
+
+    def __len__(self):
+        return len(self._preamble) + self.file_size + len(self._epilogue)
+
+    def read(self, size=-1):
+        """
+        Read up to ``size`` bytes of the body; if ``size`` is negative or
+        None, read the rest of it.
+
+        :param size: maximum number of bytes to read
+        :type size: int
+        :rtype: bytes
+        """
+        if size is None or size < 0:
+            size = len(self)
+        parts = []
+        while size > 0:
+            if self._pos >= len(self._chunk):
+                self._chunk = next(self._chunks, b'')
+                self._pos = 0
+                if not self._chunk:
+                    break
+            part = self._chunk[self._pos:self._pos + size]
+            self._pos += len(part)
+            size -= len(part)
+            parts.append(part)
+        return b''.join(parts)
+
+    def __iter__(self):
+        return iter(lambda: self.read(self.chunk_size), b'')
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        """
+        Rewind the body to the beginning. Only ``seek(0)`` is supported.
+
+        :param offset: offset to seek to; must be 0
+        :type offset: int
+        :param whence: must be ``os.SEEK_SET``
+        :type whence: int
+        :return: the new position, 0
+        :rtype: int
+        """
+        if offset != 0 or whence != os.SEEK_SET:
+            raise io.UnsupportedOperation('can only seek to start of body')
+        self._fh.seek(self._start)
+        self._head = self._fh.read(SNIFF_BYTES)
+        self._reset()
+        return 0
+
+    def close(self):
+        """
+        Close the underlying file, if it was opened by this class.
+        """
+        if self._close_fh:
+            self._fh.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
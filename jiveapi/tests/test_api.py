@@ -35,13 +35,21 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ##################################################################################
 """
 
+import os
 import pytest
 from datetime import datetime
+from hashlib import sha256
+from io import BytesIO
 from requests import Session
+from requests.exceptions import ConnectionError
 from collections import namedtuple
+from urllib.parse import urlsplit, parse_qsl
 
 from jiveapi.exceptions import ContentConflictException, RequestFailedException
-from jiveapi.api import JiveApi
+from jiveapi.api import JiveApi, DEFAULT_CACHE_TTLS
+from jiveapi.retry import RetryPolicy
+from jiveapi.cache import MemoryCache
+from jiveapi.streams import MultipartImageBody
 from jiveapi.jiveresponse import requests_hook
 from jiveapi.tests.test_helpers import MockResponse, FixedOffset
 
@@ -84,6 +92,13 @@ class TestInit(object):
         assert mock_sess.hooks['response'] == [requests_hook]
 
 
+class TestBaseUrl(object):
+
+    def test_base_url(self):
+        api = JiveApi('http://jive.example.com/api', 'jiveuser', 'jivepass')
+        assert api.base_url == 'http://jive.example.com/api/'
+
+
 class TestAbsUrl(object):
 
     def test_abs_url(self):
@@ -166,6 +181,72 @@ class TestRequestMethods(object):
             call.get('http://jive.example.com/bar')
         ]
 
+    def test_get_no_autopaginate(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={
+                'links': {
+                    'next': 'http://jive.example.com/bar'
+                },
+                'list': ['one']
+            })
+        ]
+        res = self.api._get('foo', autopaginate=False)
+        assert res == {
+            'links': {
+                'next': 'http://jive.example.com/bar'
+            },
+            'list': ['one']
+        }
+        assert self.mock_sess.mock_calls == [
+            call.get('http://jive.example.com/foo')
+        ]
+
+    def test_get_many_pages(self):
+        pages = []
+        for i in range(1, 2000):
+            pages.append(MockResponse(200, 'OK', _json={
+                'links': {
+                    'next': 'http://jive.example.com/p%d' % i
+                },
+                'list': [i]
+            }))
+        pages.append(MockResponse(200, 'OK', _json={'list': [2000]}))
+        self.mock_sess.get.side_effect = pages
+        res = self.api._get('foo')
+        assert res == list(range(1, 2001))
+        assert len(self.mock_sess.mock_calls) == 2000
+
+    def test_iter_get(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={
+                'links': {
+                    'next': 'http://jive.example.com/bar'
+                },
+                'list': ['one', 'two']
+            }),
+            MockResponse(200, 'OK', _json={
+                'list': ['three']
+            })
+        ]
+        res = self.api.iter_get('foo')
+        assert self.mock_sess.mock_calls == []
+        assert next(res) == 'one'
+        assert next(res) == 'two'
+        assert self.mock_sess.mock_calls == [
+            call.get('http://jive.example.com/foo')
+        ]
+        assert list(res) == ['three']
+        assert self.mock_sess.mock_calls == [
+            call.get('http://jive.example.com/foo'),
+            call.get('http://jive.example.com/bar')
+        ]
+
+    def test_iter_get_not_list(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={'foo': 'bar'})
+        ]
+        assert list(self.api.iter_get('foo')) == [{'foo': 'bar'}]
+
     def test_post_json(self):
         self.mock_sess.post.side_effect = [
             MockResponse(201, 'Created', _json={
@@ -207,6 +288,380 @@ class TestRequestMethods(object):
         ]
 
 
+class TestParallelPagination(object):
+
+    def setup(self):
+        self.api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+
+    def pages(self, total, page_size, partial=None):
+        def se(_, path, cache_endpoint=None):
+            if path == 'foo':
+                start = 0
+            else:
+                params = dict(parse_qsl(urlsplit(path).query))
+                assert params['count'] == str(page_size)
+                start = int(params['startIndex'])
+            items = list(range(start, min(start + page_size, total)))
+            if partial is not None and start in partial:
+                items = items[:partial[start]]
+            res = {'list': items, 'startIndex': start}
+            if start + page_size < total:
+                res['links'] = {'next': 'http://jive.example.com/n'}
+            return res
+        return se
+
+    def test_add_params(self):
+        assert JiveApi._add_params('foo', count=5) == 'foo?count=5'
+        assert JiveApi._add_params(
+            'http://x/foo?directive=silent&count=1', startIndex=10, count=5
+        ) == 'http://x/foo?directive=silent&count=5&startIndex=10'
+
+    def test_parallel(self):
+        with patch('%s._get_json' % pb, autospec=True) as m_get:
+            m_get.side_effect = self.pages(95, 10)
+            res = list(self.api._iter_list_parallel('foo', 4))
+        assert res == list(range(95))
+        assert m_get.mock_calls[0] == call(
+            self.api, 'foo', cache_endpoint=None
+        )
+        assert call(
+            self.api, 'foo?count=10&startIndex=10', cache_endpoint=None
+        ) in m_get.mock_calls
+
+    def test_parallel_short_pages(self):
+        # pages shorter than the page size do not end iteration
+        with patch('%s._get_json' % pb, autospec=True) as m_get:
+            m_get.side_effect = self.pages(50, 10, partial={20: 3})
+            res = list(self.api._iter_list_parallel('foo', 2))
+        assert res == list(range(23)) + list(range(30, 50))
+
+    def test_parallel_single_page(self):
+        with patch('%s._get_json' % pb, autospec=True) as m_get:
+            m_get.side_effect = self.pages(5, 10)
+            res = list(self.api._iter_list_parallel('foo', 4))
+        assert res == [0, 1, 2, 3, 4]
+        assert m_get.call_count == 1
+
+    def test_parallel_not_list(self):
+        with patch('%s._get_json' % pb, autospec=True) as m_get:
+            m_get.return_value = {'foo': 'bar'}
+            res = list(self.api._iter_list_parallel('foo', 4))
+        assert res == [{'foo': 'bar'}]
+
+    def test_parallel_items_per_page(self):
+        with patch('%s._get_json' % pb, autospec=True) as m_get:
+            m_get.side_effect = [
+                {
+                    'list': [1], 'itemsPerPage': 25, 'startIndex': 0,
+                    'links': {'next': 'http://jive.example.com/n'}
+                },
+                {'list': []}
+            ]
+            res = list(self.api._iter_list_parallel('foo', 1))
+        assert res == [1]
+        assert m_get.mock_calls[1] == call(
+            self.api, 'foo?count=25&startIndex=1', cache_endpoint=None
+        )
+
+    def test_parallel_exception(self):
+        def se(_, path, cache_endpoint=None):
+            if path == 'foo':
+                return {
+                    'list': [1], 'links': {'next': 'http://jive.example.com/n'}
+                }
+            raise RequestFailedException(
+                MockResponse(500, 'Internal Server Error', request=req)
+            )
+
+        req_t = namedtuple('MockRequest', ['method', 'url'])
+        req = req_t(method='GET', url='http://jive.example.com/')
+        with patch('%s._get_json' % pb, autospec=True) as m_get:
+            m_get.side_effect = se
+            gen = self.api._iter_list_parallel('foo', 2)
+            assert next(gen) == 1
+            with pytest.raises(RequestFailedException):
+                next(gen)
+
+
+class TestRetry(object):
+
+    def setup(self):
+        self.api = JiveApi(
+            'http://jive.example.com/', 'jiveuser', 'jivepass',
+            retry_policy=RetryPolicy(max_retries=2, jitter=False)
+        )
+        self.mock_sess = MagicMock(spec_set=Session)
+        self.api._requests = self.mock_sess
+        req_t = namedtuple('MockRequest', ['method', 'url'])
+        self.req = req_t(method='GET', url='http://jive.example.com/foo')
+
+    def test_no_policy(self):
+        self.api._retry_policy = None
+        self.mock_sess.get.side_effect = [
+            MockResponse(503, 'Unavailable', request=self.req)
+        ]
+        with patch('jiveapi.api.time.sleep') as mock_sleep:
+            with pytest.raises(RequestFailedException):
+                self.api._get('foo')
+        assert mock_sleep.mock_calls == []
+        assert self.api.retry_stats == {'retries': 0, 'backoff_seconds': 0.0}
+
+    def test_get_retry_success(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(
+                429, 'Too Many Requests', headers={'Retry-After': '7'}
+            ),
+            ConnectionError('reset'),
+            MockResponse(200, 'OK', _json={'foo': 'bar'})
+        ]
+        with patch('jiveapi.api.time.sleep') as mock_sleep:
+            res = self.api._get('foo')
+        assert res == {'foo': 'bar'}
+        assert mock_sleep.mock_calls == [call(7.0), call(1.0)]
+        assert self.mock_sess.mock_calls == [
+            call.get('http://jive.example.com/foo'),
+            call.get('http://jive.example.com/foo'),
+            call.get('http://jive.example.com/foo')
+        ]
+        assert self.api.retry_stats == {'retries': 2, 'backoff_seconds': 8.0}
+
+    def test_get_retries_exhausted(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(502, 'Bad Gateway', request=self.req),
+            MockResponse(502, 'Bad Gateway', request=self.req),
+            MockResponse(502, 'Bad Gateway', request=self.req)
+        ]
+        with patch('jiveapi.api.time.sleep') as mock_sleep:
+            with pytest.raises(RequestFailedException) as excinfo:
+                self.api._get('foo')
+        assert excinfo.value.status_code == 502
+        assert mock_sleep.mock_calls == [call(0.5), call(1.0)]
+        assert len(self.mock_sess.mock_calls) == 3
+
+    def test_connection_error_exhausted(self):
+        self.mock_sess.get.side_effect = ConnectionError('reset')
+        with patch('jiveapi.api.time.sleep'):
+            with pytest.raises(ConnectionError):
+                self.api._get('foo')
+        assert len(self.mock_sess.mock_calls) == 3
+
+    def test_post_not_retried_on_503(self):
+        req = self.req._replace(method='POST')
+        self.mock_sess.post.side_effect = [
+            MockResponse(503, 'Unavailable', request=req)
+        ]
+        with patch('jiveapi.api.time.sleep') as mock_sleep:
+            with pytest.raises(RequestFailedException):
+                self.api._post_json('foo', {'foo': 'bar'})
+        assert mock_sleep.mock_calls == []
+
+    def test_post_retried_on_429(self):
+        self.mock_sess.post.side_effect = [
+            MockResponse(429, 'Too Many Requests'),
+            MockResponse(201, 'Created', _json={'foo': 'bar'})
+        ]
+        with patch('jiveapi.api.time.sleep') as mock_sleep:
+            res = self.api._post_json('foo', {'foo': 'bar'})
+        assert res == {'foo': 'bar'}
+        assert mock_sleep.mock_calls == [call(0.5)]
+
+    def test_upload_image_retried_on_429(self):
+        self.mock_sess.post.side_effect = [
+            MockResponse(429, 'Too Many Requests'),
+            MockResponse(
+                201, 'Created', _json={'foo': 'bar'},
+                headers={'Location': 'http://some.location/'}
+            )
+        ]
+        with patch('jiveapi.api.time.sleep'):
+            res = self.api.upload_image(b'1234', 'img.jpg', 'image/jpeg')
+        assert res == ('http://some.location/', {'foo': 'bar'})
+        assert len(self.mock_sess.mock_calls) == 2
+
+
+class TestConditionalGet(object):
+
+    def setup(self):
+        self.cache = MemoryCache()
+        self.api = JiveApi(
+            'http://jive.example.com/', 'jiveuser', 'jivepass',
+            cache=self.cache
+        )
+        self.mock_sess = MagicMock(spec_set=Session)
+        self.api._requests = self.mock_sess
+        self.url = 'http://jive.example.com/core/v3/contents/123?' \
+                   'directive=silent'
+
+    def test_not_modified(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(
+                200, 'OK', _json={'contentID': '123'},
+                headers={
+                    'ETag': '"abc"',
+                    'Last-Modified': 'Wed, 21 Oct 2015 07:28:00 GMT'
+                }
+            ),
+            MockResponse(304, 'Not Modified')
+        ]
+        with patch('jiveapi.api.time.time') as mock_time:
+            mock_time.return_value = 1234.0
+            assert self.api.get_content('123') == {'contentID': '123'}
+        assert self.cache.get(self.url) == {
+            'etag': '"abc"',
+            'last_modified': 'Wed, 21 Oct 2015 07:28:00 GMT',
+            'fetched': 1234.0,
+            'json': {'contentID': '123'}
+        }
+        assert self.api.get_content('123') == {'contentID': '123'}
+        assert self.mock_sess.mock_calls == [
+            call.get(self.url),
+            call.get(self.url, headers={
+                'If-None-Match': '"abc"',
+                'If-Modified-Since': 'Wed, 21 Oct 2015 07:28:00 GMT'
+            })
+        ]
+
+    def test_modified(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(
+                200, 'OK', _json={'version': 1}, headers={'ETag': '"v1"'}
+            ),
+            MockResponse(
+                200, 'OK', _json={'version': 2}, headers={'ETag': '"v2"'}
+            )
+        ]
+        assert self.api.get_content('123') == {'version': 1}
+        with patch('jiveapi.api.time.time') as mock_time:
+            mock_time.return_value = 1234.0
+            assert self.api.get_content('123') == {'version': 2}
+        assert self.mock_sess.mock_calls == [
+            call.get(self.url),
+            call.get(self.url, headers={'If-None-Match': '"v1"'})
+        ]
+        assert self.cache.get(self.url) == {
+            'etag': '"v2"', 'last_modified': None, 'fetched': 1234.0,
+            'json': {'version': 2}
+        }
+
+    def test_no_validators(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={'version': 1}),
+            MockResponse(200, 'OK', _json={'version': 1})
+        ]
+        self.api.get_content('123')
+        self.api.get_content('123')
+        assert len(self.cache) == 0
+        assert self.mock_sess.mock_calls == [
+            call.get(self.url), call.get(self.url)
+        ]
+
+    def test_304_without_cache_entry(self):
+        req_t = namedtuple('MockRequest', ['method', 'url'])
+        req = req_t(method='GET', url=self.url)
+        self.mock_sess.get.side_effect = [
+            MockResponse(304, 'Not Modified', request=req)
+        ]
+        with pytest.raises(RequestFailedException):
+            self.api.get_content('123')
+
+
+class TestCacheTtl(object):
+
+    def setup(self):
+        self.cache = MemoryCache()
+        self.api = JiveApi(
+            'http://jive.example.com/', 'jiveuser', 'jivepass',
+            cache=self.cache, cache_ttls={'user': 60, 'content': 10}
+        )
+        self.mock_sess = MagicMock(spec_set=Session)
+        self.api._requests = self.mock_sess
+
+    def test_default_ttls(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        assert api._cache_ttls == DEFAULT_CACHE_TTLS
+        assert api._cache_ttls is not DEFAULT_CACHE_TTLS
+
+    def test_fresh_without_validators(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={'id': '1'}),
+            MockResponse(200, 'OK', _json={'id': '2'})
+        ]
+        with patch('jiveapi.api.time.time') as mock_time:
+            mock_time.return_value = 1000.0
+            assert self.api.user() == {'id': '1'}
+            mock_time.return_value = 1059.0
+            assert self.api.user() == {'id': '1'}
+            assert len(self.mock_sess.mock_calls) == 1
+            # entries without validators expire from the backend with the TTL
+            mock_time.return_value = 1061.0
+            assert self.api.user() == {'id': '2'}
+        assert len(self.mock_sess.mock_calls) == 2
+
+    def test_expired_revalidated(self):
+        url = 'http://jive.example.com/core/v3/people/@me'
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={'id': '1'}, headers={'ETag': 'a'}),
+            MockResponse(304, 'Not Modified')
+        ]
+        with patch('jiveapi.api.time.time') as mock_time:
+            mock_time.return_value = 1000.0
+            assert self.api.user() == {'id': '1'}
+            mock_time.return_value = 1061.0
+            assert self.api.user() == {'id': '1'}
+            mock_time.return_value = 1062.0
+            assert self.api.user() == {'id': '1'}
+        assert self.mock_sess.mock_calls == [
+            call.get(url),
+            call.get(url, headers={'If-None-Match': 'a'})
+        ]
+        assert self.cache.get(url)['fetched'] == 1061.0
+
+    def test_no_ttl_endpoint(self):
+        self.mock_sess.get.side_effect = [
+            MockResponse(200, 'OK', _json={'id': '1'}),
+            MockResponse(200, 'OK', _json={'id': '2'})
+        ]
+        assert self.api.api_version() == {'id': '1'}
+        assert self.api.api_version() == {'id': '2'}
+        assert len(self.cache) == 0
+
+    def test_invalidate_on_update(self):
+        for url in [
+            'http://jive.example.com/core/v3/contents/12?directive=silent',
+            'http://jive.example.com/core/v3/contents/12',
+            'http://jive.example.com/core/v3/contents/123',
+            'http://jive.example.com/core/v3/places/5/contents',
+            'http://jive.example.com/core/v3/places/5/contents?count=2',
+            'http://jive.example.com/core/v3/places/55/contents'
+        ]:
+            self.cache.set(url, {'foo': 'bar'})
+        self.mock_sess.put.side_effect = [
+            MockResponse(200, 'OK', _json={'contentID': '12'})
+        ]
+        self.api.update_content(
+            '12', {'parent': 'http://jive.example.com/core/v3/places/5'}
+        )
+        assert sorted(self.cache._data.keys()) == [
+            'http://jive.example.com/core/v3/contents/123',
+            'http://jive.example.com/core/v3/places/55/contents'
+        ]
+
+    def test_invalidate_on_create(self):
+        self.cache.set(
+            'http://jive.example.com/core/v3/contents/12?directive=silent', {}
+        )
+        self.mock_sess.post.side_effect = [
+            MockResponse(201, 'Created', _json={'contentID': '12'})
+        ]
+        self.api.create_content({'foo': 'bar'})
+        assert len(self.cache) == 0
+
+    def test_invalidate_no_cache(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        api.invalidate_content_cache('12')
+        api._invalidate_parent_cache({'parent': 'http://foo/'})
+
+
 class TestCreateContent(object):
 
     def test_create_content_exception(self, api):
@@ -350,6 +805,74 @@ class TestGetContent(object):
         assert excinfo.value.error_message == 'Missing content ID 99999999'
 
 
+class TestGetContentFields(object):
+
+    def test_get_content_fields(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        api._requests = MagicMock(spec_set=Session)
+        api._requests.get.return_value = MockResponse(
+            200, 'OK', _json={'contentID': '123', 'subject': 'foo'}
+        )
+        res = api.get_content('123', fields=['contentID', 'subject'])
+        assert res == {'contentID': '123', 'subject': 'foo'}
+        assert api._requests.mock_calls == [
+            call.get(
+                'http://jive.example.com/core/v3/contents/123?'
+                'directive=silent&fields=contentID%2Csubject'
+            )
+        ]
+
+    def test_list_params(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        assert api._list_params('foo') == 'foo'
+        assert api._list_params('foo', count=10) == 'foo?count=10'
+        assert api._list_params(
+            'foo?a=b', fields='@summary'
+        ) == 'foo?a=b&fields=%40summary'
+
+
+class TestGetContents(object):
+
+    def test_ordered(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        req_t = namedtuple('MockRequest', ['method', 'url'])
+        req = req_t(method='GET', url='http://jive.example.com/')
+        exc = RequestFailedException(
+            MockResponse(404, 'Not Found', request=req)
+        )
+
+        def se_get(cid):
+            if cid == '2':
+                raise exc
+            return {'contentID': cid}
+
+        with patch('%s.get_content' % pb) as mock_get:
+            mock_get.side_effect = se_get
+            res = list(api.get_contents(['1', '2', '3'], max_workers=2))
+        assert res == [
+            ('1', {'contentID': '1'}, None),
+            ('2', None, exc),
+            ('3', {'contentID': '3'}, None)
+        ]
+        assert sorted(mock_get.mock_calls) == [
+            call('1'), call('2'), call('3')
+        ]
+
+    def test_unordered(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        with patch('%s.get_content' % pb) as mock_get:
+            mock_get.side_effect = lambda cid: {'contentID': cid}
+            res = list(
+                api.get_contents(
+                    (str(x) for x in range(50)), max_workers=4, ordered=False
+                )
+            )
+        assert sorted(res) == sorted([
+            (str(x), {'contentID': str(x)}, None) for x in range(50)
+        ])
+        assert len(mock_get.mock_calls) == 50
+
+
 class TestUpdateContent(object):
 
     def test_update_content(self, api):
@@ -478,6 +1001,81 @@ class TestGetImage(object):
             call.get('http://jive.example.com/core/v3/images/imgid')
         ]
 
+    def test_iter_image(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        resp = MockResponse(200, 'OK', content=b'1234567')
+        mock_sess.get.return_value = resp
+        res = api.iter_image('imgid', chunk_size=3)
+        assert list(res) == [b'123', b'456', b'7']
+        assert res.size == 7
+        assert res.sha256 == sha256(b'1234567').hexdigest()
+        assert resp.closed is True
+        assert mock_sess.mock_calls == [
+            call.get(
+                'http://jive.example.com/core/v3/images/imgid', stream=True
+            )
+        ]
+
+    def test_iter_image_error(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        req_t = namedtuple('MockRequest', ['method', 'url'])
+        req = req_t(
+            method='GET', url='http://jive.example.com/core/v3/images/imgid'
+        )
+        resp = MockResponse(404, 'Not Found', content=b'1234', request=req)
+        mock_sess.get.return_value = resp
+        with pytest.raises(RequestFailedException):
+            api.iter_image('imgid')
+        assert resp.closed is True
+
+    def test_get_image_to_fileobj(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        resp = MockResponse(200, 'OK', content=b'1234567')
+        mock_sess.get.return_value = resp
+        buf = BytesIO()
+        res = api.get_image_to('imgid', buf, chunk_size=2)
+        assert res == (7, sha256(b'1234567').hexdigest())
+        assert buf.getvalue() == b'1234567'
+        assert resp.closed is True
+
+    def test_get_image_to_path(self, tmpdir):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        mock_sess.get.return_value = MockResponse(
+            200, 'OK', content=b'1234567'
+        )
+        path = str(tmpdir.join('img.png'))
+        res = api.get_image_to('imgid', path)
+        assert res == (7, sha256(b'1234567').hexdigest())
+        with open(path, 'rb') as fh:
+            assert fh.read() == b'1234567'
+
+    def test_get_image_to_path_failure(self, tmpdir):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        resp = MagicMock()
+        resp.status_code = 200
+
+        def se(chunk_size=1):
+            yield b'12'
+            raise ConnectionError('foo')
+
+        resp.iter_content.side_effect = se
+        mock_sess.get.return_value = resp
+        path = str(tmpdir.join('img.png'))
+        with pytest.raises(ConnectionError):
+            api.get_image_to('imgid', path)
+        assert not os.path.exists(path)
+        assert resp.close.called
+
 
 class TestUploadImage(object):
 
@@ -527,6 +1125,87 @@ class TestUploadImage(object):
             )
         ]
 
+    def test_bytes_sniff(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        mock_sess.post.return_value = MockResponse(
+            201, 'Created', _json={'foo': 'bar'},
+            headers={'Location': 'http://some.location/'}
+        )
+        img = b'\x89PNG\r\n\x1a\n1234'
+        api.upload_image(img)
+        assert mock_sess.mock_calls == [
+            call.post(
+                'http://jive.example.com/core/v3/images',
+                files={
+                    'file': ('image', img, 'image/png')
+                },
+                allow_redirects=False
+            )
+        ]
+
+    def test_path(self, tmpdir):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        img = b'\x89PNG\r\n\x1a\n' + b'1' * 100000
+        path = str(tmpdir.join('foo.png'))
+        with open(path, 'wb') as fh:
+            fh.write(img)
+        bodies = []
+
+        def se_post(url, data=None, headers=None, allow_redirects=True):
+            bodies.append(data.read())
+            assert headers == {'Content-Type': data.content_type}
+            assert len(data) == len(bodies[-1])
+            return MockResponse(
+                201, 'Created', _json={'foo': 'bar'},
+                headers={'Location': 'http://some.location/'}
+            )
+
+        mock_sess.post.side_effect = se_post
+        res = api.upload_image(path)
+        assert res == ('http://some.location/', {'foo': 'bar'})
+        body = mock_sess.post.call_args[1]['data']
+        assert isinstance(body, MultipartImageBody)
+        assert body.filename == 'foo.png'
+        assert body.file_content_type == 'image/png'
+        assert body.sha256 == sha256(img).hexdigest()
+        assert body._fh.closed is True
+        assert img in bodies[0]
+
+    def test_multipart_body_retry(self):
+        api = JiveApi(
+            'http://jive.example.com/', 'jiveuser', 'jivepass',
+            retry_policy=RetryPolicy(jitter=False)
+        )
+        mock_sess = MagicMock(spec_set=Session)
+        api._requests = mock_sess
+        img = b'\x89PNG\r\n\x1a\n' + b'1' * 1000
+        body = MultipartImageBody(BytesIO(img), filename='a.png')
+        bodies = []
+
+        def se_post(url, data=None, headers=None, allow_redirects=True):
+            bodies.append(data.read())
+            if len(bodies) == 1:
+                return MockResponse(429, 'Too Many Requests')
+            return MockResponse(
+                201, 'Created', _json={'foo': 'bar'},
+                headers={'Location': 'http://some.location/'}
+            )
+
+        mock_sess.post.side_effect = se_post
+        with patch('jiveapi.api.time.sleep'):
+            res = api.upload_image(body, 'ignored.png', 'image/x')
+        assert res == ('http://some.location/', {'foo': 'bar'})
+        assert len(bodies) == 2
+        assert bodies[0] == bodies[1]
+        assert img in bodies[1]
+        assert b'filename="a.png"' in bodies[1]
+        assert body.sha256 == sha256(img).hexdigest()
+        assert body._fh.closed is False
+
 
 class TestGetContentInPlace(object):
 
@@ -587,3 +1266,77 @@ class TestGetContentInPlace(object):
         assert excinfo.value.error_message == 'Invalid place URI https://' \
                                               'sandbox.jiveon.com/api/core/' \
                                               'v3/places/99999999899/contents'
+
+    def test_iter_content_in_place(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        with patch('%s.iter_get' % pb, autospec=True) as mock_iter:
+            mock_iter.return_value = iter([{'contentID': '1'}])
+            res = api.iter_content_in_place('123')
+            assert list(res) == [{'contentID': '1'}]
+        assert mock_iter.mock_calls == [
+            call(
+                api, 'core/v3/places/123/contents',
+                cache_endpoint='content_in_place', count=None, fields=None
+            )
+        ]
+
+    def test_get_content_in_place_parallel(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        with patch('%s._iter_list_parallel' % pb, autospec=True) as m_iter:
+            m_iter.return_value = iter([{'contentID': '1'}])
+            res = api.get_content_in_place('123', max_workers=3)
+        assert res == [{'contentID': '1'}]
+        assert m_iter.mock_calls == [
+            call(
+                api, 'core/v3/places/123/contents', 3,
+                cache_endpoint='content_in_place'
+            )
+        ]
+
+    def test_get_content_in_place_count_fields(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        api._requests = MagicMock(spec_set=Session)
+        api._requests.get.side_effect = [
+            MockResponse(200, 'OK', _json={
+                'links': {
+                    'next': 'http://jive.example.com/core/v3/places/123/'
+                            'contents?count=2&fields=contentID%2Csubject&'
+                            'startIndex=2'
+                },
+                'list': [{'contentID': '1'}, {'contentID': '2'}]
+            }),
+            MockResponse(200, 'OK', _json={
+                'list': [{'contentID': '3'}]
+            })
+        ]
+        res = api.get_content_in_place(
+            '123', count=2, fields=['contentID', 'subject']
+        )
+        assert res == [
+            {'contentID': '1'}, {'contentID': '2'}, {'contentID': '3'}
+        ]
+        assert api._requests.mock_calls == [
+            call.get(
+                'http://jive.example.com/core/v3/places/123/contents?'
+                'count=2&fields=contentID%2Csubject'
+            ),
+            call.get(
+                'http://jive.example.com/core/v3/places/123/contents?'
+                'count=2&fields=contentID%2Csubject&startIndex=2'
+            )
+        ]
+
+    def test_iter_content_in_place_parallel_fields(self):
+        api = JiveApi('http://jive.example.com/', 'jiveuser', 'jivepass')
+        with patch('%s._iter_list_parallel' % pb, autospec=True) as m_iter:
+            m_iter.return_value = iter([{'contentID': '1'}])
+            res = list(api.iter_content_in_place(
+                '123', max_workers=3, count=50, fields='contentID'
+            ))
+        assert res == [{'contentID': '1'}]
+        assert m_iter.mock_calls == [
+            call(
+                api, 'core/v3/places/123/contents?count=50&fields=contentID',
+                3, cache_endpoint='content_in_place'
+            )
+        ]
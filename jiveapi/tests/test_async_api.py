@@ -0,0 +1,292 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from jiveapi.exceptions import ContentConflictException, RequestFailedException
+from jiveapi.async_api import AsyncJiveApi, AsyncJiveResponse
+from jiveapi.tests.test_helpers import FixedOffset
+
+from unittest.mock import patch, MagicMock
+
+pbm = 'jiveapi.async_api'
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class FakeResponse(object):
+
+    def __init__(self, status, reason, body=b'', headers={}, charset=None):
+        self.status = status
+        self.reason = reason
+        self.body = body
+        self.headers = headers
+        self.charset = charset
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession(object):
+
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = []
+        self.closed = False
+
+    def request(self, method, url, **kwargs):
+        self.calls.append((method, url, kwargs))
+        return self.responses.pop(0)
+
+    async def close(self):
+        self.closed = True
+
+
+def make_api(responses):
+    with patch('%s.aiohttp' % pbm):
+        api = AsyncJiveApi('http://jive.example.com', 'jiveuser', 'jivepass')
+    sess = FakeSession(responses)
+    api._session = sess
+    return api, sess
+
+
+class TestInit(object):
+
+    def test_init(self):
+        with patch('%s.aiohttp' % pbm):
+            cls = AsyncJiveApi('http://jive.example.com', 'uname', 'passwd')
+        assert cls._base_url == 'http://jive.example.com/'
+        assert cls._username == 'uname'
+        assert cls._password == 'passwd'
+        assert cls._session is None
+
+    def test_no_aiohttp(self):
+        with patch('%s.aiohttp' % pbm, None):
+            with pytest.raises(ImportError):
+                AsyncJiveApi('http://jive.example.com', 'uname', 'passwd')
+
+    def test_session_and_close(self):
+        with patch('%s.aiohttp' % pbm) as mock_aiohttp:
+            cls = AsyncJiveApi('http://jive.example.com', 'u', 'p', limit=5)
+            sess = cls._get_session()
+            assert cls._get_session() == sess
+        assert sess == mock_aiohttp.ClientSession.return_value
+        mock_aiohttp.BasicAuth.assert_called_once_with('u', 'p')
+        mock_aiohttp.TCPConnector.assert_called_once_with(limit=5)
+        fake = FakeSession([])
+        cls._session = fake
+
+        async def use():
+            async with cls:
+                pass
+
+        run(use())
+        assert fake.closed is True
+        assert cls._session is None
+
+
+class TestAsyncJiveResponse(object):
+
+    def test_json_security_string(self):
+        res = AsyncJiveResponse(
+            'GET', 'http://x/', 200, 'OK', {},
+            b'throw \'allowIllegalResourceCall is false.\';\n{"foo": "bar"}'
+        )
+        assert res.json() == {'foo': 'bar'}
+        assert res.request.method == 'GET'
+        assert res.request.url == 'http://x/'
+        assert repr(res) == '<AsyncJiveResponse [200]>'
+
+    def test_exception_message(self):
+        res = AsyncJiveResponse(
+            'GET', 'http://x/', 404, 'Not Found', {},
+            b'{"error": {"message": "Missing content ID 1"}}'
+        )
+        ex = RequestFailedException(res)
+        assert ex.error_message == 'Missing content ID 1'
+        assert str(ex) == 'GET http://x/ returned HTTP 404 Not Found: ' \
+                          'Missing content ID 1'
+
+
+class TestGet(object):
+
+    def test_get_paginated(self):
+        api, sess = make_api([
+            FakeResponse(
+                200, 'OK',
+                b'{"list": [1, 2], "links": {"next": "http://jive.example.'
+                b'com/p2"}}'
+            ),
+            FakeResponse(200, 'OK', b'{"list": [3]}')
+        ])
+        assert run(api.get_content_in_place('12')) == [1, 2, 3]
+        assert sess.calls == [
+            ('GET', 'http://jive.example.com/core/v3/places/12/contents', {}),
+            ('GET', 'http://jive.example.com/p2', {})
+        ]
+
+    def test_iter_get(self):
+        api, sess = make_api([
+            FakeResponse(
+                200, 'OK',
+                b'{"list": [1, 2], "links": {"next": "http://jive.example.'
+                b'com/p2"}}'
+            ),
+            FakeResponse(200, 'OK', b'{"list": []}')
+        ])
+
+        async def collect():
+            return [x async for x in api.iter_content_in_place('12')]
+
+        assert run(collect()) == [1, 2]
+        assert len(sess.calls) == 2
+
+    def test_iter_get_not_list(self):
+        api, sess = make_api([FakeResponse(200, 'OK', b'{"foo": "bar"}')])
+
+        async def collect():
+            return [x async for x in api.iter_get('version')]
+
+        assert run(collect()) == [{'foo': 'bar'}]
+
+    def test_get_content(self):
+        api, sess = make_api([FakeResponse(200, 'OK', b'{"id": "1"}')])
+        assert run(api.get_content('123')) == {'id': '1'}
+        assert sess.calls == [(
+            'GET',
+            'http://jive.example.com/core/v3/contents/123?directive=silent',
+            {}
+        )]
+
+    def test_get_error(self):
+        api, sess = make_api([FakeResponse(404, 'Not Found', b'{}')])
+        with pytest.raises(RequestFailedException):
+            run(api.user())
+
+    def test_api_version(self):
+        api, sess = make_api([FakeResponse(200, 'OK', b'{"v": 1}')])
+        assert run(api.api_version()) == {'v': 1}
+        assert sess.calls[0][1] == 'http://jive.example.com/version'
+
+
+class TestCreateUpdateContent(object):
+
+    def test_create(self):
+        api, sess = make_api([
+            FakeResponse(201, 'Created', b'{"contentID": "5"}')
+        ])
+        tz = FixedOffset(-60, 'foo')
+        res = run(api.create_content(
+            {'foo': 'bar'},
+            publish_date=datetime(2018, 2, 13, 11, 23, 52, tzinfo=tz)
+        ))
+        assert res == {'contentID': '5'}
+        assert sess.calls == [(
+            'POST',
+            'http://jive.example.com/core/v3/contents?published=2018-02-13T11'
+            '%3A23%3A52.000-0100&updated=2018-02-13T11%3A23%3A52.000-0100',
+            {'json': {'foo': 'bar'}}
+        )]
+
+    def test_create_conflict(self):
+        api, sess = make_api([FakeResponse(409, 'Conflict', b'{}')])
+        with pytest.raises(ContentConflictException):
+            run(api.create_content({'foo': 'bar'}))
+
+    def test_update(self):
+        api, sess = make_api([FakeResponse(200, 'OK', b'{"contentID": "5"}')])
+        assert run(api.update_content('5', {'a': 'b'})) == {'contentID': '5'}
+        assert sess.calls == [(
+            'PUT', 'http://jive.example.com/core/v3/contents/5',
+            {'json': {'a': 'b'}}
+        )]
+
+    def test_update_500(self):
+        api, sess = make_api([FakeResponse(500, 'Error', b'{}')])
+        with pytest.raises(RequestFailedException) as excinfo:
+            run(api.update_content('5', {'a': 'b'}))
+        assert not isinstance(excinfo.value, ContentConflictException)
+
+
+class TestImages(object):
+
+    def test_get_image(self):
+        api, sess = make_api([FakeResponse(200, 'OK', b'1234')])
+        assert run(api.get_image('imgid')) == b'1234'
+        assert sess.calls == [
+            ('GET', 'http://jive.example.com/core/v3/images/imgid', {})
+        ]
+
+    def test_upload_image(self):
+        api, sess = make_api([
+            FakeResponse(
+                201, 'Created', b'{"id": "9"}',
+                headers={'Location': 'http://some.location/'}
+            )
+        ])
+        with patch('%s.aiohttp' % pbm) as mock_aiohttp:
+            res = run(api.upload_image(b'1234', 'img.jpg', 'image/jpeg'))
+        assert res == ('http://some.location/', {'id': '9'})
+        form = mock_aiohttp.FormData.return_value
+        form.add_field.assert_called_once_with(
+            'file', b'1234', filename='img.jpg', content_type='image/jpeg'
+        )
+        assert sess.calls == [(
+            'POST', 'http://jive.example.com/core/v3/images',
+            {'data': form, 'allow_redirects': False}
+        )]
+
+    def test_upload_image_error(self):
+        api, sess = make_api([FakeResponse(400, 'Too Large', b'{}')])
+        with patch('%s.aiohttp' % pbm, MagicMock()):
+            with pytest.raises(RequestFailedException):
+                run(api.upload_image(b'1234', 'img.jpg', 'image/jpeg'))
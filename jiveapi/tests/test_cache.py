@@ -0,0 +1,203 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import threading
+
+import pytest
+
+from jiveapi.cache import CacheBackend, MemoryCache, SQLiteCache
+
+from unittest.mock import patch
+
+pbm = 'jiveapi.cache'
+
+
+class TestCacheBackend(object):
+
+    def test_not_implemented(self):
+        cls = CacheBackend()
+        with pytest.raises(NotImplementedError):
+            cls.get('foo')
+        with pytest.raises(NotImplementedError):
+            cls.set('foo', 'bar')
+        with pytest.raises(NotImplementedError):
+            cls.delete('foo')
+        with pytest.raises(NotImplementedError):
+            cls.invalidate_prefix('foo')
+        with pytest.raises(NotImplementedError):
+            cls.clear()
+
+
+class TestMemoryCache(object):
+
+    def test_get_set_delete(self):
+        cls = MemoryCache()
+        assert cls.get('foo') is None
+        cls.set('foo', {'bar': ['baz']})
+        assert cls.get('foo') == {'bar': ['baz']}
+        assert len(cls) == 1
+        cls.delete('foo')
+        cls.delete('foo')
+        assert cls.get('foo') is None
+        assert len(cls) == 0
+
+    def test_copies(self):
+        cls = MemoryCache()
+        val = {'bar': ['baz']}
+        cls.set('foo', val)
+        val['bar'].append('blam')
+        got = cls.get('foo')
+        assert got == {'bar': ['baz']}
+        got['bar'].append('quux')
+        assert cls.get('foo') == {'bar': ['baz']}
+
+    def test_lru(self):
+        cls = MemoryCache(maxsize=2)
+        cls.set('a', 1)
+        cls.set('b', 2)
+        assert cls.get('a') == 1
+        cls.set('c', 3)
+        assert cls.get('b') is None
+        assert cls.get('a') == 1
+        assert cls.get('c') == 3
+        assert len(cls) == 2
+
+    def test_unbounded(self):
+        cls = MemoryCache(maxsize=None)
+        for x in range(2000):
+            cls.set(str(x), x)
+        assert len(cls) == 2000
+
+    def test_ttl(self):
+        cls = MemoryCache()
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 100.0
+            cls.set('a', 1, ttl=10)
+            cls.set('b', 2)
+            mock_time.return_value = 109.0
+            assert cls.get('a') == 1
+            mock_time.return_value = 110.0
+            assert cls.get('a') is None
+            assert cls.get('b') == 2
+        assert len(cls) == 1
+
+    def test_invalidate_prefix_and_clear(self):
+        cls = MemoryCache()
+        cls.set('foo/1', 1)
+        cls.set('foo/2', 2)
+        cls.set('bar/1', 3)
+        cls.invalidate_prefix('foo/')
+        assert cls.get('foo/1') is None
+        assert cls.get('bar/1') == 3
+        cls.clear()
+        assert len(cls) == 0
+
+
+class TestSQLiteCache(object):
+
+    def test_get_set_delete(self, tmpdir):
+        cls = SQLiteCache(str(tmpdir.join('cache.sqlite')))
+        assert cls.get('foo') is None
+        cls.set('foo', {'bar': ['baz']})
+        assert cls.get('foo') == {'bar': ['baz']}
+        cls.set('foo', {'bar': 'blam'})
+        assert cls.get('foo') == {'bar': 'blam'}
+        assert len(cls) == 1
+        cls.delete('foo')
+        assert cls.get('foo') is None
+        assert len(cls) == 0
+
+    def test_persistent_and_shared(self, tmpdir):
+        path = str(tmpdir.join('cache.sqlite'))
+        SQLiteCache(path).set('foo', 'bar')
+        other = SQLiteCache(path)
+        assert other.get('foo') == 'bar'
+        assert os.path.exists(path)
+
+    def test_ttl(self, tmpdir):
+        cls = SQLiteCache(str(tmpdir.join('cache.sqlite')))
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 100.0
+            cls.set('a', 1, ttl=10)
+            cls.set('b', 2, ttl=20)
+            cls.set('c', 3)
+            mock_time.return_value = 109.0
+            assert cls.get('a') == 1
+            mock_time.return_value = 110.0
+            assert cls.get('a') is None
+            assert len(cls) == 2
+            mock_time.return_value = 120.0
+            assert cls.purge_expired() == 1
+        assert cls.get('c') == 3
+        assert len(cls) == 1
+
+    def test_invalidate_prefix_and_clear(self, tmpdir):
+        cls = SQLiteCache(str(tmpdir.join('cache.sqlite')))
+        cls.set('foo/1', 1)
+        cls.set('foo/2', 2)
+        cls.set('foo_1', 4)
+        cls.set('bar/1', 3)
+        cls.invalidate_prefix('foo/')
+        assert cls.get('foo/1') is None
+        assert cls.get('foo/2') is None
+        assert cls.get('foo_1') == 4
+        assert cls.get('bar/1') == 3
+        cls.clear()
+        assert len(cls) == 0
+
+    def test_threads(self, tmpdir):
+        cls = SQLiteCache(str(tmpdir.join('cache.sqlite')))
+        errors = []
+
+        def worker(n):
+            try:
+                for x in range(20):
+                    cls.set('%d-%d' % (n, x), x)
+                    assert cls.get('%d-%d' % (n, x)) == x
+            except Exception as ex:
+                errors.append(ex)
+
+        threads = [
+            threading.Thread(target=worker, args=(n,)) for n in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert errors == []
+        assert len(cls) == 80
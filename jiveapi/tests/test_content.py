@@ -36,7 +36,8 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 """
 
 import os
-import sys
+import hashlib
+import threading
 from datetime import datetime
 from urllib.parse import urljoin
 from unittest.mock import Mock, call, patch, DEFAULT, mock_open
@@ -45,8 +46,13 @@ import pytest
 from lxml import etree
 from lxml.html import builder as E
 
-from jiveapi.content import JiveContent, newline_to_br
+from jiveapi.content import (
+    JiveContent, newline_to_br, _render_html_document
+)
 from jiveapi.api import JiveApi
+from jiveapi.cache import MemoryCache
+from jiveapi.css import PruneStats
+from jiveapi.images import ImageRegistry, UploadCoalescer, UPLOAD_COALESCER
 from jiveapi.tests.test_helpers import FixedOffset
 from jiveapi.version import VERSION, PROJECT_URL
 
@@ -64,6 +70,10 @@ class TestInit(object):
             cls = JiveContent(m_api)
         assert cls._api == m_api
         assert cls._image_dir == '/my/cwd'
+        assert cls._image_workers == 4
+        assert cls._fingerprint_cache is None
+        assert cls._image_registry is None
+        assert cls._upload_coalescer is UPLOAD_COALESCER
 
     def test_init_image_dir(self):
         m_api = Mock()
@@ -84,8 +94,27 @@ class TestNewlineToBr(object):
         elem = mock_html.getroottree().xpath('//p')[0]
         assert etree.tostring(elem) == b'<p>Hello\nGoodbye</p>'
         res = newline_to_br(elem)
+        assert res is elem
         assert etree.tostring(res) == b'<p>Hello<br/>\nGoodbye</p>'
 
+    def test_descendants(self):
+        root = JiveContent.html_to_etree(
+            '<pre>a\n\nb<span>c\nd</span>e\nf<!-- g\nh --><i/>\n</pre>\n '
+            '<p>x\ny</p>'
+        )
+        elem = root.find('.//pre')
+        res = newline_to_br(elem)
+        assert res is elem
+        assert etree.tostring(root.find('body')) == b'<body><pre>a<br/>\n' \
+            b'<br/>\nb<span>c<br/>\nd</span>e<br/>\nf<!-- g<br/>\nh -->' \
+            b'<i/><br/>\n</pre><p>x\ny</p></body>'
+
+    def test_tail_not_whitespace(self):
+        root = JiveContent.html_to_etree('<pre>a\nb</pre>c\nd')
+        newline_to_br(root.find('.//pre'))
+        assert etree.tostring(root.find('body')) == b'<body><pre>a<br/>\n' \
+            b'b</pre>c\nd</body>'
+
 
 class ContentTester(object):
 
@@ -148,12 +177,14 @@ class TestCreateHtmlDocument(ContentTester):
             call(
                 'subj', 'body', tags=[], place_id=None, visibility=None,
                 inline_css=True, jiveize=True, handle_images=True,
-                editable=False, toc=False, header_alert=None, footer_alert=None
+                editable=False, toc=False, header_alert=None, footer_alert=None,
+                css_inliner=None, prune_css=False
             )
         ]
 
     def test_non_defaults(self):
         dt = datetime(2018, 2, 13, 11, 52, 18, tzinfo=FixedOffset(-60, 'foo'))
+        m_inliner = Mock()
         self.mockapi.create_content.return_value = self.example_doc()
         with patch('%s.dict_for_html_document' % pb) as mock_dfhd:
             mock_dfhd.return_value = ({'foo': 'bar'}, {'images': 'foo'})
@@ -162,7 +193,8 @@ class TestCreateHtmlDocument(ContentTester):
                 visibility='place', set_datetime=dt, inline_css=False,
                 jiveize=False, handle_images=False, editable=True, toc=True,
                 header_alert='headerAlert',
-                footer_alert=('warning', 'warnFooter')
+                footer_alert=('warning', 'warnFooter'), css_inliner=m_inliner,
+                prune_css=True
             )
         assert res == {
             'entityType': 'docment',
@@ -182,7 +214,8 @@ class TestCreateHtmlDocument(ContentTester):
                 visibility='place', inline_css=False, jiveize=False,
                 handle_images=False, editable=True, toc=True,
                 header_alert='headerAlert',
-                footer_alert=('warning', 'warnFooter')
+                footer_alert=('warning', 'warnFooter'), css_inliner=m_inliner,
+                prune_css=True
             )
         ]
 
@@ -211,12 +244,13 @@ class TestUpdateHtmlDocument(ContentTester):
                 'subj', 'body', tags=[], place_id=None, visibility=None,
                 inline_css=True, jiveize=True, handle_images=True,
                 editable=False, images={}, toc=False, header_alert=None,
-                footer_alert=None
+                footer_alert=None, css_inliner=None, prune_css=False
             )
         ]
 
     def test_non_defaults(self):
         dt = datetime(2018, 2, 13, 11, 52, 18, tzinfo=FixedOffset(-60, 'foo'))
+        m_inliner = Mock()
         self.mockapi.update_content.return_value = self.example_doc()
         with patch('%s.dict_for_html_document' % pb) as mock_dfhd:
             mock_dfhd.return_value = ({'foo': 'bar'}, {'images': 'foo'})
@@ -225,7 +259,8 @@ class TestUpdateHtmlDocument(ContentTester):
                 visibility='place', set_datetime=dt, inline_css=False,
                 jiveize=False, handle_images=False, images={'input': 'bar'},
                 editable=True, toc=True, header_alert='headerAlert',
-                footer_alert=('warning', 'warnFooter')
+                footer_alert=('warning', 'warnFooter'), css_inliner=m_inliner,
+                prune_css=True
             )
         assert res == {
             'entityType': 'docment',
@@ -245,7 +280,8 @@ class TestUpdateHtmlDocument(ContentTester):
                 visibility='place', inline_css=False, jiveize=False,
                 handle_images=False, images={'input': 'bar'}, editable=True,
                 toc=True, header_alert='headerAlert',
-                footer_alert=('warning', 'warnFooter')
+                footer_alert=('warning', 'warnFooter'), css_inliner=m_inliner,
+                prune_css=True
             )
         ]
 
@@ -292,7 +328,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         assert mocks['etree_add_toc'].mock_calls == []
         assert mocks['etree_add_alert'].mock_calls == []
@@ -393,7 +431,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         assert mocks['etree_add_toc'].mock_calls == [call(m_je)]
         assert mocks['etree_add_alert'].mock_calls == []
@@ -445,7 +485,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         assert mocks['etree_add_toc'].mock_calls == []
         assert mocks['etree_add_alert'].mock_calls == [
@@ -499,7 +541,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         # header goes above toc, so it gets applied after
         assert mocks['etree_add_toc'].mock_calls == [
@@ -556,7 +600,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         assert mocks['etree_add_toc'].mock_calls == []
         assert mocks['etree_add_alert'].mock_calls == [
@@ -612,7 +658,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         assert mocks['etree_add_toc'].mock_calls == []
         assert mocks['etree_add_alert'].mock_calls == [
@@ -665,7 +713,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {'images': 'foo'})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == []
         assert mocks['etree_add_toc'].mock_calls == []
         assert mocks['etree_add_alert'].mock_calls == []
@@ -673,6 +723,62 @@ class TestDictForHtmlDocument(ContentTester):
         assert mock_tostring.mock_calls == [call(m_ui)]
         assert self.mockapi.mock_calls == []
 
+    def test_prune_css(self):
+        mocks = Mock()
+        mocks.prune.return_value = PruneStats(10, 7, 1234, 0.002)
+        with patch.multiple(
+            pb,
+            html_to_etree=mocks.html_to_etree,
+            inline_css_etree=mocks.inline_css_etree,
+            jiveize_etree=DEFAULT,
+            _upload_images=mocks._upload_images
+        ):
+            with patch('%s.prune_unused_css' % pbm, mocks.prune):
+                with patch('%s.etree.tostring' % pbm) as mock_tostring:
+                    mock_tostring.return_value = 'fixed_string'
+                    mocks._upload_images.return_value = Mock(), {}
+                    self.cls.dict_for_html_document(
+                        'subj', 'body', jiveize=False, prune_css=True
+                    )
+        m_hte = mocks.html_to_etree.return_value
+        assert mocks.mock_calls[:3] == [
+            call.html_to_etree('body'),
+            call.prune(m_hte),
+            call.inline_css_etree(
+                m_hte, css_inliner=None, engine='premailer'
+            )
+        ]
+
+    def test_inline_native(self):
+        m_hte = Mock()
+        m_ice = Mock()
+        m_je = Mock()
+        m_ui = Mock()
+        m_inliner = Mock()
+        with patch.multiple(
+            pb,
+            html_to_etree=DEFAULT,
+            inline_css_etree=DEFAULT,
+            jiveize_etree=DEFAULT,
+            _upload_images=DEFAULT,
+            etree_add_toc=DEFAULT,
+            etree_add_alert=DEFAULT
+        ) as mocks:
+            with patch('%s.etree.tostring' % pbm) as mock_tostring:
+                mock_tostring.return_value = 'fixed_string'
+                mocks['html_to_etree'].return_value = m_hte
+                mocks['inline_css_etree'].return_value = m_ice
+                mocks['jiveize_etree'].return_value = m_je
+                mocks['_upload_images'].return_value = m_ui, {'images': 'foo'}
+                res = self.cls.dict_for_html_document(
+                    'subj', 'body', inline_css='native', css_inliner=m_inliner
+                )
+        assert res[0]['content']['text'] == 'fixed_string'
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=m_inliner, engine='native')
+        ]
+        assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
+
     def test_no_inline(self):
         m_hte = Mock()
         m_ice = Mock()
@@ -761,7 +867,9 @@ class TestDictForHtmlDocument(ContentTester):
             }
         }, {})
         assert mocks['html_to_etree'].mock_calls == [call('body')]
-        assert mocks['inline_css_etree'].mock_calls == [call(m_hte)]
+        assert mocks['inline_css_etree'].mock_calls == [
+            call(m_hte, css_inliner=None, engine='premailer')
+        ]
         assert mocks['jiveize_etree'].mock_calls == [call(m_ice)]
         assert mocks['etree_add_toc'].mock_calls == []
         assert mocks['etree_add_alert'].mock_calls == []
@@ -956,7 +1064,7 @@ class TestInlineCssEtree(object):
     def test_inline_css_etree(self):
         mock_root = Mock()
         mock_res = Mock()
-        with patch('%s.Premailer' % pbm, create=True) as mock_premailer:
+        with patch('premailer.Premailer') as mock_premailer:
             mock_premailer.return_value.transform.return_value = mock_res
             res = JiveContent.inline_css_etree(mock_root)
         assert res == mock_res
@@ -965,6 +1073,54 @@ class TestInlineCssEtree(object):
             call().transform()
         ]
 
+    def test_inline_css_etree_stylesheet_cache(self):
+        mock_root = Mock()
+        mocks = Mock()
+        res = JiveContent.inline_css_etree(
+            mock_root, css_inliner=mocks.inliner, stylesheet_cache=mocks.cache
+        )
+        assert res == mocks.inliner.transform.return_value
+        assert mocks.mock_calls == [
+            call.cache.resolve_links(mock_root),
+            call.inliner.transform(mock_root)
+        ]
+
+    def test_css_inliner(self):
+        mock_root = Mock()
+        mock_inliner = Mock()
+        with patch('premailer.Premailer') as mock_premailer:
+            res = JiveContent.inline_css_etree(
+                mock_root, css_inliner=mock_inliner
+            )
+        assert res == mock_inliner.transform.return_value
+        assert mock_premailer.mock_calls == []
+        assert mock_inliner.mock_calls == [call.transform(mock_root)]
+
+    def test_native(self):
+        mock_root = Mock()
+        mock_res = Mock()
+        with patch('premailer.Premailer') as mock_premailer:
+            with patch('%s.NATIVE_INLINER' % pbm) as mock_native:
+                mock_native.transform.return_value = mock_res
+                res = JiveContent.inline_css_etree(mock_root, engine='native')
+        assert res == mock_res
+        assert mock_premailer.mock_calls == []
+        assert mock_native.transform.mock_calls == [call(mock_root)]
+
+    def test_native_css_inliner(self):
+        mock_root = Mock()
+        mock_inliner = Mock()
+        with patch('%s.NATIVE_INLINER' % pbm) as mock_native:
+            res = JiveContent.inline_css_etree(
+                mock_root, css_inliner=mock_inliner, engine='native'
+            )
+        assert res == mock_inliner.transform.return_value
+        assert mock_native.mock_calls == []
+
+    def test_invalid_engine(self):
+        with pytest.raises(ValueError):
+            JiveContent.inline_css_etree(Mock(), engine='foo')
+
 
 class TestJiveizeHtml(object):
 
@@ -1095,6 +1251,111 @@ class TestJiveizeEtree(object):
                           b'<a href="#foo_bar_baz">bar</a>' \
                           b'<a href="/blam-blarg">baz</a></body>'
 
+    def test_id_dash_non_a(self):
+        html = '<div id="foo-bar">foo</div>'
+        tree = JiveContent.html_to_etree(html)
+        result = JiveContent.jiveize_etree(tree)
+        res_str = etree.tostring(result.find('body'))
+        assert res_str == b'<body><div id="foo-bar">foo<a name="foo_bar"/>' \
+                          b'</div></body>'
+
+    def test_jivemacro_children(self):
+        html = '<div jivemacro="foo"><p>child</p><div><p>grand</p></div>' \
+               '</div>'
+        tree = JiveContent.html_to_etree(html)
+        result = JiveContent.jiveize_etree(tree)
+        res_str = etree.tostring(result.find('body'))
+        assert res_str == b'<body><div jivemacro="foo"><p>child</p><div>' \
+                          b'<p style="color:#24292e; margin-top: 0; ' \
+                          b'margin-bottom: 16px;">grand</p></div></div></body>'
+
+    def test_pre_nested_and_ids(self):
+        html = '<pre>a\n<pre id="in-1">b\nc</pre>\n</pre>' \
+               '<pre jivemacro="foo">d\n<pre>e\nf</pre>\n</pre>'
+        tree = JiveContent.html_to_etree(html)
+        result = JiveContent.jiveize_etree(tree)
+        res_str = etree.tostring(result.find('body'))
+        style = b' style="word-wrap: normal; padding: 16px; ' \
+                b'overflow: auto; font-size: 85%; line-height: 1.45; ' \
+                b'background-color: #f6f8fa; border-radius: 3px; ' \
+                b'margin-top:2px"'
+        assert res_str == b'<body><pre' + style + b'>a<br/>\n' \
+            b'<pre id="in-1"' + style + b'>b<br/>\nc<a name="in_1"/></pre>' \
+            b'<br/>\n</pre><pre jivemacro="foo">d\n<pre>e<br/>\nf</pre>' \
+            b'</pre></body>'
+
+
+class TestRenderMany(ContentTester):
+
+    def documents(self, fixtures_path):
+        with open(os.path.join(fixtures_path, 'html', 'testpostA.html')) as fh:
+            html = fh.read()
+        return [
+            {'subject': 's1', 'html': html, 'tags': ['foo'], 'images': {}},
+            {
+                'subject': 's2', 'html': html, 'inline_css': 'native',
+                'toc': True, 'header_alert': 'hdr', 'place_id': '1234'
+            },
+            {'subject': 's3', 'html': html, 'handle_images': False},
+            {
+                'subject': 's4', 'html': '<p>foo</p>', 'inline_css': False,
+                'jiveize': False, 'handle_images': False
+            }
+        ]
+
+    def se_upload_images(self, doc, images):
+        res = dict(images)
+        res['srcs'] = [e.get('src') for e in doc.iter('img')]
+        return doc, res
+
+    def test_same_as_dict_for_html_document(self, fixtures_path):
+        with patch(
+            '%s._upload_images' % pb, autospec=True,
+            side_effect=lambda _, doc, images: self.se_upload_images(
+                doc, images
+            )
+        ):
+            expected = [
+                self.cls.dict_for_html_document(**d)
+                for d in self.documents(fixtures_path)
+            ]
+            res = list(self.cls.render_many(
+                iter(self.documents(fixtures_path)), max_workers=2
+            ))
+        assert res == expected
+        assert res[0][1]['srcs'][1:] == ['1.png', '2.png']
+
+    def test_invalid_documents(self):
+        with pytest.raises(TypeError):
+            list(self.cls.render_many([{'html': '<p>foo</p>'}]))
+        with pytest.raises(TypeError):
+            list(self.cls.render_many([
+                {'subject': 's', 'html': '<p>foo</p>', 'foo': 'bar'}
+            ]))
+        with pytest.raises(ValueError):
+            list(self.cls.render_many([
+                {'subject': 's', 'html': '<p>foo</p>', 'css_inliner': Mock()}
+            ]))
+
+    def test_exception(self):
+        with pytest.raises(AttributeError):
+            list(self.cls.render_many(
+                [{'subject': 's', 'html': ' '}], max_workers=1
+            ))
+
+    def test_not_serializable(self):
+        document = {
+            'subject': 's', 'html': '<p><img id="x" src="a.png"/></p>',
+            'inline_css': False, 'jiveize': True, 'handle_images': True,
+            'toc': False, 'header_alert': None, 'footer_alert': None,
+            'prune_css': False, 'images': {}
+        }
+        assert _render_html_document(document) == (None, None)
+        with patch('%s.dict_for_html_document' % pb) as mock_dfhd:
+            res = self.cls._finish_html_document(document, (None, None))
+        assert res is mock_dfhd.return_value
+        assert mock_dfhd.mock_calls == [call(**document)]
+
 
 class TestHtmlAcceptance(object):
 
@@ -1275,62 +1536,285 @@ class TestIsLocalImage(object):
         ) is True
 
 
-class TestLoadImageFromDisk(ContentTester):
+class TestUploadImagesConcurrent(ContentTester):
 
-    @pytest.mark.skipif(
-        sys.version_info[0:2] == (3, 4),
-        reason='mock_open broken on py34'
-    )
-    def test_rel_path(self):
-        m_sha256 = Mock()
-        m_sha256.hexdigest.return_value = sha256str
-        with patch('%s.imghdr.what' % pbm) as mock_what:
-            with patch('%s.hashlib.sha256' % pbm) as mock_sha256:
-                with patch(
-                    '%s.open' % pbm, mock_open(read_data=b'foo')
-                ) as m_open:
-                    mock_what.return_value = 'cType'
-                    mock_sha256.return_value = m_sha256
-                    res = self.cls._load_image_from_disk('foo/bar.png')
-        assert res == ('image/cType', b'foo', sha256str)
-        assert mock_what.mock_calls == [call(None, b'foo')]
-        assert mock_sha256.mock_calls == [
-            call(b'foo'), call().hexdigest()
+    def doc(self, srcs):
+        body = E.BODY(*[
+            E.A(E.IMG(src=src), href=src) for src in srcs
+        ])
+        return E.HTML(E.HEAD(E.TITLE('Some Title')), body).getroottree()
+
+    def test_dedupe(self):
+        root = self.doc(['a.png', 'b.png', 'a.png', 'c.png', 'http://x/d.png'])
+        shas = {'a.png': 'sha1', 'b.png': 'sha2', 'c.png': 'sha1'}
+        images = {
+            'sha2': {
+                'location': 'http://jive/b',
+                'jive_object': {'id': 'b'},
+                'local_path': 'b.png'
+            }
+        }
+
+        def se_lifd(src):
+            return 'image/png', '/img/dir/' + src, shas[src]
+
+        self.mockapi.upload_image.return_value = (
+            'http://jive/a', {'id': 'a'}
+        )
+        with patch('%s._load_image_from_disk' % pb) as mock_lifd:
+            mock_lifd.side_effect = se_lifd
+            newroot, res = self.cls._upload_images(root, images)
+        assert res is images
+        assert res == {
+            'sha1': {
+                'location': 'http://jive/a',
+                'jive_object': {'id': 'a'},
+                'local_path': 'a.png'
+            },
+            'sha2': {
+                'location': 'http://jive/b',
+                'jive_object': {'id': 'b'},
+                'local_path': 'b.png'
+            }
+        }
+        assert sorted(mock_lifd.mock_calls) == [
+            call('a.png'), call('b.png'), call('c.png')
         ]
-        assert m_open.mock_calls == [
-            call('/img/dir/foo/bar.png', 'rb'),
-            call().__enter__(),
-            call().read(),
-            call().__exit__(None, None, None)
+        assert self.mockapi.mock_calls == [
+            call.upload_image('/img/dir/a.png', 'a.png', 'image/png')
+        ]
+        body = newroot.find('body')
+        assert [(a.get('href'), a[0].get('src')) for a in body] == [
+            ('http://jive/a', 'http://jive/a'),
+            ('http://jive/b', 'http://jive/b'),
+            ('http://jive/a', 'http://jive/a'),
+            ('http://jive/a', 'http://jive/a'),
+            ('http://x/d.png', 'http://x/d.png'),
         ]
 
-    @pytest.mark.skipif(
-        sys.version_info[0:2] == (3, 4),
-        reason='mock_open broken on py34'
-    )
-    def test_abs_path(self):
-        m_sha256 = Mock()
-        m_sha256.hexdigest.return_value = sha256str
+    def test_image_registry(self):
+        root = self.doc(['a.png', 'b.png'])
+        registry = ImageRegistry(MemoryCache())
+        registry.set('shab.png', {
+            'location': 'http://jive/b',
+            'jive_object': {'id': 'b'},
+            'local_path': 'other/b.png'
+        })
+        self.cls._image_registry = registry
+        self.mockapi.upload_image.return_value = ('http://jive/a', {'id': 'a'})
+        with patch('%s._load_image_from_disk' % pb) as mock_lifd:
+            mock_lifd.side_effect = lambda src: ('image/png', src, 'sha' + src)
+            newroot, res = self.cls._upload_images(root, {})
+        assert res == {
+            'shaa.png': {
+                'location': 'http://jive/a',
+                'jive_object': {'id': 'a'},
+                'local_path': 'a.png'
+            },
+            'shab.png': {
+                'location': 'http://jive/b',
+                'jive_object': {'id': 'b'},
+                'local_path': 'b.png'
+            }
+        }
+        assert registry.get('shaa.png') == res['shaa.png']
+        assert self.mockapi.mock_calls == [
+            call.upload_image('a.png', 'a.png', 'image/png')
+        ]
+        assert [
+            img.get('src') for img in newroot.xpath('//img')
+        ] == ['http://jive/a', 'http://jive/b']
+
+    def test_concurrent_uploads(self):
+        root = self.doc(['a.png', 'b.png', 'c.png'])
+        barrier = threading.Barrier(3, timeout=5)
+
+        def se_upload(path, fname, ctype):
+            barrier.wait()
+            return 'http://jive/' + fname, {'id': fname}
+
+        self.cls._image_workers = 3
+        self.mockapi.upload_image.side_effect = se_upload
+        with patch('%s._load_image_from_disk' % pb) as mock_lifd:
+            mock_lifd.side_effect = lambda src: ('image/png', src, 'sha' + src)
+            newroot, res = self.cls._upload_images(root, {})
+        assert list(res.keys()) == ['shaa.png', 'shab.png', 'shac.png']
+        assert [
+            img.get('src') for img in newroot.xpath('//img')
+        ] == ['http://jive/a.png', 'http://jive/b.png', 'http://jive/c.png']
+
+    def test_coalesced_across_instances(self):
+        coalescer = UploadCoalescer()
+        barrier = threading.Barrier(2, timeout=5)
+        waiting = threading.Event()
+        uploads = []
+
+        def se_upload(path, fname, ctype):
+            uploads.append(fname)
+            # finish only once the other publish waits for this upload
+            assert waiting.wait(5)
+            return 'http://jive/' + fname, {'id': fname}
+
+        def se_lifd(src):
+            barrier.wait()
+            return 'image/png', src, 'sha-' + src
+
+        self.mockapi.upload_image.side_effect = se_upload
+        results = []
+
+        def publish():
+            cls = JiveContent(
+                self.mockapi, image_dir='/img/dir', image_workers=1,
+                upload_coalescer=coalescer
+            )
+            root = self.doc(['a.png'])
+            results.append(cls._upload_images(root, {})[1])
+
+        with patch('%s._load_image_from_disk' % pb) as mock_lifd, \
+                patch('jiveapi.images.logger') as mock_logger:
+            mock_lifd.side_effect = se_lifd
+            mock_logger.debug.side_effect = lambda *args: waiting.set()
+            threads = [threading.Thread(target=publish) for _ in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join(5)
+        assert uploads == ['a.png']
+        assert results[0] == results[1] == {
+            'sha-a.png': {
+                'location': 'http://jive/a.png',
+                'jive_object': {'id': 'a.png'},
+                'local_path': 'a.png'
+            }
+        }
+
+    def test_upload_failure(self):
+        root = self.doc(['a.png', 'b.png', 'c.png'])
+
+        def se_upload(path, fname, ctype):
+            if fname == 'b.png':
+                raise RuntimeError('foo')
+            return 'http://jive/' + fname, {'id': fname}
+
+        self.mockapi.upload_image.side_effect = se_upload
+        images = {}
+        with patch('%s._load_image_from_disk' % pb) as mock_lifd:
+            mock_lifd.side_effect = lambda src: ('image/png', src, 'sha' + src)
+            with pytest.raises(RuntimeError):
+                self.cls._upload_images(root, images)
+        assert sorted(images.keys()) == ['shaa.png', 'shac.png']
+        assert [
+            img.get('src') for img in root.xpath('//img')
+        ] == ['a.png', 'b.png', 'c.png']
+
+    def test_load_failure(self):
+        root = self.doc(['a.png', 'b.png'])
+        with patch('%s._load_image_from_disk' % pb) as mock_lifd:
+            mock_lifd.side_effect = IOError('foo')
+            with pytest.raises(IOError):
+                self.cls._upload_images(root, {})
+        assert self.mockapi.mock_calls == []
+
+
+class TestRewriteImageUrls(object):
+
+    def test_rewrite(self):
+        root = E.HTML(E.BODY(
+            E.A('one', href='a.png'),
+            E.P(E.A(E.IMG(src='a.png'), href='a.png')),
+            E.IMG(src='b.png'),
+            E.A('two', href='b.png'),
+            E.A('three', href='c.png'),
+            E.A('four'),
+            E.IMG(src='a.png')
+        ))
+        imgs = [(img, img.get('src')) for img in root.xpath('//img')]
+        JiveContent._rewrite_image_urls(
+            root, imgs, {'a.png': 'http://j/a', 'b.png': 'http://j/b'}
+        )
+        assert etree.tostring(root) == (
+            b'<html><body><a href="http://j/a">one</a><p>'
+            b'<a href="http://j/a"><img src="http://j/a"/></a></p>'
+            b'<img src="http://j/b"/><a href="http://j/b">two</a>'
+            b'<a href="c.png">three</a><a>four</a><img src="http://j/a"/>'
+            b'</body></html>'
+        )
+
+
+class TestLoadImageFromDisk(ContentTester):
+
+    def write_png(self, path, size):
+        data = b'\x89PNG\r\n\x1a\n' + (b'x' * (size - 8))
+        with open(path, 'wb') as fh:
+            fh.write(data)
+        return hashlib.sha256(data).hexdigest()
+
+    def test_rel_path(self, tmpdir):
+        tmpdir.mkdir('foo')
+        fpath = str(tmpdir.join('foo', 'bar.png'))
+        expected = self.write_png(fpath, 200000)
+        self.cls._image_dir = str(tmpdir)
+        res = self.cls._load_image_from_disk('foo/bar.png')
+        assert res == ('image/png', fpath, expected)
+
+    def test_abs_path(self, tmpdir):
+        fpath = str(tmpdir.join('bar.png'))
+        expected = self.write_png(fpath, 20)
+        res = self.cls._load_image_from_disk(fpath)
+        assert res == ('image/png', fpath, expected)
+
+    def test_chunked(self):
         with patch('%s.imghdr.what' % pbm) as mock_what:
-            with patch('%s.hashlib.sha256' % pbm) as mock_sha256:
+            with patch('%s.DEFAULT_CHUNK_SIZE' % pbm, 2):
                 with patch(
-                    '%s.open' % pbm, mock_open(read_data=b'foo')
+                    '%s.open' % pbm, mock_open(read_data=b'foobar')
                 ) as m_open:
+                    m_open.return_value.read.side_effect = [
+                        b'foo', b'ba', b'r', b''
+                    ]
                     mock_what.return_value = 'cType'
-                    mock_sha256.return_value = m_sha256
                     res = self.cls._load_image_from_disk('/foo/bar.png')
-        assert res == ('image/cType', b'foo', sha256str)
+        assert res == (
+            'image/cType', '/foo/bar.png', hashlib.sha256(b'foobar').hexdigest()
+        )
         assert mock_what.mock_calls == [call(None, b'foo')]
-        assert mock_sha256.mock_calls == [
-            call(b'foo'), call().hexdigest()
-        ]
         assert m_open.mock_calls == [
             call('/foo/bar.png', 'rb'),
             call().__enter__(),
-            call().read(),
+            call().read(32),
+            call().read(2),
+            call().read(2),
+            call().read(2),
             call().__exit__(None, None, None)
         ]
 
+    def test_fingerprint_cache(self, tmpdir):
+        fpath = str(tmpdir.join('bar.png'))
+        expected = self.write_png(fpath, 100)
+        cache = MemoryCache()
+        self.cls._fingerprint_cache = cache
+        res = self.cls._load_image_from_disk(fpath)
+        assert res == ('image/png', fpath, expected)
+        st = os.stat(fpath)
+        key = 'image-fingerprint:%s|100|%d' % (fpath, st.st_mtime_ns)
+        assert cache.get(key) == {
+            'content_type': 'image/png', 'sha256': expected
+        }
+        with patch('%s.open' % pbm) as m_open:
+            res = self.cls._load_image_from_disk(fpath)
+        assert res == ('image/png', fpath, expected)
+        assert m_open.mock_calls == []
+
+    def test_fingerprint_cache_changed(self, tmpdir):
+        fpath = str(tmpdir.join('bar.png'))
+        self.write_png(fpath, 100)
+        self.cls._fingerprint_cache = MemoryCache()
+        self.cls._load_image_from_disk(fpath)
+        expected = self.write_png(fpath, 101)
+        res = self.cls._load_image_from_disk(fpath)
+        assert res == ('image/png', fpath, expected)
+        assert len(self.cls._fingerprint_cache) == 2
+
 
 class TestUploadImages(ContentTester):
 
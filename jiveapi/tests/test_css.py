@@ -0,0 +1,519 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import os
+import subprocess
+import sys
+import threading
+from unittest.mock import Mock, call, patch
+
+import pytest
+from lxml import etree
+from premailer import Premailer
+
+from jiveapi.cache import MemoryCache, SQLiteCache
+from jiveapi.content import JiveContent
+from jiveapi.css import (
+    CssInliner, NativeInliner, StylesheetCache, parse_declarations,
+    prune_unused_css, NATIVE_INLINER
+)
+from jiveapi.exceptions import RequestFailedException
+from jiveapi.tests.test_helpers import MockResponse
+
+FIXTURE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'html'
+)
+FIXTURE = os.path.join(FIXTURE_DIR, 'testpostA.html')
+
+CSS = 'p { color: red; } .big { font-size: 2em !important; } ' \
+      'a:hover { color: blue; } @media print { p { color: black; } }'
+
+HTML = '<html><head><style>%s</style></head><body><p class="big">foo</p>' \
+       '<a href="#x">bar</a></body></html>' % CSS
+
+
+def premailer_html(html):
+    return etree.tostring(
+        Premailer(JiveContent.html_to_etree(html)).transform()
+    )
+
+
+class TestCssInliner(object):
+
+    def setup(self):
+        self.cls = CssInliner()
+
+    def transform(self, html):
+        return etree.tostring(
+            self.cls.transform(JiveContent.html_to_etree(html))
+        )
+
+    def test_same_as_premailer(self):
+        assert self.transform(HTML) == premailer_html(HTML)
+        assert self.transform(HTML) == premailer_html(HTML)
+        assert self.cls.misses == 1
+        assert self.cls.hits == 1
+        assert len(self.cls) == 1
+
+    def test_fixture_same_as_premailer(self):
+        with open(FIXTURE, 'r') as fh:
+            html = fh.read()
+        expected = premailer_html(html)
+        assert self.transform(html) == expected
+        assert self.transform(html) == expected
+        assert self.cls.hits == self.cls.misses
+
+    def test_parsed_once(self):
+        orig = Premailer._parse_style_rules
+        with patch.object(
+            Premailer, '_parse_style_rules', autospec=True, side_effect=orig
+        ) as mock_parse:
+            for _ in range(3):
+                self.transform(HTML)
+            self.transform(HTML.replace('red', 'green'))
+        assert mock_parse.call_count == 2
+        assert self.cls.misses == 2
+        assert self.cls.hits == 2
+
+    def test_empty_style(self):
+        html = '<html><head><style></style></head><body><p>foo</p></body>' \
+               '</html>'
+        assert self.transform(html) == premailer_html(html)
+        assert len(self.cls) == 0
+
+    def test_premailer_kwargs(self):
+        cls = CssInliner(keep_style_tags=True)
+        res = etree.tostring(cls.transform(JiveContent.html_to_etree(HTML)))
+        assert b'<style>' in res
+
+    def test_maxsize(self):
+        cls = CssInliner(maxsize=2)
+        for color in ['red', 'green', 'blue']:
+            cls.transform(JiveContent.html_to_etree(
+                HTML.replace('red', color)
+            ))
+        assert len(cls) == 2
+        cls.transform(JiveContent.html_to_etree(HTML.replace('red', 'green')))
+        assert cls.hits == 1
+        cls.clear()
+        assert len(cls) == 0
+
+    def test_threads(self):
+        expected = premailer_html(HTML)
+        results = []
+
+        def run():
+            for _ in range(10):
+                results.append(self.transform(HTML))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [expected] * 40
+        assert len(self.cls) == 1
+
+
+def doc(css, body, head=''):
+    return JiveContent.html_to_etree(
+        '<html><head>%s<style>%s</style></head><body>%s</body></html>' % (
+            head, css, body
+        )
+    )
+
+
+class TestParseDeclarations(object):
+
+    def test_simple(self):
+        assert parse_declarations('color: red;Font-Size:2em') == (
+            [('color', 'red'), ('font-size', '2em')], []
+        )
+
+    def test_important(self):
+        assert parse_declarations(
+            'color: red !important; margin: 0 ! IMPORTANT;padding:1px'
+        ) == ([('padding', '1px')], [('color', 'red'), ('margin', '0')])
+
+    def test_strings_and_comments(self):
+        assert parse_declarations(
+            '/* a; b */ background: url("data:image/png;base64,AA==") ; '
+            'content: "x;y"; : foo; bar; baz:'
+        ) == ([
+            ('background', 'url("data:image/png;base64,AA==")'),
+            ('content', '"x;y"')
+        ], [])
+
+
+LINKED = '<html><head><link rel="stylesheet" href="http://x/a.css" ' \
+         'media="screen"/>\n<link rel="icon" href="http://x/i.png"/>' \
+         '<link rel="stylesheet" href="local.css"/></head>' \
+         '<body><p>foo</p></body></html>'
+
+
+class TestStylesheetCache(object):
+
+    def setup(self):
+        self.session = Mock()
+        self.session.get.return_value = MockResponse(
+            200, 'OK', text='p { color: red; }'
+        )
+        self.backend = MemoryCache()
+        self.cls = StylesheetCache(
+            backend=self.backend, ttl=60, session=self.session
+        )
+
+    def test_url_for(self):
+        assert self.cls.url_for(' http://x/a.css') == 'http://x/a.css'
+        assert self.cls.url_for('//x/a.css') == 'https://x/a.css'
+        assert self.cls.url_for('a.css') is None
+        assert self.cls.url_for('file:///a.css') is None
+        cls = StylesheetCache(base_url='http://x/docs/')
+        assert cls.url_for('a.css') == 'http://x/docs/a.css'
+        assert cls.url_for('//y/a.css') == 'http://y/a.css'
+
+    def test_get_fetches_once(self):
+        assert self.cls.get('http://x/a.css') == 'p { color: red; }'
+        assert self.cls.get('http://x/a.css') == 'p { color: red; }'
+        assert self.session.mock_calls == [
+            call.get('http://x/a.css', timeout=30)
+        ]
+        assert self.cls.fetches == 1
+        assert self.backend.get('stylesheet:http://x/a.css') == \
+            'p { color: red; }'
+
+    def test_get_ttl(self):
+        with patch('jiveapi.cache.time.time') as mock_time:
+            mock_time.return_value = 1000
+            self.cls.get('http://x/a.css')
+            mock_time.return_value = 1061
+            self.cls.get('http://x/a.css')
+        assert self.cls.fetches == 2
+
+    def test_get_failed(self):
+        req = Mock(method='GET', url='http://x/a.css')
+        self.session.get.return_value = MockResponse(
+            404, 'Not Found', text='nope', request=req
+        )
+        with pytest.raises(RequestFailedException):
+            self.cls.get('http://x/a.css')
+        assert self.backend.get('stylesheet:http://x/a.css') is None
+
+    def test_get_offline(self):
+        cls = StylesheetCache(
+            backend=self.backend, offline=True, session=self.session
+        )
+        assert cls.get('http://x/a.css') is None
+        cls.set('http://x/a.css', '')
+        assert cls.get('http://x/a.css') == ''
+        assert self.session.mock_calls == []
+
+    def test_get_threads(self):
+        def get(*args, **kwargs):
+            started.wait(1)
+            return MockResponse(200, 'OK', text='p {}')
+
+        started = threading.Event()
+        self.session.get.side_effect = get
+        threads = [
+            threading.Thread(target=self.cls.get, args=('http://x/a.css',))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        started.set()
+        for t in threads:
+            t.join()
+        assert self.cls.fetches == 1
+
+    def test_resolve_links(self):
+        root = JiveContent.html_to_etree(LINKED)
+        assert self.cls.resolve_links(root) is root
+        assert etree.tostring(root.find('head')) == \
+            b'<head><style type="text/css" media="screen">p { color: red; }' \
+            b'</style>\n<link rel="icon" href="http://x/i.png"/>' \
+            b'<link rel="stylesheet" href="local.css"/></head>'
+
+    def test_resolve_links_offline(self, caplog):
+        cls = StylesheetCache(offline=True, session=self.session)
+        root = JiveContent.html_to_etree(LINKED)
+        cls.resolve_links(root)
+        assert etree.tostring(root.find('head')) == \
+            b'<head>\n<link rel="icon" href="http://x/i.png"/>' \
+            b'<link rel="stylesheet" href="local.css"/></head>'
+        assert 'http://x/a.css is not cached' in caplog.text
+        assert self.session.mock_calls == []
+
+    def test_sqlite_backend(self, tmpdir):
+        path = str(tmpdir.join('cache.db'))
+        StylesheetCache(
+            backend=SQLiteCache(path), session=self.session
+        ).get('http://x/a.css')
+        cls = StylesheetCache(backend=SQLiteCache(path), offline=True)
+        assert cls.get('http://x/a.css') == 'p { color: red; }'
+        assert self.session.get.call_count == 1
+
+    def test_inliners(self):
+        for inliner in (
+            CssInliner(stylesheet_cache=self.cls),
+            NativeInliner(stylesheet_cache=self.cls)
+        ):
+            res = inliner.transform(JiveContent.html_to_etree(
+                LINKED.replace('<link rel="stylesheet" href="local.css"/>', '')
+            ))
+            assert res.find('.//p').get('style') == 'color:red'
+            assert res.find('.//style') is None
+        assert self.cls.fetches == 1
+
+
+class TestNativeInliner(object):
+
+    def setup(self):
+        self.fallback = Mock()
+        self.cls = NativeInliner(fallback=self.fallback)
+
+    def styles(self, root):
+        return [
+            (e.tag, e.get('style')) for e in root.getroot().iter('body', 'p')
+        ]
+
+    def test_specificity_and_order(self):
+        root = self.cls.transform(doc(
+            '#a { color: red; } p.b { color: blue; margin: 0; } '
+            'p { color: green; padding: 1px; } p { padding: 2px; }',
+            '<p id="a" class="b">x</p><p class="b">y</p><p>z</p>'
+        ))
+        assert self.styles(root) == [
+            ('body', None),
+            ('p', 'color:red; padding:2px; margin:0'),
+            ('p', 'color:blue; padding:2px; margin:0'),
+            ('p', 'color:green; padding:2px')
+        ]
+        assert self.fallback.mock_calls == []
+
+    def test_important_and_inline(self):
+        root = self.cls.transform(doc(
+            '#a { color: red; margin: 1px; } '
+            'p { color: blue !important; padding: 0 !important; } ',
+            '<p id="a" style="margin: 2px; padding: 3px !important; '
+            'color: black">x</p>'
+        ))
+        assert self.styles(root) == [
+            ('body', None),
+            ('p', 'color:blue; margin:2px; padding:3px')
+        ]
+
+    def test_multiple_stylesheets(self):
+        root = self.cls.transform(doc(
+            'p { color: blue; } body { margin: 0; }',
+            '<p>x</p>', head='<style>p { color: red; }</style>'
+        ))
+        assert self.styles(root) == [
+            ('body', 'margin:0'), ('p', 'color:blue')
+        ]
+        assert etree.tostring(root).count(b'<style') == 0
+
+    def test_leftover(self):
+        css = 'a:hover { color: red; } p::before { content: "x"; } ' \
+              '@media print { p { color: black; } } ' \
+              '@font-face { font-family: x; } * { margin: 0; } ' \
+              'p:first-child { color: blue; } p:empty { color: green; }'
+        root = self.cls.transform(doc(css, '<p>x</p><p></p>'))
+        assert self.styles(root) == [
+            ('body', None), ('p', 'color:blue'), ('p', 'color:green')
+        ]
+        style = root.getroot().find('head/style')
+        assert style.text == 'a:hover {color: red;}\n' \
+            'p::before {content: "x";}\n' \
+            '@media print {p { color: black; }}'
+
+    def test_media_attribute_and_unset(self):
+        root = self.cls.transform(doc(
+            'p { color: red; margin: unset; }', '<p>x</p>',
+            head='<style media="print">p { color: blue; }</style>'
+        ))
+        assert self.styles(root) == [('body', None), ('p', 'color:red')]
+        assert etree.tostring(root).count(b'<style') == 1
+
+    def test_fixtures_same_styles_as_premailer(self):
+        for fname in sorted(os.listdir(FIXTURE_DIR)):
+            if not fname.endswith('.html'):
+                continue
+            with open(os.path.join(FIXTURE_DIR, fname), 'r') as fh:
+                html = fh.read()
+            expected = Premailer(JiveContent.html_to_etree(html)).transform()
+            res = self.cls.transform(JiveContent.html_to_etree(html))
+            assert [
+                (e.tag, e.get('style')) for e in res.getroot().iter()
+            ] == [
+                (e.tag, e.get('style')) for e in expected.getroot().iter()
+            ], fname
+        assert self.fallback.mock_calls == []
+
+    def test_cached(self):
+        for _ in range(3):
+            self.cls.transform(doc('p { color: red; }', '<p>x</p>'))
+        assert self.cls.misses == 1
+        assert self.cls.hits == 2
+        assert len(self.cls) == 1
+
+    def test_threads(self):
+        results = []
+
+        def run():
+            for _ in range(10):
+                results.append(etree.tostring(self.cls.transform(
+                    doc('p.a { color: red; } p { margin: 0; }',
+                        '<p class="a">x</p>')
+                )))
+
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert len(set(results)) == 1
+        assert b'style="margin:0; color:red"' in results[0]
+
+    def test_fallback_link(self):
+        root = doc(
+            'p { color: red; }', '<p>x</p>',
+            head='<link rel="Stylesheet" href="foo.css">'
+        )
+        res = self.cls.transform(root)
+        assert res == self.fallback.transform.return_value
+        assert self.fallback.mock_calls == [call.transform(root)]
+        assert self.cls.fallbacks == 1
+
+    def test_fallback_unparseable(self):
+        root = doc('p { color: red; ', '<p>x</p>')
+        self.cls.transform(root)
+        assert self.fallback.mock_calls == [call.transform(root)]
+        # tree was not modified
+        assert root.find('body/p').get('style') is None
+
+    def test_fallback_selector(self):
+        root = doc('p:unknown-thing { color: red; }', '<p>x</p>')
+        self.cls.transform(root)
+        assert self.fallback.mock_calls == [call.transform(root)]
+
+    def test_fallback_premailer(self):
+        cls = NativeInliner()
+        root = doc('p:foo(bar { color: red; }', '<p>x</p>')
+        with patch('premailer.Premailer') as mock_premailer:
+            res = cls.transform(root)
+        assert res == mock_premailer.return_value.transform.return_value
+        assert mock_premailer.mock_calls[:2] == [
+            call(root), call().transform()
+        ]
+
+    def test_default_instance(self):
+        assert isinstance(NATIVE_INLINER, NativeInliner)
+
+    def test_premailer_not_imported(self):
+        code = 'import sys\n' \
+            'from jiveapi.content import JiveContent\n' \
+            'JiveContent.inline_css_etree(JiveContent.html_to_etree(%r), ' \
+            'engine="native")\n' \
+            'print("premailer" in sys.modules)' % HTML
+        assert subprocess.check_output(
+            [sys.executable, '-c', code]
+        ).strip() == b'False'
+
+
+class TestPruneUnusedCss(object):
+
+    def prune(self, css, body='<p class="a">x</p><a href="#y">y</a>'):
+        root = doc(css, body)
+        stats = prune_unused_css(root)
+        return root.find('.//style').text, stats
+
+    def test_rules(self):
+        css, stats = self.prune(
+            '/* c */ p { color: red; } div, .a { margin: 0; } .b { x: y; }\n'
+            'p > a, body a { padding: 0; }'
+        )
+        assert css == 'p { color: red; }\n.a { margin: 0; }\n' \
+            'body a { padding: 0; }'
+        assert stats.rules == 4
+        assert stats.rules_dropped == 1
+        assert stats.bytes_dropped == 33
+        assert stats.elapsed > 0
+
+    def test_at_rules(self):
+        css, stats = self.prune(
+            '@import url(x.css); @font-face { font-family: f; } '
+            '@media print { .b { x: y; } } '
+            '@media screen { .b { x: y; } p { color: red; } }'
+        )
+        assert css == '@import url(x.css);\n@font-face { font-family: f; }' \
+            '\n@media screen {\np { color: red; }\n}'
+        assert stats.rules == 3
+        assert stats.rules_dropped == 2
+
+    def test_pseudo(self):
+        css, stats = self.prune(
+            'a:hover, b:hover { x: y; } p::before { x: y; } '
+            'p:after { x: y; } :focus { x: y; } [title="b:hover"] { x: y; } '
+            'p:first-child { x: y; } a:first-child { x: y; } '
+            'p:unknown-thing { x: y; }'
+        )
+        assert css == 'a:hover { x: y; }\np::before { x: y; }\n' \
+            'p:after { x: y; }\n:focus { x: y; }\n' \
+            'p:first-child { x: y; }\np:unknown-thing { x: y; }'
+        assert stats.rules_dropped == 2
+
+    def test_not_pruned(self):
+        root = doc('.b { x: y; }', '<p>x</p>')
+        style = root.find('.//style')
+        style.set('data-premailer', 'ignore')
+        root.find('.//head').append(etree.fromstring('<style>.b {</style>'))
+        assert prune_unused_css(root) == (0, 0, 0, pytest.approx(0, abs=1))
+        assert [e.text for e in root.iter('style')] == ['.b { x: y; }', '.b {']
+
+    def test_same_styles_as_premailer(self):
+        for fname in sorted(os.listdir(FIXTURE_DIR)):
+            if not fname.endswith('.html'):
+                continue
+            with open(os.path.join(FIXTURE_DIR, fname), 'r') as fh:
+                html = fh.read()
+            pruned = JiveContent.html_to_etree(html)
+            assert prune_unused_css(pruned).rules_dropped > 0
+            expected = Premailer(JiveContent.html_to_etree(html)).transform()
+            res = Premailer(pruned).transform()
+            assert [e.get('style') for e in res.iter(etree.Element)] == \
+                [e.get('style') for e in expected.iter(etree.Element)]
@@ -52,10 +52,19 @@ class MockResponse(object):
         self.request = request
         self.content = content
         self.headers = headers
+        self.url = None if request is None else request.url
+        self.closed = False
 
     def json(self):
         return self._json
 
+    def iter_content(self, chunk_size=1):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def close(self):
+        self.closed = True
+
 
 class FixedOffset(tzinfo):
     """Fixed offset in minutes east from UTC."""
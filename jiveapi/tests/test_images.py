@@ -0,0 +1,214 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import threading
+import pytest
+from concurrent.futures import Future
+from unittest.mock import Mock, call, patch
+
+from jiveapi.cache import MemoryCache
+from jiveapi.images import (
+    ImageRegistry, location_validator, UploadCoalescer, UPLOAD_COALESCER
+)
+from jiveapi.tests.test_helpers import MockResponse
+
+ENTRY = {
+    'location': 'http://jive.example.com/api/core/v3/images/1?a=2',
+    'jive_object': {'id': '1'},
+    'local_path': 'img.png'
+}
+
+
+class TestImageRegistry(object):
+
+    def setup(self):
+        self.backend = MemoryCache()
+        self.cls = ImageRegistry(self.backend)
+
+    def test_get_set(self):
+        assert self.cls.get('abc') is None
+        self.cls.set('abc', ENTRY)
+        assert self.cls.get('abc') == ENTRY
+        assert self.backend.get('image:abc') == ENTRY
+
+    def test_ttl(self):
+        backend = Mock()
+        backend.get.return_value = None
+        cls = ImageRegistry(backend, ttl=3600)
+        cls.set('abc', ENTRY)
+        assert cls.get('abc') is None
+        assert backend.mock_calls == [
+            call.set('image:abc', ENTRY, ttl=3600),
+            call.get('image:abc')
+        ]
+
+    def test_evict(self):
+        self.cls.set('abc', ENTRY)
+        self.cls.set('def', ENTRY)
+        self.cls.evict('abc')
+        assert self.cls.get('abc') is None
+        assert self.cls.get('def') == ENTRY
+
+    def test_clear(self):
+        self.backend.set('other', 'foo')
+        self.cls.set('abc', ENTRY)
+        self.cls.clear()
+        assert self.cls.get('abc') is None
+        assert self.backend.get('other') == 'foo'
+
+    def test_validator(self):
+        validator = Mock(side_effect=[True, False])
+        cls = ImageRegistry(self.backend, validator=validator)
+        cls.set('abc', ENTRY)
+        assert cls.get('abc') == ENTRY
+        assert cls.get('abc') is None
+        assert self.backend.get('image:abc') is None
+        assert cls.get('abc') is None
+        assert validator.mock_calls == [
+            call('abc', ENTRY), call('abc', ENTRY)
+        ]
+
+
+class TestLocationValidator(object):
+
+    def test_valid(self):
+        api = Mock()
+        resp = MockResponse(200, 'OK')
+        api._request.return_value = resp
+        assert location_validator(api)('abc', ENTRY) is True
+        assert api.mock_calls == [
+            call._request('GET', ENTRY['location'], stream=True)
+        ]
+        assert resp.closed is True
+
+    def test_invalid(self):
+        api = Mock()
+        api._request.return_value = MockResponse(404, 'Not Found')
+        with patch('jiveapi.images.logger') as mock_logger:
+            assert location_validator(api)('abc', ENTRY) is False
+        assert len(mock_logger.mock_calls) == 1
+
+
+class TestUploadCoalescer(object):
+
+    def test_default(self):
+        assert isinstance(UPLOAD_COALESCER, UploadCoalescer)
+
+    def test_run_not_retained(self):
+        cls = UploadCoalescer()
+        func = Mock(return_value='res')
+        assert cls.run('a', func) == 'res'
+        assert cls.run('a', func) == 'res'
+        assert func.call_count == 2
+        assert cls._in_flight == {}
+
+    def test_failure_not_retained(self):
+        cls = UploadCoalescer()
+        func = Mock(side_effect=[RuntimeError('foo'), 'res'])
+        with pytest.raises(RuntimeError):
+            cls.run('a', func)
+        assert cls.run('a', func) == 'res'
+        assert cls._in_flight == {}
+
+    def test_concurrent(self):
+        cls = UploadCoalescer()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def upload():
+            calls.append(1)
+            started.set()
+            assert release.wait(5)
+            return 'res'
+
+        results = []
+
+        def worker():
+            results.append(cls.run('a', upload))
+
+        owner = threading.Thread(target=worker)
+        owner.start()
+        assert started.wait(5)
+        waiters = [threading.Thread(target=worker) for _ in range(4)]
+        for t in waiters:
+            t.start()
+        release.set()
+        for t in [owner] + waiters:
+            t.join(5)
+        assert results == ['res'] * 5
+        assert calls == [1]
+
+    def test_concurrent_failure(self):
+        cls = UploadCoalescer()
+        started = threading.Event()
+        release = threading.Event()
+
+        def upload():
+            started.set()
+            assert release.wait(5)
+            raise RuntimeError('foo')
+
+        errors = []
+
+        def worker():
+            try:
+                cls.run('a', upload)
+            except RuntimeError as ex:
+                errors.append(ex)
+
+        waiting = threading.Event()
+
+        class SignallingFuture(Future):
+
+            def result(self, timeout=None):
+                waiting.set()
+                return super(SignallingFuture, self).result(timeout=timeout)
+
+        with patch('jiveapi.images.Future', SignallingFuture):
+            owner = threading.Thread(target=worker)
+            owner.start()
+            assert started.wait(5)
+            waiter = threading.Thread(target=worker)
+            waiter.start()
+            # release the upload once the waiter is waiting on it
+            assert waiting.wait(5)
+            release.set()
+            owner.join(5)
+            waiter.join(5)
+        assert len(errors) == 2
+        assert errors[0] is errors[1]
@@ -35,14 +35,57 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 ##################################################################################
 """
 
-from unittest.mock import patch, call
+import pytest
+from unittest.mock import patch, call, Mock
+from requests import Response, Session
+from requests.adapters import BaseAdapter
 
-from jiveapi.jiveresponse import JiveResponse
+from jiveapi.jiveresponse import (
+    JiveResponse, loads_jive_bytes, loads_jive_json, _json_start,
+    requests_hook
+)
 
 pbm = 'jiveapi.jiveresponse'
 pb = '%s.JiveResponse' % pbm
 
 
+class StaticAdapter(BaseAdapter):
+
+    def send(self, request, **kwargs):
+        res = Response()
+        res.status_code = 200
+        res.encoding = 'utf-8'
+        res._content = b'throw 1;\n{"foo": "bar"}'
+        res.request = request
+        res.url = request.url
+        return res
+
+    def close(self):
+        pass
+
+
+class TestRequestsHook(object):
+
+    def test_hook(self):
+        res = Response()
+        res.status_code = 200
+        res._content = b'{}'
+        res.headers['foo'] = 'bar'
+        result = requests_hook(res)
+        assert result is res
+        assert type(result) is JiveResponse
+        assert result.headers == {'foo': 'bar'}
+        assert requests_hook(result) is res
+
+    def test_session(self):
+        sess = Session()
+        sess.mount('http://', StaticAdapter())
+        sess.hooks['response'].append(requests_hook)
+        res = sess.get('http://jive.example.com/foo')
+        assert type(res) is JiveResponse
+        assert res.json() == {'foo': 'bar'}
+
+
 class TestJiveResponse(object):
 
     def test_with_security_string(self):
@@ -51,8 +94,10 @@ class TestJiveResponse(object):
         cls.status_code = 200
         cls._content = 'throw \'allowIllegalResourceCall is false.\';{"foo": ' \
                        '"bar", "baz": "blam"}'.encode('utf-8')
-        with patch('%s.complexjson' % pbm) as mock_cj:
-            cls.json()
+        with patch('%s.orjson' % pbm, None):
+            with patch('%s.ujson' % pbm, None):
+                with patch('%s.complexjson' % pbm) as mock_cj:
+                    cls.json()
         assert mock_cj.mock_calls == [
             call.loads('{"foo": "bar", "baz": "blam"}')
         ]
@@ -62,8 +107,10 @@ class TestJiveResponse(object):
         cls.encoding = 'utf-8'
         cls.status_code = 200
         cls._content = '{"foo": "bar", "baz": "blam"}'.encode('utf-8')
-        with patch('%s.complexjson' % pbm) as mock_cj:
-            cls.json()
+        with patch('%s.orjson' % pbm, None):
+            with patch('%s.ujson' % pbm, None):
+                with patch('%s.complexjson' % pbm) as mock_cj:
+                    cls.json()
         assert mock_cj.mock_calls == [
             call.loads('{"foo": "bar", "baz": "blam"}')
         ]
@@ -72,8 +119,10 @@ class TestJiveResponse(object):
         cls = JiveResponse()
         cls.status_code = 200
         cls._content = '{"foo": "bar", "baz": "blam"}'.encode('utf-8')
-        with patch('%s.complexjson' % pbm) as mock_cj:
-            cls.json()
+        with patch('%s.orjson' % pbm, None):
+            with patch('%s.ujson' % pbm, None):
+                with patch('%s.complexjson' % pbm) as mock_cj:
+                    cls.json()
         assert mock_cj.mock_calls == [
             call.loads('{"foo": "bar", "baz": "blam"}')
         ]
@@ -82,8 +131,10 @@ class TestJiveResponse(object):
         cls = JiveResponse()
         cls.status_code = 200
         cls._content = '{"foo": "bar", "baz": "blam"}'.encode('ascii')
-        with patch('%s.complexjson' % pbm) as mock_cj:
-            cls.json()
+        with patch('%s.orjson' % pbm, None):
+            with patch('%s.ujson' % pbm, None):
+                with patch('%s.complexjson' % pbm) as mock_cj:
+                    cls.json()
         assert mock_cj.mock_calls == [
             call.loads('{"foo": "bar", "baz": "blam"}')
         ]
@@ -105,3 +156,89 @@ class TestJiveResponse(object):
         cls.encoding = 'utf-8'
         cls._content = '{"foo": "bar", "baz": "blam"}'.encode('utf-8')
         assert str(cls) == '<JiveResponse [200]>'
+
+    def test_orjson(self):
+        cls = JiveResponse()
+        cls.status_code = 200
+        cls.encoding = 'UTF-8'
+        cls._content = b'throw 1;\n {"foo": "bar"}'
+        m_orjson = Mock()
+        with patch('%s.orjson' % pbm, m_orjson):
+            with patch('%s.complexjson' % pbm) as mock_cj:
+                res = cls.json()
+        assert res == m_orjson.loads.return_value
+        assert mock_cj.mock_calls == []
+        args = m_orjson.loads.call_args[0]
+        assert isinstance(args[0], memoryview)
+        assert bytes(args[0]) == b'{"foo": "bar"}'
+
+    def test_ujson(self):
+        cls = JiveResponse()
+        cls.status_code = 200
+        cls.encoding = 'utf-8'
+        cls._content = b'throw 1;{"foo": "bar"}'
+        m_ujson = Mock()
+        with patch('%s.orjson' % pbm, None):
+            with patch('%s.ujson' % pbm, m_ujson):
+                res = cls.json()
+        assert res == m_ujson.loads.return_value
+        assert m_ujson.mock_calls == [call.loads(b'{"foo": "bar"}')]
+
+    def test_fallback_non_utf8(self):
+        cls = JiveResponse()
+        cls.status_code = 200
+        cls.encoding = 'ISO-8859-1'
+        cls._content = 'throw 1;{"foo": "b\xe4r"}'.encode('latin-1')
+        with patch('%s.loads_jive_bytes' % pbm) as mock_lb:
+            assert cls.json() == {'foo': 'b\xe4r'}
+        assert mock_lb.mock_calls == []
+
+    def test_fallback_on_error(self):
+        cls = JiveResponse()
+        cls.status_code = 200
+        cls.encoding = 'utf-8'
+        # mis-labeled latin-1 content; the fast path fails to decode it
+        cls._content = 'throw 1;{"foo": "b\xe4r"}'.encode('latin-1')
+        res = cls.json()
+        assert res == {'foo': 'b\ufffdr'}
+
+    def test_utf16(self):
+        cls = JiveResponse()
+        cls.status_code = 200
+        cls._content = '{"foo": "bar"}'.encode('utf-16-le')
+        with patch('%s.loads_jive_bytes' % pbm) as mock_lb:
+            assert cls.json() == {'foo': 'bar'}
+        assert mock_lb.mock_calls == []
+
+    def test_invalid(self):
+        cls = JiveResponse()
+        cls.status_code = 200
+        cls.encoding = 'utf-8'
+        cls._content = b'throw 1;{"foo": '
+        with pytest.raises(ValueError):
+            cls.json()
+
+
+class TestLoadsJiveBytes(object):
+
+    def test_json_start(self):
+        assert _json_start(b'{"a": 1}') == 0
+        assert _json_start(b'throw 1;{"a": 1}') == 8
+        assert _json_start(b'throw 1; \r\n\t{"a": 1}') == 12
+        assert _json_start(b'throw 1;') == 8
+        assert _json_start(b'throw 1') == 0
+
+    @pytest.mark.parametrize('orjson_mod', ['orjson', None])
+    @pytest.mark.parametrize('ujson_mod', ['ujson', None])
+    def test_decode(self, orjson_mod, ujson_mod):
+        mods = {}
+        for name in [orjson_mod, ujson_mod]:
+            if name is not None:
+                mods[name] = pytest.importorskip(name)
+        content = 'throw \'allowIllegalResourceCall is false.\';\n' \
+                  '{"list": [{"subject": "caf\xe9; \u2603", "id": 1}]}'
+        with patch('%s.orjson' % pbm, mods.get('orjson')):
+            with patch('%s.ujson' % pbm, mods.get('ujson')):
+                res = loads_jive_bytes(content.encode('utf-8'))
+        assert res == loads_jive_json(content)
+        assert res == {'list': [{'subject': 'caf\xe9; \u2603', 'id': 1}]}
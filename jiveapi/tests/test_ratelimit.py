@@ -0,0 +1,182 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import threading
+
+import pytest
+from requests import Session
+
+from jiveapi.api import JiveApi
+from jiveapi.ratelimit import TokenBucket, RateLimiter, READ, WRITE, IMAGE
+from jiveapi.tests.test_helpers import MockResponse
+
+from unittest.mock import patch, call, MagicMock
+
+pbm = 'jiveapi.ratelimit'
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+        self.lock = threading.Lock()
+
+    def monotonic(self):
+        with self.lock:
+            return self.now
+
+    def sleep(self, secs):
+        with self.lock:
+            self.now += secs
+
+
+class TestTokenBucket(object):
+
+    def test_invalid_rate(self):
+        with pytest.raises(ValueError):
+            TokenBucket(0)
+
+    def test_default_burst(self):
+        assert TokenBucket(5).burst == 5.0
+        assert TokenBucket(0.2).burst == 1.0
+
+    def test_reserve(self):
+        clock = FakeClock()
+        with patch('%s.time.monotonic' % pbm, clock.monotonic):
+            cls = TokenBucket(2, burst=2)
+            assert cls.reserve() == 0
+            assert cls.reserve() == 0
+            assert cls.reserve() == 0.5
+            assert cls.reserve() == 1.0
+            clock.now += 1.0
+            assert cls.reserve() == 0.5
+            clock.now += 100
+            # refill is capped at burst
+            assert cls.reserve() == 0
+            assert cls.reserve() == 0
+            assert cls.reserve() == 0.5
+
+    def test_acquire_rate(self):
+        clock = FakeClock()
+        with patch('%s.time.monotonic' % pbm, clock.monotonic):
+            with patch('%s.time.sleep' % pbm, clock.sleep):
+                cls = TokenBucket(10, burst=1)
+                start = clock.now
+                for _ in range(21):
+                    cls.acquire()
+        assert clock.now - start == pytest.approx(2.0)
+
+
+class TestRateLimiter(object):
+
+    def test_overall_only(self):
+        with patch('%s.time.sleep' % pbm) as mock_sleep:
+            cls = RateLimiter(1, burst=1)
+            with patch.object(cls._bucket, 'reserve') as mock_reserve:
+                mock_reserve.side_effect = [0, 0.25]
+                assert cls.acquire(WRITE) == 0
+                assert cls.acquire(IMAGE) == 0.25
+        assert mock_sleep.mock_calls == [call(0.25)]
+        assert cls.waited_seconds == 0.25
+
+    def test_classes(self):
+        cls = RateLimiter(100, classes={WRITE: 1, IMAGE: (0.5, 3)})
+        assert cls._classes[WRITE].rate == 1.0
+        assert cls._classes[WRITE].burst == 1.0
+        assert cls._classes[IMAGE].rate == 0.5
+        assert cls._classes[IMAGE].burst == 3.0
+        assert READ not in cls._classes
+        with patch('%s.time.sleep' % pbm) as mock_sleep:
+            with patch.object(cls._bucket, 'reserve') as mock_overall:
+                with patch.object(cls._classes[WRITE], 'reserve') as mock_w:
+                    mock_overall.return_value = 0.1
+                    mock_w.return_value = 0.7
+                    assert cls.acquire(WRITE) == 0.7
+                    assert cls.acquire(READ) == 0.1
+        assert mock_sleep.mock_calls == [call(0.7), call(0.1)]
+        assert mock_w.mock_calls == [call()]
+
+    def test_shared_between_threads(self):
+        clock = FakeClock()
+        with patch('%s.time.monotonic' % pbm, clock.monotonic):
+            cls = RateLimiter(50, burst=5)
+            delays = []
+            lock = threading.Lock()
+
+            def worker():
+                for _ in range(10):
+                    d = cls._bucket.reserve()
+                    with lock:
+                        delays.append(d)
+
+            threads = [threading.Thread(target=worker) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        # 40 reservations at 50/sec with burst 5 and no time passing
+        assert max(delays) == pytest.approx(35 / 50.0)
+        assert sorted(delays)[:5] == [0, 0, 0, 0, 0]
+
+
+class TestJiveApiRateLimit(object):
+
+    def setup(self):
+        self.limiter = MagicMock(spec_set=RateLimiter)
+        self.api = JiveApi(
+            'http://jive.example.com/', 'jiveuser', 'jivepass',
+            rate_limiter=self.limiter
+        )
+        self.mock_sess = MagicMock(spec_set=Session)
+        self.api._requests = self.mock_sess
+
+    def test_get(self):
+        self.mock_sess.get.return_value = MockResponse(200, 'OK', _json={})
+        self.api._get('foo')
+        assert self.limiter.mock_calls == [call.acquire(READ)]
+
+    def test_put(self):
+        self.mock_sess.put.return_value = MockResponse(200, 'OK', _json={})
+        self.api._put_json('foo', {})
+        assert self.limiter.mock_calls == [call.acquire(WRITE)]
+
+    def test_upload_image(self):
+        self.mock_sess.post.return_value = MockResponse(
+            201, 'Created', _json={}, headers={'Location': 'http://x/'}
+        )
+        self.api.upload_image(b'1234', 'img.jpg', 'image/jpeg')
+        assert self.limiter.mock_calls == [call.acquire(IMAGE)]
@@ -0,0 +1,129 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import requests
+
+from jiveapi.retry import RetryPolicy
+from jiveapi.tests.test_helpers import MockResponse
+
+from unittest.mock import patch
+
+pbm = 'jiveapi.retry'
+
+
+class TestShouldRetry(object):
+
+    def setup(self):
+        self.cls = RetryPolicy(max_retries=3)
+
+    def test_max_retries(self):
+        res = MockResponse(503, 'Service Unavailable')
+        assert self.cls.should_retry('GET', 2, response=res) is True
+        assert self.cls.should_retry('GET', 3, response=res) is False
+
+    def test_statuses_idempotent(self):
+        for status in [429, 502, 503, 504]:
+            res = MockResponse(status, 'Err')
+            assert self.cls.should_retry('GET', 0, response=res) is True
+            assert self.cls.should_retry('PUT', 0, response=res) is True
+        for status in [200, 201, 400, 404, 409, 500]:
+            res = MockResponse(status, 'Err')
+            assert self.cls.should_retry('GET', 0, response=res) is False
+
+    def test_statuses_post(self):
+        assert self.cls.should_retry(
+            'POST', 0, response=MockResponse(429, 'Too Many Requests')
+        ) is True
+        for status in [502, 503, 504]:
+            assert self.cls.should_retry(
+                'POST', 0, response=MockResponse(status, 'Err')
+            ) is False
+
+    def test_exceptions(self):
+        conn = requests.exceptions.ConnectionError('foo')
+        read_to = requests.exceptions.ReadTimeout('foo')
+        conn_to = requests.exceptions.ConnectTimeout('foo')
+        assert self.cls.should_retry('GET', 0, exception=conn) is True
+        assert self.cls.should_retry('GET', 0, exception=read_to) is True
+        assert self.cls.should_retry('POST', 0, exception=conn) is False
+        assert self.cls.should_retry('POST', 0, exception=read_to) is False
+        assert self.cls.should_retry('POST', 0, exception=conn_to) is True
+        assert self.cls.should_retry(
+            'GET', 0, exception=requests.exceptions.InvalidURL('foo')
+        ) is False
+
+
+class TestBackoff(object):
+
+    def test_exponential_no_jitter(self):
+        cls = RetryPolicy(backoff_factor=0.5, max_backoff=3, jitter=False)
+        assert [cls.backoff(x) for x in range(5)] == [0.5, 1, 2, 3, 3]
+
+    def test_jitter(self):
+        cls = RetryPolicy(backoff_factor=1, max_backoff=60)
+        with patch('%s.random.uniform' % pbm) as mock_uniform:
+            mock_uniform.return_value = 3.3
+            assert cls.backoff(2) == 3.3
+        mock_uniform.assert_called_once_with(2.0, 4)
+
+    def test_retry_after_seconds(self):
+        cls = RetryPolicy(max_retry_after=100)
+        res = MockResponse(429, 'Err', headers={'Retry-After': '12'})
+        assert cls.backoff(0, response=res) == 12.0
+        res = MockResponse(429, 'Err', headers={'Retry-After': '1200'})
+        assert cls.backoff(0, response=res) == 100
+
+    def test_retry_after_date(self):
+        cls = RetryPolicy()
+        res = MockResponse(
+            503, 'Err', headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:30 GMT'}
+        )
+        with patch('%s.time.time' % pbm) as mock_time:
+            mock_time.return_value = 1445412500.0
+            assert cls.backoff(0, response=res) == 10.0
+
+    def test_retry_after_invalid(self):
+        cls = RetryPolicy(backoff_factor=2, jitter=False)
+        res = MockResponse(503, 'Err', headers={'Retry-After': 'soon'})
+        assert cls.backoff(0, response=res) == 2
+
+    def test_retry_after_ignored(self):
+        cls = RetryPolicy(
+            backoff_factor=2, jitter=False, respect_retry_after=False
+        )
+        res = MockResponse(503, 'Err', headers={'Retry-After': '30'})
+        assert cls.backoff(1, response=res) == 4
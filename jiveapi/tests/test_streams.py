@@ -0,0 +1,172 @@
+"""
+The latest version of this package is available at:
+<http://github.com/jantman/jiveapi>
+
+##################################################################################
+Copyright 2017 Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+
+    This file is part of jiveapi, also known as jiveapi.
+
+    jiveapi is free software: you can redistribute it and/or modify
+    it under the terms of the GNU Affero General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    jiveapi is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU Affero General Public License for more details.
+
+    You should have received a copy of the GNU Affero General Public License
+    along with jiveapi.  If not, see <http://www.gnu.org/licenses/>.
+
+The Copyright and Authors attributions contained herein may not be removed or
+otherwise altered, except to add the Author attribution of a contributor to
+this work. (Additional Terms pursuant to Section 7b of the AGPL v3)
+##################################################################################
+While not legally required, I sincerely request that anyone who finds
+bugs please submit them at <https://github.com/jantman/jiveapi> or
+to me via email, and that you send any contributions or improvements
+either as a pull request on GitHub, or to me via email.
+##################################################################################
+
+AUTHORS:
+Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
+##################################################################################
+"""
+
+import io
+import pytest
+from hashlib import sha256
+from unittest.mock import MagicMock, call
+from urllib3.filepost import encode_multipart_formdata
+
+from jiveapi.streams import ImageStream, MultipartImageBody, sniff_image_type
+from jiveapi.tests.test_helpers import MockResponse
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 40
+
+
+class TestImageStream(object):
+
+    def test_iterate(self):
+        resp = MockResponse(
+            200, 'OK', content=b'abcdefgh', headers={'Content-Type': 'x/y'}
+        )
+        cls = ImageStream(resp, chunk_size=3)
+        assert cls.content_type == 'x/y'
+        assert iter(cls) is cls
+        assert next(cls) == b'abc'
+        assert cls.size == 3
+        assert cls.sha256 == sha256(b'abc').hexdigest()
+        assert resp.closed is False
+        assert list(cls) == [b'def', b'gh']
+        assert cls.size == 8
+        assert cls.sha256 == sha256(b'abcdefgh').hexdigest()
+        assert resp.closed is True
+
+    def test_empty(self):
+        resp = MockResponse(200, 'OK', content=b'')
+        cls = ImageStream(resp)
+        assert list(cls) == []
+        assert cls.size == 0
+        assert cls.sha256 == sha256(b'').hexdigest()
+
+    def test_context_manager(self):
+        resp = MagicMock()
+        with ImageStream(resp, chunk_size=10) as cls:
+            assert cls.response is resp
+        assert resp.mock_calls == [call.close()]
+
+
+class TestSniffImageType(object):
+
+    def test_png(self):
+        assert sniff_image_type(PNG[:32]) == 'image/png'
+
+    def test_unknown(self):
+        assert sniff_image_type(b'foo') is None
+
+
+class TestMultipartImageBody(object):
+
+    def expected(self, data, filename='img.png', content_type='image/png'):
+        return encode_multipart_formdata(
+            {'file': (filename, data, content_type)}, boundary='abc'
+        )
+
+    def test_path(self, tmpdir):
+        path = str(tmpdir.join('img.png'))
+        with open(path, 'wb') as fh:
+            fh.write(PNG)
+        body = MultipartImageBody(path, boundary='abc', chunk_size=1000)
+        assert body.filename == 'img.png'
+        assert body.file_content_type == 'image/png'
+        assert body.file_size == len(PNG)
+        expected, ctype = self.expected(PNG)
+        assert body.content_type == ctype
+        assert len(body) == len(expected)
+        assert body.read() == expected
+        assert body.read() == b''
+        assert body.size == len(PNG)
+        assert body.sha256 == sha256(PNG).hexdigest()
+        assert body._fh.closed is False
+        body.close()
+        assert body._fh.closed is True
+
+    def test_fileobj_read_sizes(self):
+        fh = io.BytesIO(b'xxx' + PNG)
+        fh.seek(3)
+        body = MultipartImageBody(
+            fh, filename='foo"bar.png', boundary='abc', chunk_size=100
+        )
+        expected, _ = self.expected(PNG, filename='foo%22bar.png')
+        parts = []
+        while True:
+            part = body.read(8192 if len(parts) % 2 else 7)
+            if not part:
+                break
+            parts.append(part)
+        assert b''.join(parts) == expected
+        assert body.sha256 == sha256(PNG).hexdigest()
+        body.close()
+        assert fh.closed is False
+
+    def test_iter_and_seek(self):
+        fh = io.BytesIO(PNG)
+        body = MultipartImageBody(
+            fh, content_type='image/x', boundary='abc', chunk_size=4096
+        )
+        assert body.filename == 'image'
+        expected, _ = self.expected(
+            PNG, filename='image', content_type='image/x'
+        )
+        first = body.read(100)
+        assert first == expected[:100]
+        assert body.seek(0) == 0
+        chunks = list(body)
+        assert all(len(c) <= 4096 for c in chunks)
+        assert b''.join(chunks) == expected
+        assert body.size == len(PNG)
+        with pytest.raises(io.UnsupportedOperation):
+            body.seek(10)
+
+    def test_unknown_type(self):
+        body = MultipartImageBody(io.BytesIO(b'foo'), boundary='abc')
+        assert body.file_content_type == 'application/octet-stream'
+        expected, _ = self.expected(
+            b'foo', filename='image', content_type='application/octet-stream'
+        )
+        assert body.read() == expected
+
+    def test_size_changed(self):
+        fh = io.BytesIO(PNG)
+        body = MultipartImageBody(fh, boundary='abc')
+        fh.truncate(100)
+        with pytest.raises(IOError):
+            body.read()
+
+    def test_not_seekable(self):
+        fh = MagicMock(spec_set=['read'])
+        with pytest.raises(ValueError):
+            MultipartImageBody(fh)
@@ -37,9 +37,15 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import json
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
 
 from jiveapi.utils import (
-    set_log_level_format, set_log_info, set_log_debug, prettyjson
+    set_log_level_format, set_log_info, set_log_debug, prettyjson,
+    concurrent_map
 )
 
 from unittest.mock import patch, call, Mock
@@ -91,3 +97,77 @@ class TestUtils(object):
         assert json.dumps(
             d, sort_keys=True, indent=4, separators=(',', ': ')
         ) == prettyjson(d)
+
+
+class TestConcurrentMap(object):
+
+    def test_ordered(self):
+
+        def se_func(x):
+            # make earlier items finish later
+            time.sleep((10 - x) * 0.002)
+            if x == 3:
+                raise RuntimeError('three')
+            return x * 2
+
+        res = list(concurrent_map(se_func, range(10), 4))
+        assert [r[0] for r in res] == list(range(10))
+        for item, result, exc in res:
+            if item == 3:
+                assert result is None
+                assert str(exc) == 'three'
+            else:
+                assert result == item * 2
+                assert exc is None
+
+    def test_unordered(self):
+        res = list(concurrent_map(lambda x: x * 2, range(20), 3, False))
+        assert sorted(res) == [(x, x * 2, None) for x in range(20)]
+
+    def test_bounded_and_lazy(self):
+        lock = threading.Lock()
+        state = {'submitted': 0}
+
+        def items():
+            for x in range(100):
+                with lock:
+                    state['submitted'] += 1
+                yield x
+
+        gen = concurrent_map(lambda x: x, items(), 2)
+        assert next(gen) == (0, 0, None)
+        assert state['submitted'] <= 5
+        gen.close()
+
+    def test_close_cancels_pending(self):
+        release = threading.Event()
+        calls = []
+
+        def func(x):
+            calls.append(x)
+            if x == 0:
+                return x
+            assert release.wait(5)
+            return x
+
+        gen = concurrent_map(func, range(100), 2)
+        assert next(gen) == (0, 0, None)
+        # items 1 and 2 are running and 3 is queued; let the running calls
+        # finish only once the generator is being closed
+        timer = threading.Timer(0.1, release.set)
+        timer.start()
+        gen.close()
+        timer.join()
+        # item 3 (and 2, if not yet started) was cancelled
+        assert 0 in calls and 1 in calls
+        assert set(calls) <= set([0, 1, 2])
+
+    def test_process_pool(self):
+        res = list(concurrent_map(
+            abs, [-1, 2, -3], 2, executor_class=ProcessPoolExecutor
+        ))
+        assert res == [(-1, 1, None), (2, 2, None), (-3, 3, None)]
+
+    def test_invalid_workers(self):
+        with pytest.raises(ValueError):
+            list(concurrent_map(lambda x: x, [1], 0))
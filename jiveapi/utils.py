@@ -37,6 +37,8 @@ Jason Antman <jason@jasonantman.com> <http://www.jasonantman.com>
 
 import logging
 import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 logger = logging.getLogger(__name__)
 
@@ -87,3 +89,77 @@ def set_log_level_format(logger, level, format):
     formatter = logging.Formatter(fmt=format)
     logger.handlers[0].setFormatter(formatter)
     logger.setLevel(level)
+
+
+def concurrent_map(
+    func, items, max_workers, ordered=True, executor_class=ThreadPoolExecutor
+):
+    """
+    Generator that calls ``func(item)`` for every element of ``items`` on a
+    pool of at most ``max_workers`` threads (or processes), yielding a
+    3-tuple of ``(item, result, exception)`` for each call. If the call raised
+    an exception, ``result`` is None and ``exception`` is the exception
+    instance; otherwise ``exception`` is None. Exceptions are never raised out
+    of this generator, so one failed call does not abort the rest of the
+    batch.
+
+    No more than ``2 * max_workers`` calls are submitted ahead of the consumer
+    at any time, so ``items`` may be a very long (or lazy) iterable without
+    the whole batch being queued or its results buffered in memory.
+    If the generator is closed (or garbage collected) before it is exhausted,
+    calls that have been submitted but not started are cancelled.
+
+    :param func: callable to call with each item
+    :type func: ``callable``
+    :param items: items to call ``func`` with
+    :type items: ``iterable``
+    :param max_workers: maximum number of concurrent calls
+    :type max_workers: int
+    :param ordered: if True, yield results in the same order as ``items``;
+      otherwise yield them in the order the calls complete
+    :type ordered: bool
+    :param executor_class: :py:class:`concurrent.futures.Executor` subclass to
+      run the calls on. If this is
+      :py:class:`~concurrent.futures.ProcessPoolExecutor`, ``func``, ``items``
+      and results must be picklable.
+    :type executor_class: ``type``
+    :return: generator of ``(item, result, exception)`` tuples
+    :rtype: ``generator``
+    """
+    if max_workers < 1:
+        raise ValueError('max_workers must be at least 1')
+    items = iter(items)
+    window = max_workers * 2
+    # futures in submission order, mapped to the item they were called with
+    pending = OrderedDict()
+    with executor_class(max_workers=max_workers) as executor:
+
+        def fill():
+            while len(pending) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+                pending[executor.submit(func, item)] = item
+
+        try:
+            fill()
+            while pending:
+                if ordered:
+                    done = [next(iter(pending))]
+                else:
+                    done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    item = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as ex:
+                        yield item, None, ex
+                    else:
+                        yield item, result, None
+                fill()
+        finally:
+            # if the consumer stopped early, do not run queued calls; the
+            # executor shutdown only waits for calls already running
+            for fut in pending:
+                fut.cancel()
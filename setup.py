@@ -44,9 +44,15 @@ with open('README.rst') as file:
 requires = [
     'requests < 3.0.0',
     'premailer >=3.0.0, <4.0.0',
-    'lxml >=4.0.0, <5.0.0'
+    'lxml >=4.0.0, <5.0.0',
+    'cssselect >=1.0.0, <2.0.0'
 ]
 
+extras_require = {
+    'async': ['aiohttp >=3.0.0, <4.0.0'],
+    'fastjson': ['orjson >=3.0.0']
+}
+
 
 classifiers = [
     'Development Status :: 7 - Inactive',
@@ -83,6 +89,7 @@ setup(
                 'software ReST API v3.',
     long_description=long_description,
     install_requires=requires,
+    extras_require=extras_require,
     keywords="jive collaboration client",
     classifiers=classifiers,
     entry_points={